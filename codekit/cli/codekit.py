@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+from codekit.codetools import debug
+from codekit import codetools, daemon, events, profiling, pygithub
+import argparse
+import importlib
+import sys
+import textwrap
+
+# subcommand name -> module implementing it. Modules are only imported when
+# the subcommand is run.
+SUBCOMMANDS = {
+    'auth': 'codekit.cli.github_auth',
+    'daemon': 'codekit.cli.codekit_daemon',
+    'decimate-org': 'codekit.cli.github_decimate_org',
+    'fork-org': 'codekit.cli.github_fork_org',
+    'get-ratelimit': 'codekit.cli.github_get_ratelimit',
+    'list-repos': 'codekit.cli.github_list_repos',
+    'mv-repos-to-team': 'codekit.cli.github_mv_repos_to_team',
+    'sync-teams': 'codekit.cli.github_sync_teams',
+    'tag-release': 'codekit.cli.github_tag_release',
+    'tag-teams': 'codekit.cli.github_tag_teams',
+}
+
+# separates chained subcommands
+CHAIN = '+'
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    prog = 'codekit'
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent("""
+            Run one or more codekit commands in a single process.
+
+            Each subcommand accepts the same arguments as the github-<name>
+            command. Subcommands may be chained with a "{chain}" argument, in
+            which case they are run in order, sharing a github login (and its
+            http session) and api response caches. The chain stops at the
+            first subcommand which fails.
+
+            With --daemon, the subcommand(s) are run by a `{prog} daemon`
+            process, which keeps logins and api caches warm between
+            invocations. They are run locally if no daemon is listening.
+
+            Subcommands:
+
+                {subcommands}
+
+            Examples:
+
+                {prog} tag-teams --help
+
+                {prog} \\
+                    list-repos --org lsst --format jsonl \\
+                    {chain} tag-teams --org lsst --allow-team 'DM' --tag w.1 \\
+                    {chain} get-ratelimit
+        """).format(
+            prog=prog,
+            chain=CHAIN,
+            subcommands="\n                ".join(sorted(SUBCOMMANDS)),
+        ),
+        epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
+    )
+
+    parser.add_argument(
+        'subcommand',
+        choices=sorted(SUBCOMMANDS),
+        metavar='SUBCOMMAND',
+        help='Subcommand to run')
+    parser.add_argument(
+        'args',
+        nargs=argparse.REMAINDER,
+        help="Arguments of the subcommand, optionally followed by"
+             " '{chain} SUBCOMMAND ...'".format(chain=CHAIN))
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Run the subcommand(s) in a running codekit daemon')
+    parser.add_argument(
+        '--socket',
+        help='Path of the daemon socket. (default: $CODEKIT_DAEMON_SOCKET or'
+             ' daemon.sock in the codekit cache dir)')
+    parser.add_argument(
+        '-d', '--debug',
+        action='count',
+        default=codetools.debug_lvl_from_env(),
+        help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
+
+    return parser.parse_args(argv)
+
+
+def split_chain(argv):
+    """Split a command-line into the argv of each chained subcommand"""
+    chain = [[]]
+    for arg in argv:
+        if arg == CHAIN:
+            chain.append([])
+        else:
+            chain[-1].append(arg)
+
+    return [c for c in chain if c]
+
+
+def submit(parsed):
+    """Run parsed subcommands in a daemon.
+
+    Returns
+    -------
+    status: int or None
+        exit status of the subcommands or `None` if no daemon is listening.
+    """
+    first = parsed[0]
+    argv = ['-d'] * first.debug
+    if first.profile:
+        argv.append('--profile')
+    if first.profile_pstats:
+        argv += ['--profile-pstats', first.profile_pstats]
+    if first.profile_memory:
+        argv.append('--profile-memory')
+    for n, args in enumerate(parsed):
+        if n:
+            argv.append(CHAIN)
+        argv += [args.subcommand] + args.args
+
+    try:
+        return daemon.submit(argv, path=first.socket)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        debug("no daemon is listening, running locally: {e}".format(e=e))
+        return None
+
+
+def run(argv=None, local=False):
+    """Run subcommands.
+
+    `local` is set by the daemon, which must not pass jobs on to itself.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+
+    steps = split_chain(argv)
+    if not steps:
+        parse_args(argv)
+
+    # each step is validated before any of them are run
+    parsed = [parse_args(s) for s in steps]
+    codetools.setup_logging(parsed[0].debug)
+
+    if local:
+        if any(args.subcommand == 'daemon' for args in parsed):
+            sys.exit('a daemon can not be run by a daemon')
+    elif parsed[0].daemon:
+        status = submit(parsed)
+        if status is not None:
+            sys.exit(status)
+
+    profiling.configure(parsed[0])
+
+    for n, args in enumerate(parsed, start=1):
+        debug("running {n}/{t}: {cmd} {args}".format(
+            n=n,
+            t=len(parsed),
+            cmd=args.subcommand,
+            args=args.args,
+        ))
+        mod = importlib.import_module(SUBCOMMANDS[args.subcommand])
+        status = codetools.run_command(
+            mod.run,
+            args.args,
+            errors=getattr(mod, 'COMMAND_ERRORS', ()),
+        )
+        if status:
+            # the chain stops at the first subcommand which fails
+            sys.exit(status)
+
+
+def main():
+    try:
+        try:
+            sys.exit(codetools.run_command(run))
+        finally:
+            for g in pygithub.get_logins():
+                pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
+    except SystemExit as e:
+        debug("exit {status}".format(status=str(e)))
+        raise e
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from codekit.codetools import debug, info
+from codekit import codetools, daemon
+from codekit.cli import codekit as codekit_cli
+import argparse
+import functools
+import sys
+import textwrap
+
+# errors which are reported, rather than raised, by a run of the command;
+# see `codetools.run_command()`
+COMMAND_ERRORS = (RuntimeError,)
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    prog = 'codekit-daemon'
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent("""
+            Run codekit commands on behalf of `codekit --daemon` clients.
+
+            The daemon keeps github logins (and their http connection pools),
+            the repos.yaml index, repo team memberships and versiondb
+            manifests in memory between commands. Commands are run one at a
+            time, in the working directory of the client.
+
+            Example:
+
+                {prog} --idle-timeout 3600 &
+
+                codekit --daemon list-repos --org lsst
+        """).format(prog=prog),
+        epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
+    )
+
+    parser.add_argument(
+        '--socket',
+        help='Path of the unix socket to listen on. (default:'
+             ' $CODEKIT_DAEMON_SOCKET or daemon.sock in the codekit cache'
+             ' dir)')
+    parser.add_argument(
+        '--cache-ttl',
+        default=600,
+        type=float,
+        metavar='SECONDS',
+        help='Empty in-memory api caches once they are older than SECONDS.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        metavar='SECONDS',
+        help='Exit after SECONDS without a command to run.')
+    parser.add_argument(
+        '-d', '--debug',
+        action='count',
+        default=codetools.debug_lvl_from_env(),
+        help='Debug mode (can specify several times)')
+    parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
+
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    """Serve codekit commands"""
+    args = parse_args(argv)
+
+    codetools.setup_logging(args.debug)
+
+    d = daemon.Daemon(
+        args.socket or daemon.default_socket_path(),
+        functools.partial(codekit_cli.run, local=True),
+        cache_ttl=args.cache_ttl,
+        idle_timeout=args.idle_timeout,
+    )
+    try:
+        d.serve()
+    except KeyboardInterrupt:
+        info('interrupted, exiting')
+    finally:
+        d.server_close()
+
+    debug("ran {n} job(s)".format(n=d.jobs))
+
+
+def main():
+    try:
+        sys.exit(codetools.run_command(run, errors=COMMAND_ERRORS))
+    except SystemExit as e:
+        debug("exit {status}".format(status=str(e)))
+        raise e
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,19 @@
 # --------------
 # - add command line option for delete scope
 
-from codekit.codetools import debug, error
-from codekit import codetools, pygithub
+from codekit.codetools import debug
+from codekit import codetools, events, profiling, pygithub
 from getpass import getpass
 import argparse
-import github
 import os
 import platform
 import sys
 import textwrap
 
+github = codetools.lazy_import('github')
 
-def parse_args():
+
+def parse_args(argv=None):
     """Parse command line arguments"""
     prog = 'github-auth'
 
@@ -58,18 +59,22 @@ def parse_args():
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
-def run():
+def run(argv=None):
     """Log in and store credentials"""
-    args = parse_args()
+    args = parse_args(argv)
 
     appname = sys.argv[0]
     hostname = platform.node()
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
 
     password = ''
 
@@ -143,16 +148,12 @@ def run():
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 
-from codekit.codetools import debug, error, info, warn
-from codekit import codetools, pygithub
-from time import sleep
+from codekit.codetools import debug, info, warn
+from codekit import codetools, concurrency, events, profiling, pygithub
 import argparse
 import codekit.progressbar as pbar
-import github
 import itertools
 import sys
 import textwrap
+import time
 
+github = codetools.lazy_import('github')
 
-def parse_args():
+
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-decimate-org'
 
@@ -65,6 +66,14 @@ def parse_args():
         default=None,
         type=int,
         help='Maximum number of teams to delete')
+    parser.add_argument(
+        '--max-workers',
+        default=16,
+        type=int,
+        help='Maximum number of concurrent delete requests. Concurrency is'
+             ' increased up to this limit while github responds normally and'
+             ' reduced when github signals a secondary rate limit.'
+             ' (default: %(default)s)')
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument(
         '--fail-fast',
@@ -81,8 +90,10 @@ def parse_args():
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def delete_all_repos(org, **kwargs):
@@ -107,31 +118,68 @@ def delete_all_repos(org, **kwargs):
     return delete_repos(repos, **kwargs)
 
 
-def delete_repos(repos, fail_fast=False, dry_run=False, delay=0):
+def report_throughput(what, n, start, limiter):
+    elapsed = time.monotonic() - start
+    info("deleted {n} {what} in {t:.1f}s ({r:.2f}/s, peak concurrency {c},"
+         " throttled {x} time(s))".format(
+             n=n,
+             what=what,
+             t=elapsed,
+             r=n / elapsed if elapsed else 0,
+             c=limiter.peak,
+             x=limiter.throttled,
+         ))
+
+
+@profiling.phase('delete repos')
+def delete_repos(repos, fail_fast=False, dry_run=False, max_workers=16):
     assert isinstance(repos, list), type(repos)
 
-    problems = []
-    for r in repos:
+    def delete(r):
         assert isinstance(r, github.Repository.Repository), type(r)
 
-        if delay:
-            sleep(delay)
+        info("deleting: {r}".format(r=r.full_name))
+        if not dry_run:
+            try:
+                # leave the secondary rate limit to map_adaptive, which
+                # lowers the concurrency of all workers
+                with pygithub.caller_handles_throttling():
+                    r.delete()
+            except github.GithubException as e:
+                # the secondary rate limit is retried by map_adaptive (see
+                # throttle_delay()), and recorded as a problem once retries
+                # are exhausted
+                if pygithub.is_secondary_rate_limit(e):
+                    msg = 'FAILED - throttled by github'
+                elif isinstance(e, github.RateLimitExceededException):
+                    raise
+                else:
+                    msg = 'FAILED - does your token have delete_repo scope?'
+                raise pygithub.CaughtRepositoryError(r, e, msg) from None
+        else:
+            info('  (noop)')
 
-        try:
-            info("deleting: {r}".format(r=r.full_name))
-            if dry_run:
-                info('  (noop)')
-                continue
-            r.delete()
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'FAILED - does your token have delete_repo scope?'
-            yikes = pygithub.CaughtRepositoryError(r, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
+        events.emit(
+            'action',
+            action='delete repo',
+            repo=r.full_name,
+            dry_run=dry_run,
+        )
+
+    limiter = concurrency.AdaptiveLimiter(
+        initial=min(2, max_workers),
+        maximum=max_workers,
+    )
+    start = time.monotonic()
+    _, problems = concurrency.map_adaptive(
+        delete,
+        repos,
+        limiter,
+        throttled=pygithub.throttle_delay,
+        catch=(pygithub.CaughtRepositoryError,),
+        fail_fast=fail_fast,
+    )
+    report_throughput('repo(s)', len(repos) - len(problems), start, limiter)
 
     return problems
 
@@ -158,36 +206,62 @@ def delete_all_teams(org, **kwargs):
     return delete_teams(teams, **kwargs)
 
 
-def delete_teams(teams, fail_fast=False, dry_run=False, delay=0):
+@profiling.phase('delete teams')
+def delete_teams(teams, fail_fast=False, dry_run=False, max_workers=16):
     assert isinstance(teams, list), type(teams)
 
-    problems = []
-    for t in teams:
-        if delay:
-            sleep(delay)
+    def delete(t):
+        info("deleting team: '{t}'".format(t=t.name))
+        if not dry_run:
+            try:
+                # leave the secondary rate limit to map_adaptive, which
+                # lowers the concurrency of all workers
+                with pygithub.caller_handles_throttling():
+                    t.delete()
+            except github.GithubException as e:
+                # the secondary rate limit is retried by map_adaptive (see
+                # throttle_delay()), and recorded as a problem once retries
+                # are exhausted
+                if (
+                    isinstance(e, github.RateLimitExceededException) and
+                    not pygithub.is_secondary_rate_limit(e)
+                ):
+                    raise
+                raise pygithub.CaughtTeamError(t, e) from None
+        else:
+            info('  (noop)')
 
-        try:
-            info("deleting team: '{t}'".format(t=t.name))
-            if dry_run:
-                info('  (noop)')
-                continue
-            t.delete()
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            yikes = pygithub.CaughtTeamError(t, e)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
+        events.emit(
+            'action',
+            action='delete team',
+            team=t.name,
+            dry_run=dry_run,
+        )
+
+    limiter = concurrency.AdaptiveLimiter(
+        initial=min(2, max_workers),
+        maximum=max_workers,
+    )
+    start = time.monotonic()
+    _, problems = concurrency.map_adaptive(
+        delete,
+        teams,
+        limiter,
+        throttled=pygithub.throttle_delay,
+        catch=(pygithub.CaughtTeamError,),
+        fail_fast=fail_fast,
+    )
+    report_throughput('team(s)', len(teams) - len(problems), start, limiter)
 
     return problems
 
 
-def run():
-    args = parse_args()
+def run(argv=None):
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
 
     global g
     g = pygithub.login_github(token_path=args.token_path, token=args.token)
@@ -202,6 +276,7 @@ def run():
             org,
             fail_fast=args.fail_fast,
             limit=args.delete_repos_limit,
+            max_workers=args.max_workers,
             dry_run=args.dry_run
         )
 
@@ -210,6 +285,7 @@ def run():
             org,
             fail_fast=args.fail_fast,
             limit=args.delete_teams_limit,
+            max_workers=args.max_workers,
             dry_run=args.dry_run
         )
 
@@ -225,16 +301,12 @@ def run():
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -1,21 +1,29 @@
 #!/usr/bin/env python3
 
 from codekit.codetools import debug, error, info, warn
-from codekit import codetools, pygithub
+from codekit import codetools, concurrency, events, profiling, pygithub
 import argparse
+import collections
 import codekit.progressbar as pbar
 import datetime
-import github
 import itertools
 import sys
 import textwrap
+import time
+
+github = codetools.lazy_import('github')
+requests = codetools.lazy_import('requests')
 
 
 class TeamError(Exception):
     pass
 
 
-def parse_args():
+class ForkTimeoutError(Exception):
+    pass
+
+
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-fork-org'
 
@@ -76,6 +84,14 @@ def parse_args():
             teams a repo is a member of, reguardless if they were specified as
             a selection "--team" or not.\
         """))
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help=textwrap.dedent("""\
+            Only fork repos which do not already exist in the destination
+            org. With --copy-teams, missing teams are created and missing
+            team memberships are added to existing teams.\
+        """))
     parser.add_argument(
         '--fail-fast',
         action='store_true',
@@ -86,16 +102,37 @@ def parse_args():
         const=False,
         dest='fail_fast',
         help='DO NOT Fail immediately on github API errors. (default)')
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Number of concurrent github API write requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--pace',
+        default=1.0,
+        type=float,
+        help='Minimum number of seconds between github API write requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--fork-timeout',
+        default=600,
+        type=float,
+        help='Maximum number of seconds to wait for forks to become ready.'
+             ' (default: %(default)s)')
     parser.add_argument('--dry-run', action='store_true')
     parser.add_argument(
         '-d', '--debug',
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
+@profiling.phase('find teams')
 def find_teams_by_repo(src_repos):
     assert isinstance(src_repos, list), type(src_repos)
 
@@ -104,21 +141,13 @@ def find_teams_by_repo(src_repos):
 
     src_rt = {}
     for r in src_repos:
-        try:
-            teams = r.get_teams()
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtRepositoryError(r, e, msg) from None
-
-        team_names = [t.name for t in teams]
+        team_names = pygithub.get_repo_team_names(r)
         debug("  {repo: >{w}} {teams}".format(
             repo=r.full_name,
             w=max_name_len,
             teams=team_names
         ))
-        src_rt[r.full_name] = {'repo': r, 'teams': teams}
+        src_rt[r.full_name] = {'repo': r, 'teams': team_names}
 
     return src_rt
 
@@ -130,7 +159,7 @@ def find_used_teams(src_rt):
     # objects as value(s)
     used_teams = {}
     for k, v in src_rt.items():
-        for name in [t.name for t in v['teams']]:
+        for name in v['teams']:
             if name not in used_teams:
                 used_teams[name] = [v['repo']]
             else:
@@ -139,14 +168,35 @@ def find_used_teams(src_rt):
     return used_teams
 
 
+@profiling.phase('create teams')
 def create_teams(
     org,
     teams,
     with_repos=False,
     ignore_existing=False,
+    workers=1,
+    pace=0,
     fail_fast=False,
     dry_run=False
 ):
+    """Create teams concurrently.
+
+    Parameters
+    ----------
+    teams: dict(str, list(github.Repository.Repository))
+        member repos keyed by team name
+    workers: int
+        Number of concurrent write requests.
+    pace: float
+        Minimum number of seconds between write requests (across all
+        workers).
+
+    Returns
+    -------
+    dst_teams: dict(str, github.Team.Team)
+        created (or existing, with `ignore_existing`) teams keyed by name
+    problems: list
+    """
     assert isinstance(org, github.Organization.Organization), type(org)
     assert isinstance(teams, dict), type(teams)
 
@@ -155,13 +205,24 @@ def create_teams(
     # already exists.
 
     debug("creating teams in {org}".format(org=org.login))
+    pygithub.debug_ratelimit(g)
 
-    # dict of dst org teams keyed by name (str) with team object as value
-    dst_teams = {}
-    problems = []
+    pacer = concurrency.Pacer(pace)
     batch_repos = 50
-    for name, repos in teams.items():
-        pygithub.debug_ratelimit(g)
+    # list of (team, repo) over the batch limit
+    leftover = []
+
+    def find_team(name, e):
+        """Find a team whose creation failed with error `e` because its
+        name has been taken."""
+        t = pygithub.get_team_index(org, refresh=True).by_name.get(name)
+        if t is None:
+            msg = "unable to find existing team: {t}".format(t=name)
+            raise pygithub.CaughtOrganizationError(org, e, msg) from None
+        return t
+
+    def create_team(name):
+        repos = teams[name]
         debug("creating team {o}/'{t}'".format(
             o=org.login,
             t=name
@@ -169,126 +230,487 @@ def create_teams(
 
         if dry_run:
             debug('  (noop)')
-            continue
+            events.emit(
+                'action',
+                action='create team',
+                team=name,
+                org=org.login,
+                dry_run=True,
+            )
+            return None
+
+        # attempts made by with_retries().  A team may be created by an
+        # attempt which fails with a server error, in which case the next
+        # attempt finds that the name has been taken.
+        attempts = []
+
+        def create(*args, **kwargs):
+            attempts.append(None)
+            return org.create_team(*args, **kwargs)
+
+        if with_repos:
+            debug("  with {n} member repos:".format(n=len(repos)))
+            [debug("    {r}".format(r=r.full_name)) for r in repos]
+
+            if len(repos) > batch_repos:
+                debug("  creating team with first {b} of {n} repos".format(
+                    b=batch_repos,
+                    n=len(repos)
+                ))
 
-        dst_t = None
         try:
+            pacer.wait()
             if with_repos:
-                debug("  with {n} member repos:".format(n=len(repos)))
-                [debug("    {r}".format(r=r.full_name)) for r in repos]
-
-                leftover_repos = repos[batch_repos:]
-                if leftover_repos:
-                    debug("  creating team with first {b} of {n} repos"
-                          .format(
-                              b=batch_repos,
-                              n=len(repos)
-                          ))
-                dst_t = org.create_team(name, repo_names=repos[:batch_repos])
-                if leftover_repos:
-                    # add any repos over the batch limit individually to team
-                    for r in leftover_repos:
-                        debug("  adding repo {r}".format(r=r.full_name))
-                        dst_t.add_to_repos(r)
+                dst_t = pygithub.with_retries(
+                    create,
+                    name,
+                    repo_names=repos[:batch_repos]
+                )
             else:
-                dst_t = org.create_team(name)
+                dst_t = pygithub.with_retries(create, name)
         except github.RateLimitExceededException:
             raise
         except github.GithubException as e:
+            taken = e.status == 422 and any(
+                'Name has already been taken' in oops.get('message', '')
+                for oops in (e.data or {}).get('errors', [])
+            )
             # if the error is for any cause other than the team already
             # existing, puke.
-            team_exists = False
-            if ignore_existing and 'errors' in e.data:
-                for oops in e.data['errors']:
-                    msg = oops['message']
-                    if 'Name has already been taken' in msg:
-                        # find existing team
-                        dst_t = pygithub.get_teams_by_name(org, name)[0]
-                        team_exists = True
-            if not (ignore_existing and team_exists):
+            if not taken:
                 msg = "error creating team: {t}".format(t=name)
-                yikes = pygithub.CaughtOrganizationError(org, e, msg)
-                if fail_fast:
-                    raise yikes from None
-                problems.append(yikes)
-                error(yikes)
-                break
-        else:
-            dst_teams[dst_t.name] = dst_t
+                raise pygithub.CaughtOrganizationError(org, e, msg) from None
+
+            if len(attempts) > 1:
+                debug("  created by an earlier attempt")
+                dst_t = find_team(name, e)
+            elif ignore_existing:
+                return find_team(name, e)
+            else:
+                msg = "error creating team: {t}".format(t=name)
+                raise pygithub.CaughtOrganizationError(org, e, msg) from None
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ) as e:
+            # the team may have been created even though no answer was
+            # received
+            index = pygithub.get_team_index(org, refresh=True)
+            dst_t = index.by_name.get(name)
+            if dst_t is None:
+                raise TeamError("error creating team: {t}: {e}".format(
+                    t=name,
+                    e=e,
+                )) from None
+            debug("  created, despite: {e}".format(e=e))
+
+        if with_repos:
+            # any repos over the batch limit are added individually
+            leftover.extend((dst_t, r) for r in repos[batch_repos:])
+
+        events.emit(
+            'action',
+            action='create team',
+            team=name,
+            org=org.login,
+            dry_run=False,
+        )
+        return dst_t
+
+    names = list(teams.keys())
+    created, problems = concurrency.map_concurrently(
+        create_team,
+        names,
+        workers=workers,
+        catch=(pygithub.CaughtOrganizationError, TeamError),
+        fail_fast=fail_fast,
+    )
+
+    dst_teams = {name: t for name, t in zip(names, created) if t is not None}
+
+    if leftover:
+        debug("adding {n} leftover repos to teams".format(n=len(leftover)))
+        problems += add_team_repos(
+            leftover,
+            workers=workers,
+            pace=pace,
+            fail_fast=fail_fast,
+            dry_run=dry_run,
+        )
 
     return dst_teams, problems
 
 
+@profiling.phase('create forks')
 def create_forks(
     dst_org,
     src_repos,
+    workers=1,
+    pace=0,
     fail_fast=False,
     dry_run=False
 ):
-    assert isinstance(dst_org, github.Organization.Organization),\
+    """Request forks of repos concurrently.
+
+    Parameters
+    ----------
+    workers: int
+        Number of fork requests in flight at once.
+    pace: float
+        Minimum number of seconds between fork requests (across all workers).
+
+    Returns
+    -------
+    dst_repos: list(github.Repository.Repository)
+        Forks in the same order as `src_repos`. These may not yet be ready;
+        see `wait_for_forks()`.
+    skipped_repos: list(github.Repository.Repository)
+        Source repos which can not be forked.
+    problems: list
+    """
+    assert isinstance(dst_org, github.Organization.Organization), \
         type(dst_org)
     assert isinstance(src_repos, list), type(src_repos)
 
-    repo_count = len(src_repos)
-
-    dst_repos = []
+    pacer = concurrency.Pacer(pace)
     skipped_repos = []
-    problems = []
-    with pbar.eta_bar(msg='forking', max_value=repo_count) as progress:
-        repo_idx = 0
-        for r in src_repos:
-            progress.update(repo_idx)
-            repo_idx += 1
-
-            # XXX per
-            # https://developer.github.com/v3/repos/forks/#create-a-fork
-            # fork creation is async and pygithub doesn't appear to wait.
-            # https://github.com/PyGithub/PyGithub/blob/c44469965e4ea368b78c4055a8afcfcf08314585/github/Organization.py#L321-L336
-            # so its possible that this may fail in some strange way such as
-            # not returning all repo data, but it hasn't yet been observed.
-
-            # get current time before API call in case fork creation is slow.
-            now = datetime.datetime.now()
-
-            debug("forking {r}".format(r=r.full_name))
-            if dry_run:
-                debug('  (noop)')
-                continue
 
+    def fork_repo(r):
+        # per
+        # https://developer.github.com/v3/repos/forks/#create-a-fork
+        # fork creation is async and pygithub doesn't wait. The returned repo
+        # object is used to track the fork until it is ready.
+
+        # get current time before API call in case fork creation is slow.
+        now = datetime.datetime.now()
+
+        debug("forking {r}".format(r=r.full_name))
+        if dry_run:
+            debug('  (noop)')
+            events.emit(
+                'action',
+                action='fork',
+                repo=r.full_name,
+                org=dst_org.login,
+                dry_run=True,
+            )
+            return None
+
+        pacer.wait()
+        try:
+            fork = dst_org.create_fork(r)
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            if 'Empty repositories cannot be forked.' in e.data['message']:
+                warn("{r} is empty and can not be forked".format(
+                    r=r.full_name
+                ))
+                skipped_repos.append(r)
+                return None
+
+            msg = "error forking repo {r}".format(r=r.full_name)
+            raise pygithub.CaughtOrganizationError(dst_org, e, msg) from None
+
+        debug("  -> {r}".format(r=fork.full_name))
+        events.emit(
+            'action',
+            action='fork',
+            repo=r.full_name,
+            fork=fork.full_name,
+            org=dst_org.login,
+            dry_run=False,
+        )
+
+        if fork.created_at < now:
+            warn("fork of {r} already exists\n  created_at {ctime}".format(
+                r=fork.full_name,
+                ctime=fork.created_at
+            ))
+
+        return fork
+
+    with pbar.eta_bar(msg='forking', max_value=len(src_repos)) as progress:
+        forks, problems = concurrency.map_concurrently(
+            fork_repo,
+            src_repos,
+            workers=workers,
+            catch=(pygithub.CaughtOrganizationError,),
+            fail_fast=fail_fast,
+            progress=progress,
+        )
+
+    dst_repos = [f for f in forks if f is not None]
+
+    return dst_repos, skipped_repos, problems
+
+
+@profiling.phase('wait for forks')
+def wait_for_forks(
+    dst_org,
+    dst_repos,
+    timeout=600,
+    interval=2,
+    max_interval=60,
+):
+    """Wait for asynchronously created forks to become ready.
+
+    A fork is considered ready once the head of its default branch can be
+    resolved, which is only the case after github has copied its git objects.
+    The forks which are not yet ready are polled in batches (see
+    `pygithub.get_default_heads()`), with an exponentially increasing delay
+    between polls.
+
+    Parameters
+    ----------
+    dst_repos: list(github.Repository.Repository)
+        Forks returned by `create_forks()`.
+    timeout: float
+        Maximum number of seconds to wait.
+    interval: float
+        Initial number of seconds between polls.
+    max_interval: float
+        Maximum number of seconds between polls.
+
+    Returns
+    -------
+    ready: list(github.Repository.Repository)
+        Forks which are ready.
+    problems: list(ForkTimeoutError)
+        Forks which did not become ready before the timeout.
+    """
+    assert isinstance(dst_org, github.Organization.Organization), \
+        type(dst_org)
+
+    # forks may have been renamed (eg. `foo-1`) to avoid existing repos, so
+    # they are tracked by the full name returned when they were created
+    pending = collections.OrderedDict((r.full_name, r) for r in dst_repos)
+
+    deadline = time.monotonic() + timeout
+    while pending:
+        try:
+            heads = pygithub.get_default_heads(list(pending.values()))
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            msg = 'error resolving the default branch of forks'
+            raise pygithub.CaughtOrganizationError(dst_org, e, msg) from None
+
+        for full_name in heads:
+            pending.pop(full_name, None)
+
+        debug("{n} of {t} fork(s) are ready".format(
+            n=len(dst_repos) - len(pending),
+            t=len(dst_repos),
+        ))
+
+        if not pending:
+            break
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+    problems = []
+    for full_name in pending:
+        yikes = ForkTimeoutError(
+            "fork {r} was not ready after {t}s".format(
+                r=full_name,
+                t=timeout,
+            ))
+        problems.append(yikes)
+        error(yikes)
+
+    return [r for r in dst_repos if r.full_name not in pending], problems
+
+
+@profiling.phase('add team repos')
+def add_team_repos(
+    memberships,
+    workers=1,
+    pace=0,
+    fail_fast=False,
+    dry_run=False,
+):
+    """Add repos to existing teams concurrently.
+
+    Parameters
+    ----------
+    memberships: list(tuple(github.Team.Team, github.Repository.Repository))
+    workers: int
+        Number of concurrent write requests.
+    pace: float
+        Minimum number of seconds between write requests (across all
+        workers).
+
+    Returns
+    -------
+    problems: list(codekit.pygithub.CaughtTeamError)
+    """
+    pacer = concurrency.Pacer(pace)
+
+    def add(item):
+        t, r = item
+        debug("adding repo {r} to team '{t}'".format(r=r.full_name, t=t.name))
+        if not dry_run:
+            pacer.wait()
             try:
-                fork = dst_org.create_fork(r)
-                dst_repos.append(fork)
-                debug("  -> {r}".format(r=fork.full_name))
+                pygithub.with_retries(t.add_to_repos, r)
             except github.RateLimitExceededException:
                 raise
             except github.GithubException as e:
-                if 'Empty repositories cannot be forked.' in e.data['message']:
-                    warn("{r} is empty and can not be forked".format(
-                        r=r.full_name
-                    ))
-                    skipped_repos.append(r)
-                    continue
-
-                msg = "error forking repo {r}".format(r=r.full_name)
-                yikes = pygithub.CaughtOrganizationError(dst_org, e, msg)
-                if fail_fast:
-                    raise yikes from None
-                problems.append(yikes)
-                error(yikes)
-
-            if fork.created_at < now:
-                warn("fork of {r} already exists\n  created_at {ctime}".format(
-                    r=fork.full_name,
-                    ctime=fork.created_at
-                ))
+                raise pygithub.CaughtTeamError(t, e) from None
+        else:
+            debug('  (noop)')
+
+        events.emit(
+            'action',
+            action='add to team',
+            repo=r.full_name,
+            team=t.name,
+            dry_run=dry_run,
+        )
+
+    _, problems = concurrency.map_concurrently(
+        add,
+        memberships,
+        workers=workers,
+        catch=(pygithub.CaughtTeamError,),
+        fail_fast=fail_fast,
+    )
+
+    return problems
 
-    return dst_repos, skipped_repos, problems
 
+@profiling.phase('sync forks')
+def sync_forks(
+    src_org,
+    dst_org,
+    src_repos,
+    copy_teams=False,
+    workers=1,
+    pace=0,
+    fork_timeout=600,
+    fail_fast=False,
+    dry_run=False,
+):
+    """Fork only the repos missing from the destination org and, optionally,
+    add only the missing team memberships.
+
+    The source and destination orgs are indexed up front so that the cost of
+    a sync is proportional to what has changed rather than to the number of
+    repos.
+
+    Returns
+    -------
+    problems: list
+    """
+    assert isinstance(src_org, github.Organization.Organization), \
+        type(src_org)
+    assert isinstance(dst_org, github.Organization.Organization), \
+        type(dst_org)
+
+    problems = []
+
+    debug("indexing repos in {o}".format(o=dst_org.login))
+    try:
+        dst_repos = {r.name: r for r in dst_org.get_repos()}
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = 'error getting repos'
+        raise pygithub.CaughtOrganizationError(dst_org, e, msg) from None
+
+    missing_repos = [r for r in src_repos if r.name not in dst_repos]
+    info("{n} of {t} repo(s) need to be forked".format(
+        n=len(missing_repos),
+        t=len(src_repos),
+    ))
+
+    if missing_repos:
+        forks, _, err = create_forks(
+            dst_org,
+            missing_repos,
+            workers=workers,
+            pace=pace,
+            fail_fast=fail_fast,
+            dry_run=dry_run,
+        )
+        problems += err
+
+        if forks:
+            forks, err = wait_for_forks(
+                dst_org,
+                forks,
+                timeout=fork_timeout,
+            )
+            problems += err
 
-def run():
-    args = parse_args()
+        dst_repos.update((r.name, r) for r in forks)
+
+    if not copy_teams:
+        return problems
+
+    debug("indexing teams in {o}".format(o=src_org.login))
+    _, src_team_repos = pygithub.get_team_repos_index(src_org)
+    debug("indexing teams in {o}".format(o=dst_org.login))
+    dst_teams, dst_team_repos = pygithub.get_team_repos_index(dst_org)
+
+    src_names = set(r.name for r in src_repos)
+
+    # dict of str(team.name): [repos] to be created
+    new_teams = {}
+    # list of (team, repo) to be added to existing teams
+    new_memberships = []
+    for name, repos in src_team_repos.items():
+        wanted = [dst_repos[n] for n in repos
+                  if n in src_names and n in dst_repos]
+        if not wanted:
+            continue
+
+        if name not in dst_teams:
+            new_teams[name] = wanted
+            continue
+
+        new_memberships += [(dst_teams[name], r) for r in wanted
+                            if r.name not in dst_team_repos[name]]
+
+    info("{n} team(s) to create, {m} team membership(s) to add".format(
+        n=len(new_teams),
+        m=len(new_memberships),
+    ))
+
+    _, err = create_teams(
+        dst_org,
+        new_teams,
+        with_repos=True,
+        workers=workers,
+        pace=pace,
+        fail_fast=fail_fast,
+        dry_run=dry_run
+    )
+    problems += err
+
+    problems += add_team_repos(
+        new_memberships,
+        workers=workers,
+        pace=pace,
+        fail_fast=fail_fast,
+        dry_run=dry_run,
+    )
+
+    return problems
+
+
+def run(argv=None):
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
 
     global g
     g = pygithub.login_github(token_path=args.token_path, token=args.token)
@@ -303,21 +725,14 @@ def run():
     debug('looking for repos -- this can take a while for large orgs...')
     if args.team:
         debug('checking that selection team(s) exist')
-        try:
-            org_teams = list(src_org.get_teams())
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtOrganizationError(src_org, e, msg) from None
+        org_teams = pygithub.get_team_index(src_org).by_name
 
-        missing_teams = [n for n in args.team if n not in
-                         [t.name for t in org_teams]]
+        missing_teams = [n for n in args.team if n not in org_teams]
         if missing_teams:
             error("{n} team(s) do not exist:".format(n=len(missing_teams)))
             [error("  '{t}'".format(t=n)) for n in missing_teams]
             return
-        fork_teams = [t for t in org_teams if t.name in args.team]
+        fork_teams = [t for n, t in org_teams.items() if n in args.team]
         repos = pygithub.get_repos_by_team(fork_teams)
         debug('selecting repos by membership in team(s):')
         [debug("  '{t}'".format(t=t.name)) for t in fork_teams]
@@ -337,6 +752,24 @@ def run():
     ))
     [debug("  {r}".format(r=r.full_name)) for r in src_repos]
 
+    if args.sync:
+        problems = sync_forks(
+            src_org,
+            dst_org,
+            src_repos,
+            copy_teams=args.copy_teams,
+            workers=args.workers,
+            pace=args.pace,
+            fork_timeout=args.fork_timeout,
+            fail_fast=args.fail_fast,
+            dry_run=args.dry_run,
+        )
+        if problems:
+            msg = "{n} errors syncing repo(s)/teams(s)".format(
+                n=len(problems))
+            raise codetools.DogpileError(problems, msg)
+        return
+
     if args.copy_teams:
         debug('checking source repo team membership...')
         # dict of repo and team objects, keyed by repo name
@@ -374,12 +807,24 @@ def run():
     dst_repos, skipped_repos, err = create_forks(
         dst_org,
         src_repos,
+        workers=args.workers,
+        pace=args.pace,
         fail_fast=args.fail_fast,
         dry_run=args.dry_run
     )
     if err:
         problems += err
 
+    if dst_repos:
+        # only forks which are ready can be added to teams
+        dst_repos, err = wait_for_forks(
+            dst_org,
+            dst_repos,
+            timeout=args.fork_timeout,
+        )
+        if err:
+            problems += err
+
     if args.copy_teams:
         # filter out repos which were skipped
         # dict of str(fork_repo.name): fork_repo
@@ -389,12 +834,15 @@ def run():
         dst_teams = {}
         for name, repos in src_teams.items():
             dst_teams[name] = [dst_forks[r.name] for r in repos
-                               if r.name not in bad_repos]
+                               if r.name not in bad_repos and
+                               r.name in dst_forks]
 
         _, err = create_teams(
             dst_org,
             dst_teams,
             with_repos=True,
+            workers=args.workers,
+            pace=args.pace,
             fail_fast=args.fail_fast,
             dry_run=args.dry_run
         )
@@ -410,16 +858,12 @@ def run():
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 
-from codekit.codetools import debug, error, info
-from codekit import codetools, pygithub
+from codekit.codetools import debug, info, warn
+from codekit import codetools, events, profiling, pygithub
 import argparse
+import collections
 import datetime
+import os
 import sys
 import textwrap
+import threading
+import time
 
+github = codetools.lazy_import('github')
 
-def parse_args():
+DEFAULT_TOKEN_PATH = '~/.sq_github_token_delete'
+
+
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-get-ratelimit'
 
@@ -16,59 +24,287 @@ def parse_args():
         prog=prog,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description=textwrap.dedent("""
-            Display the current github ReST API request ratelimit.
+            Display the current github API request ratelimit(s).
+
+            With --monitor, the ratelimits of all resource buckets (core,
+            graphql, search, ...) are polled for each token and exported in
+            the prometheus text format, along with the rate at which each
+            ratelimit is being consumed. Polling does not count against any
+            ratelimit.
 
             Examples:
 
                 {prog}
+
+                {prog} \\
+                    --monitor \\
+                    --token-path ~/.sq_github_token \\
+                    --token-path ~/.sq_github_token_delete \\
+                    --listen 9101 \\
+                    --prometheus-file /var/lib/node_exporter/github.prom
         """).format(prog=prog),
         epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
     )
 
     parser.add_argument(
         '--token-path',
-        default='~/.sq_github_token_delete',
-        help='Use a token (made with github-auth) in a non-standard location')
+        action='append',
+        help='Use a token (made with github-auth) in a non-standard location'
+             ' (can specify several times)'
+             ' (default: {path})'.format(path=DEFAULT_TOKEN_PATH))
     parser.add_argument(
         '--token',
-        default=None,
-        help='Literal github personal access token string')
+        action='append',
+        help='Literal github personal access token string'
+             ' (can specify several times)')
+    parser.add_argument(
+        '--monitor',
+        action='store_true',
+        help='Poll ratelimits until interrupted')
+    parser.add_argument(
+        '--interval',
+        default=60,
+        type=float,
+        help='Number of seconds between polls. (default: %(default)s)')
+    parser.add_argument(
+        '--window',
+        default=600,
+        type=float,
+        help='Number of seconds over which the ratelimit consumption rate is'
+             ' estimated. (default: %(default)s)')
+    parser.add_argument(
+        '--prometheus-file',
+        metavar='PATH',
+        help='With --monitor, (re)write metrics to this file after each poll'
+             ' (e.g., for the node_exporter textfile collector)')
+    parser.add_argument(
+        '--listen',
+        metavar='PORT',
+        type=int,
+        help='With --monitor, serve metrics over http on this port')
     parser.add_argument(
         '-d', '--debug',
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+class RateMonitor(object):
+    """Keep recent samples of ratelimits to estimate the rate at which they
+    are being consumed.
+
+    Parameters
+    ----------
+    window: float
+        Number of seconds of samples to keep.
+    """
+
+    def __init__(self, window=600):
+        self.window = window
+        # latest limits keyed by (token label, resource)
+        self.limits = {}
+        # (time, remaining, reset) keyed by (token label, resource)
+        self._samples = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def update(self, label, limits, now=None):
+        now = time.time() if now is None else now
+
+        with self._lock:
+            for resource, rl in limits.items():
+                key = (label, resource)
+                self.limits[key] = rl
+
+                samples = self._samples[key]
+                # remaining is only comparable within the same reset period
+                if samples and samples[-1][2] != rl['reset']:
+                    samples.clear()
+                samples.append((now, rl['remaining'], rl['reset']))
+                while samples[0][0] < now - self.window:
+                    samples.popleft()
+
+    def rate(self, key):
+        """Requests consumed per second, over the sample window"""
+        samples = self._samples[key]
+        if len(samples) < 2:
+            return 0.0
+
+        (t0, r0, _), (t1, r1, _) = samples[0], samples[-1]
+        if t1 <= t0:
+            return 0.0
+        return max(0.0, (r0 - r1) / (t1 - t0))
+
+    def prometheus(self):
+        """Render the current values in the prometheus text format"""
+        metrics = [
+            ('limit', 'Maximum number of requests per period.',
+             lambda k, rl: rl['limit']),
+            ('remaining', 'Number of requests remaining in the period.',
+             lambda k, rl: rl['remaining']),
+            ('reset_timestamp_seconds', 'Time at which the period resets.',
+             lambda k, rl: rl['reset']),
+            ('consumption_per_second',
+             'Estimated rate of consumption of the ratelimit.',
+             lambda k, rl: round(self.rate(k), 6)),
+        ]
+
+        lines = []
+        with self._lock:
+            for name, doc, value in metrics:
+                name = "github_ratelimit_{n}".format(n=name)
+                lines.append("# HELP {n} {d}".format(n=name, d=doc))
+                lines.append("# TYPE {n} gauge".format(n=name))
+                for key, rl in sorted(self.limits.items()):
+                    lines.append(
+                        '{n}{{token="{t}",resource="{r}"}} {v}'.format(
+                            n=name,
+                            t=key[0],
+                            r=key[1],
+                            v=value(key, rl),
+                        ))
+
+        return "\n".join(lines) + "\n"
+
 
+def login_tokens(args):
+    """Login with each token.
 
-def run():
-    args = parse_args()
+    Returns
+    -------
+    logins: list(tuple(str, github.MainClass.Github))
+        github object keyed by a label identifying the token (without
+        revealing it)
+    """
+    logins = []
+    for path in args.token_path or []:
+        g = pygithub.login_github(token_path=path)
+        logins.append((path, g))
+    for n, token in enumerate(args.token or []):
+        g = pygithub.login_github(token=token)
+        logins.append(("token{n}".format(n=n), g))
+
+    if not logins:
+        g = pygithub.login_github(token_path=DEFAULT_TOKEN_PATH)
+        logins.append((DEFAULT_TOKEN_PATH, g))
+
+    return logins
+
+
+def write_metrics(path, text):
+    # write + rename so that a partial file is never scraped
+    tmp = "{path}.{pid}".format(path=path, pid=os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def serve_metrics(monitor, port):
+    """Serve metrics over http from a background thread"""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = monitor.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            debug(fmt % args)
+
+    server = http.server.HTTPServer(('', port), Handler)
+    t = threading.Thread(target=server.serve_forever, name='metrics')
+    t.daemon = True
+    t.start()
+    info("serving metrics on port {port}".format(port=port))
+
+    return server
+
+
+def monitor_ratelimits(logins, interval, window, prometheus_file, port):
+    monitor = RateMonitor(window=window)
+    if port is not None:
+        serve_metrics(monitor, port)
+
+    try:
+        while True:
+            for label, g in logins:
+                try:
+                    monitor.update(label, pygithub.get_rate_limits(g))
+                except github.GithubException as e:
+                    # keep monitoring through transient errors
+                    warn("error polling ratelimit of {t}: {e}".format(
+                        t=label,
+                        e=e,
+                    ))
+
+            for (label, resource), rl in sorted(monitor.limits.items()):
+                debug("{t} {r}: {n}/{m} ({c:.2f}/s)".format(
+                    t=label,
+                    r=resource,
+                    n=rl['remaining'],
+                    m=rl['limit'],
+                    c=monitor.rate((label, resource)),
+                ))
+
+            if prometheus_file:
+                write_metrics(prometheus_file, monitor.prometheus())
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        debug('interrupted')
+
+
+def run(argv=None):
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
+
+    logins = login_tokens(args)
 
     global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
-    info("github ratelimit: {rl}".format(rl=g.rate_limiting))
+    g = logins[0][1]
+
+    if args.monitor:
+        monitor_ratelimits(
+            logins,
+            interval=args.interval,
+            window=args.window,
+            prometheus_file=args.prometheus_file,
+            port=args.listen,
+        )
+        return
 
-    reset = datetime.datetime.fromtimestamp(int(g.rate_limiting_resettime))
-    info("github ratelimit reset: {time}".format(time=reset))
+    for label, login in logins:
+        for resource, rl in sorted(pygithub.get_rate_limits(login).items()):
+            reset = datetime.datetime.fromtimestamp(int(rl['reset']))
+            info("{t} {r} ratelimit: {n}/{m}, reset: {time}".format(
+                t=label,
+                r=resource,
+                n=rl['remaining'],
+                m=rl['limit'],
+                time=reset,
+            ))
 
 
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
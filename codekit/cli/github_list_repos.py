@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 
-from codekit.codetools import debug, error
-from codekit import codetools, pygithub
+from codekit.codetools import debug
+from codekit import codetools, concurrency, events, profiling, pygithub
 import argparse
-import github
+import csv
+import json
 import sys
 import textwrap
 
+github = codetools.lazy_import('github')
 
-def parse_args():
+
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-list-repos'
 
@@ -34,6 +37,11 @@ def parse_args():
             {prog} --maxt 0 --hide Owners --org lsst
 
         returns the list of repos that are owned by no team besides Owners.
+
+        Rows are written as soon as the team membership of each repo is known.
+        Use --format jsonl or --format csv to feed the list to other tools:
+
+            {prog} --org lsst --format jsonl | jq -r .full_name
         """).format(prog=prog),
         epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit')
     parser.add_argument(
@@ -53,6 +61,31 @@ def parse_args():
     parser.add_argument(
         '--delimiter', default=', ',
         help='Character(s) separating teams in print out')
+    parser.add_argument(
+        '--format',
+        dest='fmt',
+        choices=['text', 'jsonl', 'csv'],
+        default='text',
+        help='Output format: aligned text, one JSON object per line or CSV'
+             ' with a header row. (default: %(default)s)')
+    parser.add_argument(
+        '--graphql',
+        action='store_true',
+        help='Find the teams of all repos with a few paged GraphQL queries'
+             ' instead of a REST request per repo. Output starts once all'
+             ' repos and teams have been listed.')
+    parser.add_argument(
+        '--workers',
+        default=8,
+        type=int,
+        help='Number of concurrent repo team membership requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--read-ahead',
+        default=32,
+        type=int,
+        help='Maximum number of repos to fetch team membership for ahead of'
+             ' the output. (default: %(default)s)')
     parser.add_argument(
         '--token-path',
         default='~/.sq_github_token',
@@ -66,15 +99,57 @@ def parse_args():
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    pygithub.add_team_cache_arguments(parser)
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+class RowWriter(object):
+    """Write repo rows to a stream in the selected format"""
+
+    def __init__(self, fmt, delimiter, stream=None):
+        self.fmt = fmt
+        self.delimiter = delimiter
+        self.stream = stream or sys.stdout
+
+        if fmt == 'csv':
+            self.csv = csv.writer(self.stream)
+            self.csv.writerow(['name', 'full_name', 'teams'])
+
+    def write(self, full_name, teamnames):
+        name = full_name.split('/', 1)[-1]
+
+        if self.fmt == 'jsonl':
+            print(json.dumps({
+                'name': name,
+                'full_name': full_name,
+                'teams': teamnames,
+            }), file=self.stream)
+        elif self.fmt == 'csv':
+            self.csv.writerow([
+                name,
+                full_name,
+                self.delimiter.join(teamnames),
+            ])
+        else:
+            print(name.ljust(40) + self.delimiter.join(teamnames),
+                  file=self.stream)
+
+        # rows should reach the other end of a pipe without delay
+        self.stream.flush()
 
 
-def run():
+def run(argv=None):
     """List repos and teams"""
-    args = parse_args()
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
+
+    team_cache = pygithub.configure_team_cache(args)
 
     global g
     g = pygithub.login_github(token_path=args.token_path, token=args.token)
@@ -84,46 +159,50 @@ def run():
 
     org = g.get_organization(args.organization)
 
+    def find_teams(r):
+        return r.full_name, pygithub.get_repo_team_names(r)
+
+    writer = RowWriter(args.fmt, args.delimiter)
+
     try:
-        repos = list(org.get_repos())
+        if args.graphql:
+            rows = pygithub.get_org_repo_teams(g, org.login).items()
+        else:
+            # repos are consumed page by page, as rows are written
+            rows = concurrency.imap_ordered(
+                find_teams,
+                org.get_repos(),
+                workers=args.workers,
+                window=max(args.read_ahead, args.workers),
+            )
+
+        for full_name, teamnames in rows:
+            teamnames = [t for t in teamnames if t not in args.hide]
+
+            maxt = args.maxt if (args.maxt is not None and
+                                 args.maxt >= 0) else len(teamnames)
+            debug("MAXT={maxt}".format(maxt=maxt))
+
+            if args.mint <= len(teamnames) <= maxt:
+                writer.write(full_name, teamnames)
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
         msg = 'error getting repos'
         raise pygithub.CaughtOrganizationError(org, e, msg) from None
 
-    for r in repos:
-        try:
-            teamnames = [t.name for t in r.get_teams()
-                         if t.name not in args.hide]
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise pygithub.CaughtRepositoryError(r, e, msg) from None
-
-        maxt = args.maxt if (args.maxt is not None and
-                             args.maxt >= 0) else len(teamnames)
-        if args.debug:
-            print("MAXT=", maxt)
-
-        if args.mint <= len(teamnames) <= maxt:
-            print(r.name.ljust(40) + args.delimiter.join(teamnames))
+    team_cache.save()
 
 
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -4,19 +4,24 @@
 # -------------
 # - will need updating to be new permissions model aware
 
-from codekit.codetools import debug, error, info, warn
-from codekit import codetools, pygithub
+from codekit.codetools import debug, info, warn
+from codekit import codetools, concurrency, events, profiling, pygithub
 import argparse
-import github
 import sys
 import textwrap
 
+github = codetools.lazy_import('github')
+
 
 class TeamError(Exception):
     pass
 
 
-def parse_args():
+class RepoError(Exception):
+    pass
+
+
+def parse_args(argv=None):
     """Parse command-line args"""
     prog = 'github-mv-repos-to-team'
 
@@ -70,112 +75,244 @@ def parse_args():
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Number of concurrent github API write requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--pace',
+        default=0.25,
+        type=float,
+        help='Minimum number of seconds between github API write requests.'
+             ' (default: %(default)s)')
     parser.add_argument('--dry-run', action='store_true')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
-def find_team(teams, name):
-    assert isinstance(teams, list)
-    assert isinstance(name, str) \
-        or isinstance(name, list)
+def find_team(index, name):
+    assert isinstance(index, pygithub.TeamIndex), type(index)
+    assert isinstance(name, str)
 
-    t = [t for t in teams if t.name in name]
+    t = index.by_name.get(name)
     if not t:
         raise TeamError("unable to find team {team}".format(team=name))
 
     return t
 
 
-def run():
-    """Move the repos"""
-    args = parse_args()
-
-    codetools.setup_logging(args.debug)
-
-    global g
-    g = pygithub.login_github(token_path=args.token_path, token=args.token)
-    org = g.get_organization(args.org)
-
-    # only iterate over all teams once
+def get_team_repos(team):
+    """Return the repos of a team, keyed by name."""
     try:
-        teams = list(org.get_teams())
+        return {r.name: r for r in team.get_repos()}
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
-        msg = 'error getting teams'
-        raise pygithub.CaughtOrganizationError(org, e, msg) from None
-
-    old_team = find_team(teams, args.oldteam)
-    new_team = find_team(teams, args.newteam)
-
-    move_me = args.repos
-    debug(len(move_me), 'repos to be moved')
-
-    added = []
-    removed = []
-    for name in move_me:
+        raise pygithub.CaughtTeamError(team, e) from None
+
+
+def resolve_repos(org, names, known):
+    """Find repo objects by name.
+
+    Parameters
+    ----------
+    known: dict(str, github.Repository.Repository)
+        Already retrieved repos, keyed by name. The org is only listed if
+        some of the repos are not known.
+
+    Raises
+    ------
+    RepoError
+        If any of the repos do not exist in the org.
+    """
+    repos = {n: known[n] for n in names if n in known}
+
+    unknown = [n for n in names if n not in repos]
+    if unknown:
+        debug("listing repos in {org} to find {n} repo(s)".format(
+            org=org.login,
+            n=len(unknown),
+        ))
         try:
-            r = org.get_repo(name)
+            org_repos = {r.name: r for r in org.get_repos()}
         except github.RateLimitExceededException:
             raise
         except github.GithubException as e:
-            msg = "error getting repo by name: {r}".format(r=name)
+            msg = 'error getting repos'
             raise pygithub.CaughtOrganizationError(org, e, msg) from None
 
-        # Add team to the repo
-        debug("Adding {repo} to '{team}' ...".format(
+        missing = [n for n in unknown if n not in org_repos]
+        if missing:
+            raise RepoError("unable to find repo(s) in {org}: {repos}".format(
+                org=org.login,
+                repos=missing,
+            ))
+        repos.update((n, org_repos[n]) for n in unknown)
+
+    return [repos[n] for n in names]
+
+
+def change_membership(
+    team,
+    repos,
+    add=True,
+    workers=1,
+    pace=0,
+    dry_run=False,
+):
+    """Add repos to, or remove repos from, a team concurrently.
+
+    Returns
+    -------
+    changed: list(github.Repository.Repository)
+        repos which were added/removed
+    problems: list(codekit.pygithub.CaughtTeamError)
+    """
+    pacer = concurrency.Pacer(pace)
+    op = team.add_to_repos if add else team.remove_from_repos
+
+    def change(r):
+        debug("{verb} {repo} {prep} '{team}'".format(
+            verb='adding' if add else 'removing',
             repo=r.full_name,
-            team=args.newteam
+            prep='to' if add else 'from',
+            team=team.name,
         ))
-
-        if not args.dry_run:
+        if not dry_run:
+            pacer.wait()
             try:
-                new_team.add_to_repos(r)
-                added += r.full_name
-                debug('  ok')
+                pygithub.with_retries(op, r)
             except github.RateLimitExceededException:
                 raise
-            except github.GithubException:
-                debug('  FAILED')
-
-        if old_team.name in 'Owners':
-            warn("Removing repo {repo} from team 'Owners' is not allowed"
-                 .format(repo=r.full_name))
+            except github.GithubException as e:
+                raise pygithub.CaughtTeamError(team, e) from None
+        else:
+            debug('  (noop)')
 
-        debug("Removing {repo} from '{team}' ...".format(
+        events.emit(
+            'action',
+            action='add to team' if add else 'remove from team',
             repo=r.full_name,
-            team=args.oldteam
-        ))
+            team=team.name,
+            dry_run=dry_run,
+        )
+        return r
+
+    changed, problems = concurrency.map_concurrently(
+        change,
+        repos,
+        workers=workers,
+        catch=(pygithub.CaughtTeamError,),
+    )
 
-        if not args.dry_run:
-            try:
-                old_team.remove_from_repos(r)
-                removed += r.full_name
-                debug('  ok')
-            except github.RateLimitExceededException:
-                raise
-            except github.GithubException:
-                debug('  FAILED')
+    return [r for r in changed if r is not None], problems
+
+
+def run(argv=None):
+    """Move the repos"""
+    args = parse_args(argv)
+
+    codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
+
+    global g
+    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    org = g.get_organization(args.org)
 
-    info('Added:', added)
-    info('Removed:', removed)
+    # only iterate over all teams once
+    teams = pygithub.get_team_index(org)
+
+    old_team = find_team(teams, args.oldteam)
+    new_team = find_team(teams, args.newteam)
+
+    move_me = args.repos
+    debug("{n} repos to be moved".format(n=len(move_me)))
+
+    # current membership of both teams, used to skip no-op changes and to
+    # resolve most (if not all) repo objects without further requests
+    old_repos = get_team_repos(old_team)
+    new_repos = get_team_repos(new_team)
+
+    repos = resolve_repos(org, move_me, {**new_repos, **old_repos})
+
+    to_add = [r for r in repos if r.name not in new_repos]
+    for r in repos:
+        if r.name in new_repos:
+            debug("{repo} is already in '{team}'".format(
+                repo=r.full_name,
+                team=new_team.name,
+            ))
+
+    added, problems = change_membership(
+        new_team,
+        to_add,
+        add=True,
+        workers=args.workers,
+        pace=args.pace,
+        dry_run=args.dry_run,
+    )
+
+    # a repo is only removed from the old team once it is in the new team
+    in_new_team = set(new_repos) | set(r.name for r in added)
+    to_remove = []
+    for r in repos:
+        if r.name not in old_repos:
+            debug("{repo} is not in '{team}'".format(
+                repo=r.full_name,
+                team=old_team.name,
+            ))
+        elif r.name not in in_new_team:
+            warn("not removing {repo} from '{team}' as it was not added to"
+                 " '{new}'".format(
+                     repo=r.full_name,
+                     team=old_team.name,
+                     new=new_team.name,
+                 ))
+        else:
+            if old_team.name == 'Owners':
+                warn("Removing repo {repo} from team 'Owners' is not allowed"
+                     .format(repo=r.full_name))
+            to_remove.append(r)
+
+    removed, err = change_membership(
+        old_team,
+        to_remove,
+        add=False,
+        workers=args.workers,
+        pace=args.pace,
+        dry_run=args.dry_run,
+    )
+    problems += err
+
+    info("Added to '{team}': {repos}".format(
+        team=new_team.name,
+        repos=[r.full_name for r in added],
+    ))
+    info("Removed from '{team}': {repos}".format(
+        team=old_team.name,
+        repos=[r.full_name for r in removed],
+    ))
+
+    if problems:
+        msg = "{n} errors moving repo(s)".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
 
 
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+
+from codekit.codetools import debug, info, warn
+from codekit import codetools, concurrency, events, profiling, pygithub
+import argparse
+import collections
+import sys
+import textwrap
+
+github = codetools.lazy_import('github')
+yaml = codetools.lazy_import('yaml')
+
+# team repo permissions (roles), from least to most privileged
+PERMISSIONS = ['pull', 'triage', 'push', 'maintain', 'admin']
+
+
+class StateError(Exception):
+    pass
+
+
+# a single change to the membership of a repo in a team
+Change = collections.namedtuple(
+    'Change',
+    ['action', 'team', 'repo', 'permission'],
+)
+
+
+# errors which are reported, rather than raised, by a run of the command;
+# see `codetools.run_command()`
+COMMAND_ERRORS = (StateError,)
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments"""
+    prog = 'github-sync-teams'
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent("""
+            Reconcile the repo membership of GitHub teams with a desired state
+            declared in a YAML file.
+
+            Only the teams declared in the file are changed. Repos are added
+            to teams (or have their permission changed) as needed and, with
+            --prune, repos which are not declared are removed from teams.
+            Permissions are one of: pull, triage, push, maintain or admin.
+
+            Example state file:
+
+                teams:
+                  Data Management:
+                    permission: push  # default for the team (pull)
+                    repos:
+                      - afw
+                      - name: pipe_tasks
+                        permission: admin
+                  DM Externals:
+                    repos:
+                      - apr_util
+
+            Example:
+
+                {prog} \\
+                    --dry-run \\
+                    --org 'example' \\
+                    --token "$GITHUB_TOKEN" \\
+                    teams.yaml
+        """).format(prog=prog),
+        epilog='Part of codekit: https://github.com/lsst-sqre/sqre-codekit'
+    )
+
+    parser.add_argument(
+        'state',
+        help='YAML file declaring the desired repo membership of teams')
+    parser.add_argument(
+        '-o', '--org',
+        required=True,
+        help='Organization to work in')
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help='Remove repos which are not declared from the declared teams')
+    parser.add_argument(
+        '--token-path',
+        default='~/.sq_github_token',
+        help='Use a token (made with github-auth) in a non-standard location')
+    parser.add_argument(
+        '--token',
+        default=None,
+        help='Literal github personal access token string')
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Number of concurrent github API write requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--pace',
+        default=0.25,
+        type=float,
+        help='Minimum number of seconds between github API write requests.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        help='Fail immediately on github API errors.')
+    parser.add_argument(
+        '--no-fail-fast',
+        action='store_const',
+        const=False,
+        dest='fail_fast',
+        help='DO NOT Fail immediately on github API errors. (default)')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument(
+        '-d', '--debug',
+        action='count',
+        default=codetools.debug_lvl_from_env(),
+        help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
+    parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
+
+    return parser.parse_args(argv)
+
+
+def read_state(filename):
+    """Read the desired state of teams from a YAML file.
+
+    Returns
+    -------
+    state: dict(str, dict(str, str))
+        repo permissions keyed by team name and then repo name
+
+    Raises
+    ------
+    StateError
+        If the file is not a valid state declaration
+    """
+    try:
+        with open(filename, 'r') as f:
+            doc = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        raise StateError("unable to read {f}: {e}".format(
+            f=filename,
+            e=e,
+        )) from None
+
+    if not isinstance(doc, dict) or not isinstance(doc.get('teams'), dict):
+        raise StateError("{f} does not declare any teams".format(f=filename))
+
+    def check_permission(perm, where):
+        if perm not in PERMISSIONS:
+            raise StateError("invalid permission {p} for {w} in {f}".format(
+                p=perm,
+                w=where,
+                f=filename,
+            ))
+        return perm
+
+    state = {}
+    for team, spec in doc['teams'].items():
+        spec = spec or {}
+        default = check_permission(
+            spec.get('permission', 'pull'),
+            "team '{t}'".format(t=team),
+        )
+
+        repos = {}
+        for r in spec.get('repos') or []:
+            if isinstance(r, str):
+                repos[r] = default
+                continue
+
+            try:
+                name = r['name']
+            except (KeyError, TypeError):
+                raise StateError(
+                    "invalid repo {r} in team '{t}' in {f}".format(
+                        r=r,
+                        t=team,
+                        f=filename,
+                    )) from None
+
+            repos[name] = check_permission(
+                r.get('permission', default),
+                "repo {r} in team '{t}'".format(r=name, t=team),
+            )
+
+        state[team] = repos
+
+    return state
+
+
+def repo_permission(repo):
+    """Return the permission which a team has on a repo, as listed by
+    `github.Team.Team.get_repos()`.
+
+    Versions of pygithub which predate the `triage` and `maintain` roles
+    report them as `pull` and `push`, respectively. A team declared with
+    those roles is then seen as needing an update on every run.
+    """
+    perms = repo.permissions
+    if perms is None:
+        return None
+
+    for p in reversed(PERMISSIONS):
+        if getattr(perms, p, False):
+            return p
+
+    return None
+
+
+def get_current_state(org, team_names):
+    """Index the current repo membership of teams.
+
+    Returns
+    -------
+    teams: dict(str, github.Team.Team)
+        teams keyed by name
+
+    current: dict(str, dict(str, str))
+        repo permissions keyed by team name and then repo name
+
+    repos: dict(str, github.Repository.Repository)
+        inverted index of all repos which are members of any of the teams,
+        keyed by repo name
+
+    Raises
+    ------
+    StateError
+        If any of the teams do not exist
+    """
+    teams, team_repos = pygithub.get_team_repos_index(org, team_names)
+
+    missing = [n for n in team_names if n not in teams]
+    if missing:
+        raise StateError("team(s) do not exist in {org}: {teams}".format(
+            org=org.login,
+            teams=missing,
+        ))
+
+    current = {}
+    repos = {}
+    for name, members in team_repos.items():
+        current[name] = {n: repo_permission(r) for n, r in members.items()}
+        repos.update(members)
+
+    return teams, current, repos
+
+
+def diff_state(desired, current, prune=False):
+    """Compute the minimal set of changes to reach the desired state.
+
+    Returns
+    -------
+    changes: list(Change)
+    """
+    changes = []
+    for team, want in desired.items():
+        have = current.get(team, {})
+
+        for repo, perm in sorted(want.items()):
+            if repo not in have:
+                changes.append(Change('add', team, repo, perm))
+            elif have[repo] != perm:
+                changes.append(Change('update', team, repo, perm))
+
+        if prune:
+            for repo in sorted(set(have) - set(want)):
+                changes.append(Change('remove', team, repo, None))
+
+    return changes
+
+
+def resolve_repos(org, names, known):
+    """Find repo objects by name, listing the org only if some of the repos
+    are not already known.
+
+    Raises
+    ------
+    StateError
+        If any of the repos do not exist in the org.
+    """
+    repos = {n: known[n] for n in names if n in known}
+
+    unknown = [n for n in names if n not in repos]
+    if not unknown:
+        return repos
+
+    debug("listing repos in {org} to find {n} repo(s)".format(
+        org=org.login,
+        n=len(unknown),
+    ))
+    try:
+        org_repos = {r.name: r for r in org.get_repos()}
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = 'error getting repos'
+        raise pygithub.CaughtOrganizationError(org, e, msg) from None
+
+    missing = [n for n in unknown if n not in org_repos]
+    if missing:
+        raise StateError("repo(s) do not exist in {org}: {repos}".format(
+            org=org.login,
+            repos=missing,
+        ))
+    repos.update((n, org_repos[n]) for n in unknown)
+
+    return repos
+
+
+def apply_changes(
+    changes,
+    teams,
+    repos,
+    workers=1,
+    pace=0,
+    fail_fast=False,
+    dry_run=False,
+):
+    """Apply changes to team membership concurrently.
+
+    Returns
+    -------
+    problems: list(codekit.pygithub.CaughtTeamError)
+    """
+    pacer = concurrency.Pacer(pace)
+
+    def apply(c):
+        t = teams[c.team]
+        r = repos[c.repo]
+
+        info("{action} {repo} in '{team}' {perm}".format(
+            action=c.action,
+            repo=r.full_name,
+            team=t.name,
+            perm=c.permission or '',
+        ))
+        if not dry_run:
+            pacer.wait()
+            try:
+                if c.action == 'remove':
+                    pygithub.with_retries(t.remove_from_repos, r)
+                else:
+                    # adds the repo to the team, if needed
+                    pygithub.with_retries(
+                        t.set_repo_permission,
+                        r,
+                        c.permission,
+                    )
+            except github.RateLimitExceededException:
+                raise
+            except github.GithubException as e:
+                raise pygithub.CaughtTeamError(t, e) from None
+        else:
+            info('  (noop)')
+
+        events.emit(
+            'action',
+            action=c.action,
+            repo=r.full_name,
+            team=t.name,
+            permission=c.permission,
+            dry_run=dry_run,
+        )
+
+    _, problems = concurrency.map_concurrently(
+        apply,
+        changes,
+        workers=workers,
+        catch=(pygithub.CaughtTeamError,),
+        fail_fast=fail_fast,
+    )
+
+    return problems
+
+
+def run(argv=None):
+    """Reconcile teams"""
+    args = parse_args(argv)
+
+    codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
+
+    desired = read_state(args.state)
+    debug("desired state of {n} team(s) read from {f}".format(
+        n=len(desired),
+        f=args.state,
+    ))
+
+    global g
+    g = pygithub.login_github(token_path=args.token_path, token=args.token)
+    org = g.get_organization(args.org)
+    info("syncing teams in org: {org}".format(org=org.login))
+
+    teams, current, known_repos = get_current_state(org, list(desired))
+
+    changes = diff_state(desired, current, prune=args.prune)
+    if not changes:
+        info('nothing to do')
+        return
+
+    counts = collections.Counter(c.action for c in changes)
+    info("{n} change(s): {add} add, {update} update, {remove} remove".format(
+        n=len(changes),
+        add=counts['add'],
+        update=counts['update'],
+        remove=counts['remove'],
+    ))
+
+    if not args.prune:
+        extra = sum(len(set(current[t]) - set(desired[t])) for t in desired)
+        if extra:
+            warn("{n} undeclared team membership(s) left in place"
+                 " (see --prune)".format(n=extra))
+
+    repos = resolve_repos(
+        org,
+        sorted(set(c.repo for c in changes)),
+        known_repos,
+    )
+
+    problems = apply_changes(
+        changes,
+        teams,
+        repos,
+        workers=args.workers,
+        pace=args.pace,
+        fail_fast=args.fail_fast,
+        dry_run=args.dry_run,
+    )
+
+    if problems:
+        msg = "{n} errors syncing team(s)".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
+
+
+def main():
+    try:
+        try:
+            sys.exit(codetools.run_command(run, errors=COMMAND_ERRORS))
+        finally:
+            if 'g' in globals():
+                pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
+    except SystemExit as e:
+        debug("exit {status}".format(status=str(e)))
+        raise e
+
+
+if __name__ == '__main__':
+    main()
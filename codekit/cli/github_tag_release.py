@@ -9,16 +9,34 @@
 
 
 from codekit.codetools import debug, info, warn, error
-from codekit import codetools, eups, pygithub, versiondb
+from codekit import (
+    codetools,
+    concurrency,
+    eups,
+    events,
+    profiling,
+    pygithub,
+    versiondb,
+)
 import argparse
 import codekit
-import github
 import itertools
+import json
 import os
 import re
 import sys
 import textwrap
-import yaml
+
+github = codetools.lazy_import('github')
+yaml = codetools.lazy_import('yaml')
+
+
+PLAN_VERSION = 1
+RELEASE_RECORD_VERSION = 1
+
+# parsed repos.yaml keyed by the repo it is read from
+_repo_index = {}
+codetools.register_cache(_repo_index.clear)
 
 
 class GitTagExistsError(Exception):
@@ -29,7 +47,36 @@ class GitTagMissingError(Exception):
     pass
 
 
-def parse_args():
+class GitRefChangedError(Exception):
+    pass
+
+
+class ReleaseRecordError(Exception):
+    pass
+
+
+class PlanError(Exception):
+    pass
+
+
+# errors which are specific to a single product, as opposed to errors which
+# should abort all processing (e.g. github.RateLimitExceededException).
+PREFLIGHT_ERRORS = (
+    RuntimeError,
+    GitTagExistsError,
+    pygithub.CaughtOrganizationError,
+    pygithub.CaughtRepositoryError,
+    pygithub.RepositoryTeamMembershipError,
+    ReleaseRecordError,
+)
+
+
+# errors which are reported, rather than raised, by a run of the command;
+# see `codetools.run_command()`
+COMMAND_ERRORS = (PlanError, ReleaseRecordError)
+
+
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-tag-release'
 
@@ -102,6 +149,22 @@ def parse_args():
                     --manifest-only \\
                     'w.2018.18'
 
+                # record the result of the pre-flight checks as a plan file,
+                # which may be reviewed and then applied without repeating the
+                # pre-flight checks.
+                {prog} \\
+                    --org 'lsst' \\
+                    --allow-team 'Data Management' \\
+                    --allow-team 'DM Externals' \\
+                    --external-team 'DM Externals' \\
+                    --manifest 'b3595' \\
+                    --plan-out plan.json \\
+                    'w.2018.18'
+
+                {prog} \\
+                    --org 'lsst' \\
+                    --apply plan.json
+
             Note that the access token must have access to these oauth scopes:
                 * read:org
                 * repo
@@ -114,9 +177,8 @@ def parse_args():
 
     parser.add_argument(
         '--manifest',
-        required=True,
         help='Name of versiondb manifest for git repo sha resolution'
-             ' AKA bNNNN')
+             ' AKA bNNNN (required unless --apply is used)')
     parser.add_argument(
         '--org',
         required=True,
@@ -124,9 +186,9 @@ def parse_args():
     parser.add_argument(
         '--allow-team',
         action='append',
-        required=True,
         help='git repos to be tagged MUST be a member of ONE or more of'
-             ' these teams (can specify several times)')
+             ' these teams (can specify several times)'
+             ' (required unless --apply is used)')
     parser.add_argument(
         '--external-team',
         action='append',
@@ -197,8 +259,13 @@ def parse_args():
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
-    parser.add_argument('tag')
+    parser.add_argument(
+        'tag',
+        nargs='?',
+        help='git tag name (required unless --apply is used)')
 
     manifest_group = parser.add_mutually_exclusive_group()
     manifest_group.add_argument(
@@ -226,7 +293,72 @@ def parse_args():
              ' will not create/update tag(s) or modify any state.'
              ' (mutually exclusive with --dry-run)')
 
-    return parser.parse_args()
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Stream each product through repo resolution, tag checking and'
+             ' tagging as soon as it clears the previous step, instead of'
+             ' processing all products one step at a time.'
+             ' Note that this allows tags to be created even if the'
+             ' pre-flight checks of other products fail, unless'
+             ' --preflight-barrier is also specified.')
+    parser.add_argument(
+        '--preflight-barrier',
+        action='store_true',
+        help='With --pipeline, do not create/update any tag(s) until all'
+             ' pre-flight checks have passed. (implied by --verify and'
+             ' --plan-out)')
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Number of concurrent github API requests per --pipeline step.'
+             ' (default: %(default)s)')
+
+    parser.add_argument(
+        '--since-release',
+        metavar='TAG',
+        help='Only fully check products whose sha has changed since a previous'
+             ' release (git tag) that was created or verified by this'
+             ' program. The tags of unchanged products are checked with a'
+             ' single request per repo and the repo team membership of'
+             ' unchanged products is not re-checked.')
+    parser.add_argument(
+        '--release-cache',
+        metavar='DIR',
+        help='Directory in which records of created/verified releases are'
+             ' kept for use with --since-release.'
+             ' (default: ~/.cache/codekit/github-tag-release)')
+    pygithub.add_team_cache_arguments(parser)
+
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        '--plan-out',
+        metavar='PLAN',
+        help='Write the tagging plan computed by the pre-flight checks to a'
+             ' json file, instead of creating/updating any tag(s).'
+             ' (mutually exclusive with --apply)')
+    plan_group.add_argument(
+        '--apply',
+        metavar='PLAN',
+        help='Create/update the tag(s) recorded in a plan file written by'
+             ' --plan-out. Only the git refs recorded in the plan are'
+             ' re-checked. (mutually exclusive with --plan-out)')
+
+    args = parser.parse_args(argv)
+
+    if args.apply:
+        if args.verify:
+            parser.error('--verify may not be used with --apply')
+    else:
+        if not args.tag:
+            parser.error('tag is required unless --apply is used')
+        if not args.manifest:
+            parser.error('--manifest is required unless --apply is used')
+        if not args.allow_team:
+            parser.error('--allow-team is required unless --apply is used')
+
+    return args
 
 
 def cmp_dict(d1, d2, ignore_keys=[]):
@@ -311,6 +443,117 @@ def cross_reference_products(
     return products, problems
 
 
+def get_repo_index():
+    """Return the contents of `lsst/repos` `etc/repos.yaml` as a dict."""
+    try:
+        return _repo_index['lsst/repos']
+    except KeyError:
+        pass
+
+    with profiling.phase('repos.yaml fetch'):
+        repos_yaml = g.get_repo("lsst/repos").get_contents("etc/repos.yaml")
+    with profiling.phase('repos.yaml parse'):
+        index = yaml.safe_load(repos_yaml.decoded_content)
+    _repo_index['lsst/repos'] = index
+
+    return index
+
+
+def find_repo_for_product(org, name, repo_index):
+    """Find the github repo of a product by its repos.yaml entry.
+
+    Raises
+    ------
+    RuntimeError
+        If the product is not present in repos.yaml.
+    codekit.pygithub.CaughtOrganizationError
+    """
+    try:
+        entry = repo_index[name]
+        if isinstance(entry, dict):
+            entry = entry['url']
+        entry = re.sub(
+            r"^https?://github\.com/(.+?)(\.git)?$",
+            r"\1",
+            entry
+        )
+    except Exception as exc:
+        msg = f"repo {name} cannot be found in repos.yaml"
+        raise RuntimeError(msg) from exc
+
+    try:
+        return g.get_repo(entry)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = "error getting repo by name: {r}".format(r=name)
+        raise pygithub.CaughtOrganizationError(org, e, msg) from None
+
+
+def get_repo_for_product(
+    org,
+    name,
+    data,
+    repo_index,
+    allow_teams,
+    ext_teams,
+    deny_teams,
+):
+    """
+    Resolve the github repo for a single product and check its team
+    membership.
+
+    Returns
+    -------
+    data: dict
+        A copy of the product data with the `repo` and `v` keys added.
+
+    Raises
+    ------
+    RuntimeError
+        If the product is not present in repos.yaml.
+    codekit.pygithub.CaughtOrganizationError
+    codekit.pygithub.CaughtRepositoryError
+    codekit.pygithub.RepositoryTeamMembershipError
+    """
+    debug("looking for git repo for: %s [%s]", name, data['eups_version'])
+
+    if 'prev' in data:
+        # the product is unchanged since a previous release; reuse the repo
+        # and version scheme that were resolved at that time.
+        repo = pygithub.get_repo_lazy(g, data['prev']['repo'])
+
+        debug("  unchanged since %s: %s", data['prev']['tag'], repo.full_name)
+    else:
+        repo = find_repo_for_product(org, name, repo_index)
+
+        debug("  found: %s", repo.full_name)
+
+    # team membership may have changed since a previous release
+    repo_team_names = pygithub.get_repo_team_names(repo)
+
+    debug("  teams: %s", repo_team_names)
+
+    pygithub.check_repo_teams(
+        repo,
+        allow_teams=allow_teams,
+        deny_teams=deny_teams,
+        team_names=repo_team_names
+    )
+
+    resolved = data.copy()
+    resolved['repo'] = repo
+    if 'prev' in data:
+        resolved['v'] = data['prev']['v']
+    else:
+        has_ext_team = any(x in repo_team_names for x in ext_teams)
+        debug("  external repo: %s", has_ext_team)
+        resolved['v'] = has_ext_team
+
+    return resolved
+
+
+@profiling.phase('resolve repos')
 def get_repo_for_products(
     org,
     products,
@@ -325,89 +568,26 @@ def get_repo_for_products(
 
     resolved_products = {}
 
-    global g
-    repos_yaml = g.get_repo("lsst/repos").get_contents("etc/repos.yaml")
-    repo_index = yaml.safe_load(repos_yaml.decoded_content)
+    repo_index = get_repo_index()
 
     problems = []
     for name, data in products.items():
-        debug("looking for git repo for: {name} [{ver}]".format(
-            name=name,
-            ver=data['eups_version']
-        ))
-
-        try:
-            entry = repo_index[name]
-            if isinstance(entry, dict):
-                entry = entry['url']
-            entry = re.sub(
-                r"^https?://github\.com/(.+?)(\.git)?$",
-                r"\1",
-                entry
-            )
-        except Exception as exc:
-            msg = f"repo {name} cannot be found in repos.yaml"
-            yikes = RuntimeError(msg)
-            if fail_fast:
-                raise yikes from exc
-            problems.append(yikes)
-            error(yikes)
-            continue
-
-        try:
-            repo = g.get_repo(entry)
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = "error getting repo by name: {r}".format(r=name)
-            yikes = pygithub.CaughtOrganizationError(org, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
-
-            continue
-
-        debug("  found: {slug}".format(slug=repo.full_name))
-
         try:
-            repo_team_names = [t.name for t in repo.get_teams()]
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            yikes = pygithub.CaughtRepositoryError(repo, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
-
-            continue
-
-        debug("  teams: {teams}".format(teams=repo_team_names))
-
-        try:
-            pygithub.check_repo_teams(
-                repo,
+            resolved_products[name] = get_repo_for_product(
+                org,
+                name,
+                data,
+                repo_index,
                 allow_teams=allow_teams,
+                ext_teams=ext_teams,
                 deny_teams=deny_teams,
-                team_names=repo_team_names
             )
-        except pygithub.RepositoryTeamMembershipError as e:
+        except PREFLIGHT_ERRORS as e:
             if fail_fast:
                 raise
             problems.append(e)
             error(e)
 
-            continue
-
-        has_ext_team = any(x in repo_team_names for x in ext_teams)
-        debug("  external repo: {v}".format(v=has_ext_team))
-
-        resolved_products[name] = data.copy()
-        resolved_products[name]['repo'] = repo
-        resolved_products[name]['v'] = has_ext_team
-
     if problems:
         error("{n} product(s) have error(s)".format(n=len(problems)))
 
@@ -464,7 +644,7 @@ def cmp_existing_git_tag(
     return True
 
 
-def check_existing_git_tag(repo, t_tag, **kwargs):
+def check_existing_git_tag(repo, t_tag, e_ref, **kwargs):
     """
     Check for a pre-existng tag in the github repo.
 
@@ -474,6 +654,9 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
         repo to inspect for an existing tagsdf
     t_tag: codekit.pygithub.TargetTag
         dict repesenting a target git tag
+    e_ref: github.GitRef.GitRef
+        existing ref to the tag, as returned by
+        `codekit.pygithub.find_tag_by_name()`. May be `None`.
 
     Returns
     -------
@@ -489,15 +672,8 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
     assert isinstance(repo, github.Repository.Repository), type(repo)
     assert isinstance(t_tag, codekit.pygithub.TargetTag), type(t_tag)
 
-    debug("looking for existing tag: {tag} in repo: {repo}".format(
-        repo=repo.full_name,
-        tag=t_tag.name,
-    ))
-
-    # find ref/tag by name
-    e_ref = pygithub.find_tag_by_name(repo, t_tag.name)
     if not e_ref:
-        debug("  not found: {tag}".format(tag=t_tag.name))
+        debug("  not found: %s", t_tag.name)
         return False
 
     # find tag object pointed to by the ref
@@ -512,10 +688,7 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
         )
         raise pygithub.CaughtRepositoryError(repo, e, msg) from None
 
-    debug("  found existing: {tag} [{sha}]".format(
-        tag=e_tag.tag,
-        sha=e_tag.sha,
-    ))
+    debug("  found existing: %s [%s]", e_tag.tag, e_tag.sha)
 
     if cmp_existing_git_tag(t_tag, e_tag, **kwargs):
         return True
@@ -545,6 +718,138 @@ def check_existing_git_tag(repo, t_tag, **kwargs):
     raise yikes
 
 
+def check_product_tag(
+    name,
+    data,
+    git_tag,
+    tag_message_template,
+    tagger,
+    force_tag=False,
+    ignore_git_message=False,
+    ignore_git_tagger=False,
+    verified=None,
+):
+    """
+    Determine the target git tag for a single product and compare it to any
+    existing tag in the product's repo.
+
+    If the product is unchanged since a previous release (has a `prev` key),
+    the previous and target tags are looked up with a single request and the
+    previous tag is checked against the release record.
+
+    Parameters
+    ----------
+    verified: dict, optional
+        If the existing tag is in sync, a release record entry is added.
+
+    Returns
+    -------
+    data: dict
+        A copy of the product data with the `target_tag`, `update_tag` and
+        `ref_sha` keys added or `None` if the existing tag is already in sync.
+
+    Raises
+    ------
+    GitTagExistsError
+        If the tag exists, is not in sync, and `force_tag` is `False`.
+    ReleaseRecordError
+        If the previous tag of an unchanged product does not match the
+        release record.
+    codekit.pygithub.CaughtRepositoryError
+    """
+    assert isinstance(tagger, github.InputGitAuthor), type(tagger)
+
+    repo = data['repo']
+    tag_name = git_tag
+
+    # prefix tag name with `v`?
+    if data['v'] and re.match(r'\d', tag_name):
+        tag_name = "v{git_tag}".format(git_tag=tag_name)
+
+    # message can not be formatted until we've determined if the tag must
+    # be prefixed.  The 'v' prefix appearing in the tag message is required
+    # to match historical behavior and allow verification of past releases.
+    message = tag_message_template.format(git_tag=tag_name)
+
+    # "target tag"
+    t_tag = codekit.pygithub.TargetTag(
+        name=tag_name,
+        sha=data['sha'],
+        message=message,
+        tagger=tagger,
+    )
+
+    # control whether to create a new tag or update an existing one
+    update_tag = False
+
+    debug("looking for existing tag: %s in repo: %s",
+          t_tag.name,
+          repo.full_name)
+
+    try:
+        # find ref/tag by name
+        if 'prev' in data:
+            e_ref = find_tag_since_release(repo, t_tag, data['prev'])
+        else:
+            e_ref = pygithub.find_tag_by_name(repo, t_tag.name)
+
+        # if the existing tag is in sync, do nothing
+        if check_existing_git_tag(
+            repo,
+            t_tag,
+            e_ref,
+            ignore_git_message=ignore_git_message,
+            ignore_git_tagger=ignore_git_tagger,
+        ):
+            warn(textwrap.dedent("""\
+                No action for {repo}
+                  existing tag: {tag} is already in sync\
+                """).format(
+                repo=repo.full_name,
+                tag=t_tag.name,
+            ))
+
+            if verified is not None:
+                verified[name] = release_record_entry(
+                    data,
+                    t_tag,
+                    e_ref.object.sha,
+                )
+
+            return None
+    except github.RateLimitExceededException:
+        raise
+    except GitTagExistsError:
+        # if force_tag is set, and the tag already exists, set
+        # update_tag and fall through. Otherwise, treat it as any other
+        # exception.
+        if not force_tag:
+            raise
+
+        update_tag = True
+        warn(textwrap.dedent("""\
+              existing tag: {tag} WILL BE MOVED\
+            """).format(
+            repo=repo.full_name,
+            tag=t_tag.name,
+        ))
+    except github.GithubException as e:
+        msg = "error checking for existance of tag: {t}".format(
+            t=t_tag.name,
+        )
+        raise pygithub.CaughtRepositoryError(repo, e, msg) from None
+
+    checked = data.copy()
+    checked['target_tag'] = t_tag
+    checked['update_tag'] = update_tag
+    # record where the existing ref, if any, was pointing so that a plan
+    # can later detect if it has been moved.
+    checked['ref_sha'] = e_ref.object.sha if e_ref else None
+
+    return checked
+
+
+@profiling.phase('check tags')
 def check_product_tags(
     products,
     git_tag,
@@ -554,6 +859,7 @@ def check_product_tags(
     fail_fast=False,
     ignore_git_message=False,
     ignore_git_tagger=False,
+    verified=None,
 ):
     assert isinstance(tagger, github.InputGitAuthor), type(tagger)
 
@@ -561,82 +867,27 @@ def check_product_tags(
 
     problems = []
     for name, data in products.items():
-        repo = data['repo']
-        tag_name = git_tag
-
-        # prefix tag name with `v`?
-        if data['v'] and re.match(r'\d', tag_name):
-            tag_name = "v{git_tag}".format(git_tag=tag_name)
-
-        # message can not be formatted until we've determined if the tag must
-        # be prefixed.  The 'v' prefix appearing in the tag message is required
-        # to match historical behavior and allow verification of past releases.
-        message = tag_message_template.format(git_tag=tag_name)
-
-        # "target tag"
-        t_tag = codekit.pygithub.TargetTag(
-            name=tag_name,
-            sha=data['sha'],
-            message=message,
-            tagger=tagger,
-        )
-
-        # control whether to create a new tag or update an existing one
-        update_tag = False
-
         try:
-            # if the existing tag is in sync, do nothing
-            if check_existing_git_tag(
-                repo,
-                t_tag,
+            checked = check_product_tag(
+                name,
+                data,
+                git_tag,
+                tag_message_template=tag_message_template,
+                tagger=tagger,
+                force_tag=force_tag,
                 ignore_git_message=ignore_git_message,
                 ignore_git_tagger=ignore_git_tagger,
-            ):
-                warn(textwrap.dedent("""\
-                    No action for {repo}
-                      existing tag: {tag} is already in sync\
-                    """).format(
-                    repo=repo.full_name,
-                    tag=t_tag.name,
-                ))
-
-                continue
-        except github.RateLimitExceededException:
-            raise
-        except GitTagExistsError as e:
-            # if force_tag is set, and the tag already exists, set
-            # update_tag and fall through. Otherwise, treat it as any other
-            # exception.
-            if force_tag:
-                update_tag = True
-                warn(textwrap.dedent("""\
-                      existing tag: {tag} WILL BE MOVED\
-                    """).format(
-                    repo=repo.full_name,
-                    tag=t_tag.name,
-                ))
-            elif fail_fast:
-                raise
-            else:
-                problems.append(e)
-                error(e)
-                continue
-        except github.GithubException as e:
-            msg = "error checking for existance of tag: {t}".format(
-                t=t_tag.name,
+                verified=verified,
             )
-            yikes = pygithub.CaughtRepositoryError(repo, e, msg)
-
+        except PREFLIGHT_ERRORS as e:
             if fail_fast:
-                raise yikes from None
-            else:
-                problems.append(yikes)
-                error(yikes)
-                continue
+                raise
+            problems.append(e)
+            error(e)
+            continue
 
-        checked_products[name] = data.copy()
-        checked_products[name]['target_tag'] = t_tag
-        checked_products[name]['update_tag'] = update_tag
+        if checked:
+            checked_products[name] = checked
 
     if problems:
         error("{n} product(s) have error(s)".format(n=len(problems)))
@@ -644,6 +895,7 @@ def check_product_tags(
     return checked_products, problems
 
 
+@profiling.phase('verify')
 def identify_products_missing_tags(products_to_tag):
     problems = []
     for name, data in products_to_tag.items():
@@ -673,79 +925,727 @@ def identify_products_missing_tags(products_to_tag):
     return problems
 
 
-def tag_products(
+def write_plan(
+    filename,
     products,
-    fail_fast=False,
-    dry_run=False,
+    org,
+    git_tag,
+    tagger,
+    manifest=None,
+    eups_tag=None,
 ):
-    problems = []
-    for name, data in products.items():
-        repo = data['repo']
-        t_tag = data['target_tag']
+    """
+    Serialize the products to be tagged, as returned by
+    `check_product_tags()`, as a json "plan" file.
 
-        info(textwrap.dedent("""\
-            tagging repo: {repo} @
-              sha: {sha} as {gt}
-              (eups version: {et})
-              external repo: {v}
-              replace existing tag: {update}\
-            """).format(
-            repo=repo.full_name,
-            sha=t_tag.sha,
-            gt=t_tag.name,
-            et=data['eups_version'],
-            v=data['v'],
-            update=data['update_tag'],
-        ))
+    Parameters
+    ----------
+    filename: str
+        Path to write the plan to.
+    products: dict
+        Products to be tagged.
+    org: github.Organization.Organization
+        org the repos were resolved in.
+    git_tag: str
+        git tag name (as given on the command line -- prior to any `v`
+        prefixing).
+    tagger: github.InputGitAuthor
+        tagger used to compare existing tags.
+    """
+    assert isinstance(org, github.Organization.Organization), type(org)
+    assert isinstance(tagger, github.InputGitAuthor), type(tagger)
 
-        if dry_run:
-            info('  (noop)')
-            continue
+    plan = {
+        'version': PLAN_VERSION,
+        'created_at': codetools.current_timestamp(),
+        'org': org.login,
+        'tag': git_tag,
+        'manifest': manifest,
+        'eups_tag': eups_tag,
+        'tagger': {k: v for k, v in author_to_dict(tagger).items()
+                   if k in ('name', 'email')},
+        'products': {},
+    }
 
-        try:
-            tag_obj = repo.create_git_tag(
-                t_tag.name,
-                t_tag.message,
-                t_tag.sha,
-                'commit',
-                tagger=t_tag.tagger,
-            )
-            debug("  created tag object {tag_obj}".format(tag_obj=tag_obj))
+    for name, data in products.items():
+        t_tag = data['target_tag']
 
-            if data['update_tag']:
-                ref = pygithub.find_tag_by_name(
-                    repo,
-                    t_tag.name,
-                    safe=False,
-                )
-                ref.edit(tag_obj.sha, force=True)
-                debug("  updated existing ref: {ref}".format(ref=ref))
-            else:
-                ref = repo.create_git_ref(
-                    "refs/tags/{t}".format(t=t_tag.name),
-                    tag_obj.sha
-                )
-                debug("  created ref: {ref}".format(ref=ref))
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = "error creating tag: {t}".format(t=t_tag.name)
-            yikes = pygithub.CaughtRepositoryError(repo, e, msg)
-            if fail_fast:
-                raise yikes from None
-            problems.append(yikes)
-            error(yikes)
+        plan['products'][name] = {
+            'repo': data['repo'].full_name,
+            'eups_version': data['eups_version'],
+            'v': data['v'],
+            'tag': t_tag.name,
+            'sha': t_tag.sha,
+            'message': t_tag.message,
+            'update_tag': data['update_tag'],
+            'ref_sha': data['ref_sha'],
+        }
+
+    with open(filename, 'w') as fh:
+        json.dump(plan, fh, indent=2, sort_keys=True)
+
+    info("wrote plan for {n} product(s) to: {f}".format(
+        n=len(products),
+        f=filename,
+    ))
 
-    if problems:
-        msg = "{n} tag failures".format(n=len(problems))
-        raise codetools.DogpileError(problems, msg)
 
+def read_plan(filename):
+    """
+    Read a json plan file written by `write_plan()`.
 
-def run():
-    """Create the tag"""
-    args = parse_args()
+    Returns
+    -------
+    plan: dict
+
+    Raises
+    ------
+    PlanError
+        If the plan file does not exist, can not be parsed or is not of a
+        supported version.
+    """
+    try:
+        with open(filename, 'r') as fh:
+            plan = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise PlanError("unable to read plan: {f}: {e}".format(
+            f=filename,
+            e=e,
+        )) from None
+
+    if not isinstance(plan, dict) or plan.get('version') != PLAN_VERSION:
+        raise PlanError(
+            "unsupported plan version: {v} (expected {e})".format(
+                v=plan.get('version') if isinstance(plan, dict) else None,
+                e=PLAN_VERSION,
+            ))
+
+    debug(textwrap.dedent("""\
+        read plan: {f}
+          created at: {ctime}
+          org: {org}
+          tag: {tag}
+          manifest: {manifest}
+          eups tag: {eups_tag}
+          products: {n}\
+        """).format(
+        f=filename,
+        ctime=plan['created_at'],
+        org=plan['org'],
+        tag=plan['tag'],
+        manifest=plan['manifest'],
+        eups_tag=plan['eups_tag'],
+        n=len(plan['products']),
+    ))
+
+    return plan
+
+
+def get_products_from_plan(plan, tagger):
+    """
+    Reconstruct the products to be tagged from a plan.
+
+    No api requests are made, so a repo which no longer exists is only
+    reported when its tag is created/updated.
+
+    Returns
+    -------
+    products: dict
+    """
+    assert isinstance(tagger, github.InputGitAuthor), type(tagger)
+
+    products = {}
+    for name, p_data in plan['products'].items():
+        products[name] = {
+            'name': name,
+            'repo': pygithub.get_repo_lazy(g, p_data['repo']),
+            'eups_version': p_data['eups_version'],
+            'v': p_data['v'],
+            'target_tag': codekit.pygithub.TargetTag(
+                name=p_data['tag'],
+                sha=p_data['sha'],
+                message=p_data['message'],
+                tagger=tagger,
+            ),
+            'update_tag': p_data['update_tag'],
+            'ref_sha': p_data['ref_sha'],
+        }
+
+    return products
+
+
+def check_product_refs(products, fail_fast=False):
+    """
+    Check that the git tag refs of a plan have not been created, moved, or
+    deleted since the plan was written.
+
+    This requires only a single ref lookup per repo, as opposed to the full
+    set of pre-flight checks.
+
+    Returns
+    -------
+    problems: list
+    """
+    problems = []
+    for name, data in products.items():
+        repo = data['repo']
+        t_tag = data['target_tag']
+
+        debug("checking ref: %s in repo: %s", t_tag.name, repo.full_name)
+
+        try:
+            e_ref = pygithub.find_tag_by_name(repo, t_tag.name)
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            msg = "error checking for existance of tag: {t}".format(
+                t=t_tag.name,
+            )
+            yikes = pygithub.CaughtRepositoryError(repo, e, msg)
+            if fail_fast:
+                raise yikes from None
+            problems.append(yikes)
+            error(yikes)
+            continue
+
+        e_sha = e_ref.object.sha if e_ref else None
+        if e_sha == data['ref_sha']:
+            debug("  unchanged: %s", e_sha)
+            continue
+
+        yikes = GitRefChangedError(textwrap.dedent("""\
+            tag: {tag} in repo: {repo}
+            has changed since the plan was written:
+              planned: {p_sha}
+              current: {e_sha}\
+            """).format(
+            tag=t_tag.name,
+            repo=repo.full_name,
+            p_sha=data['ref_sha'],
+            e_sha=e_sha,
+        ))
+        if fail_fast:
+            raise yikes
+        problems.append(yikes)
+        error(yikes)
+
+    if problems:
+        error("{n} product(s) have error(s)".format(n=len(problems)))
+
+    return problems
+
+
+def apply_plan(
+    filename,
+    org,
+    fail_fast=False,
+    dry_run=False,
+    release_cache=None,
+):
+    """Create/update the git tags recorded in a plan file."""
+    assert isinstance(org, github.Organization.Organization), type(org)
+
+    plan = read_plan(filename)
+
+    if plan['org'] != org.login:
+        raise PlanError(
+            "plan is for org: {p_org} but --org is: {org}".format(
+                p_org=plan['org'],
+                org=org.login,
+            ))
+
+    # the tag object creation timestamp is when the plan is applied, not when
+    # it was written.
+    tagger = github.InputGitAuthor(
+        plan['tagger']['name'],
+        plan['tagger']['email'],
+        codetools.current_timestamp(),
+    )
+    debug("using taggger: {tagger}".format(tagger=tagger))
+
+    products = get_products_from_plan(plan, tagger)
+
+    # do not fail-fast on non-write operations
+    problems = check_product_refs(products, fail_fast=False)
+
+    if problems:
+        msg = "{n} pre-flight error(s)".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
+
+    # release record entries of tagged products
+    verified = {}
+
+    tag_products(
+        products,
+        fail_fast=fail_fast,
+        dry_run=dry_run,
+        verified=verified,
+    )
+
+    if not dry_run:
+        write_release_record(
+            release_record_path(release_cache, org.login, plan['tag']),
+            org,
+            plan['tag'],
+            plan['manifest'],
+            verified,
+        )
+
+
+def release_record_entry(data, t_tag, ref_sha):
+    """Return a release record entry for a product that has been tagged or
+    verified."""
+    return {
+        'repo': data['repo'].full_name,
+        'v': data['v'],
+        'sha': t_tag.sha,
+        'tag': t_tag.name,
+        'ref_sha': ref_sha,
+    }
+
+
+def release_record_path(cache_dir, org, git_tag):
+    """Return the path to the record of a release."""
+    if not cache_dir:
+        cache_dir = codetools.cache_dir('github-tag-release')
+
+    return os.path.join(
+        os.path.expanduser(cache_dir),
+        org,
+        "{tag}.json".format(tag=git_tag),
+    )
+
+
+def write_release_record(filename, org, git_tag, manifest, verified):
+    """
+    Record the products which have been tagged or verified as part of a
+    release so that later releases may be checked with `--since-release`.
+
+    Entries are merged into an existing record of the same release, so that
+    partial runs (e.g., `--limit`) accumulate.
+
+    Parameters
+    ----------
+    filename: str
+        Path to write the record to.
+    org: github.Organization.Organization
+    git_tag: str
+        git tag name (as given on the command line -- prior to any `v`
+        prefixing).
+    manifest: str
+        versiondb manifest the release was made from.
+    verified: dict
+        release record entries, keyed by product name.
+    """
+    assert isinstance(org, github.Organization.Organization), type(org)
+
+    products = {}
+    try:
+        record = read_release_record(filename)
+        if record['manifest'] == manifest:
+            products = record['products']
+    except ReleaseRecordError:
+        pass
+    products.update(verified)
+
+    record = {
+        'version': RELEASE_RECORD_VERSION,
+        'created_at': codetools.current_timestamp(),
+        'org': org.login,
+        'tag': git_tag,
+        'manifest': manifest,
+        'products': products,
+    }
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as fh:
+        json.dump(record, fh, indent=2, sort_keys=True)
+
+    debug("wrote record of {n} product(s) to: {f}".format(
+        n=len(products),
+        f=filename,
+    ))
+
+
+def read_release_record(filename):
+    """
+    Read a release record written by `write_release_record()`.
+
+    Returns
+    -------
+    record: dict
+
+    Raises
+    ------
+    ReleaseRecordError
+        If the record does not exist, can not be parsed or is not of a
+        supported version.
+    """
+    try:
+        with open(filename, 'r') as fh:
+            record = json.load(fh)
+    except FileNotFoundError:
+        raise ReleaseRecordError(textwrap.dedent("""\
+            no record of release: {f}
+            The release must have been created or checked with --verify
+            by this program.\
+            """).format(f=filename)) from None
+    except ValueError as e:
+        raise ReleaseRecordError("corrupt release record: {f}: {e}".format(
+            f=filename,
+            e=e,
+        )) from None
+
+    if not isinstance(record, dict):
+        raise ReleaseRecordError(
+            "corrupt release record: {f}".format(f=filename))
+
+    if record.get('version') != RELEASE_RECORD_VERSION:
+        raise ReleaseRecordError(
+            "unsupported release record version: {v} (expected {e})".format(
+                v=record.get('version'),
+                e=RELEASE_RECORD_VERSION,
+            ))
+
+    return record
+
+
+def get_unchanged_products(products, record, base_url=None):
+    """
+    Find the products which are unchanged since a previous release by
+    comparing the manifests of the two releases.
+
+    Returns
+    -------
+    products: dict
+        A copy of `products` where the products which are unchanged, and
+        present in the release record, have the `prev` key set to the release
+        record entry.
+    """
+    prev_products = versiondb.Manifest(
+        record['manifest'],
+        base_url=base_url).products
+
+    checked_products = {}
+    unchanged = 0
+    for name, data in products.items():
+        checked_products[name] = data
+
+        try:
+            prev_sha = prev_products[name]['sha']
+            prev = record['products'][name]
+        except KeyError:
+            continue
+
+        if not data['sha'] == prev_sha == prev['sha']:
+            continue
+
+        checked_products[name] = data.copy()
+        checked_products[name]['prev'] = prev
+        unchanged += 1
+
+    info(textwrap.dedent("""\
+        since release {tag} ({manifest}):
+          {n_same:>4} product(s) are unchanged
+          {n_diff:>4} product(s) are new or changed\
+        """).format(
+        tag=record['tag'],
+        manifest=record['manifest'],
+        n_same=unchanged,
+        n_diff=len(products) - unchanged,
+    ))
+
+    return checked_products
+
+
+def find_tag_since_release(repo, t_tag, prev):
+    """
+    Find the ref for a target tag and check the previous release's tag with a
+    single request.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+    t_tag: codekit.pygithub.TargetTag
+    prev: dict
+        release record entry of the previous release
+
+    Returns
+    -------
+    e_ref: github.GitRef.GitRef or `None`
+
+    Raises
+    ------
+    ReleaseRecordError
+        If the previous release tag is missing or has been moved.
+    github.GithubException
+    """
+    prefix = os.path.commonprefix([prev['tag'], t_tag.name])
+    refs = pygithub.get_matching_tag_refs(repo, prefix)
+
+    p_ref = refs.get(prev['tag'])
+    p_sha = p_ref.object.sha if p_ref else None
+    if p_sha != prev['ref_sha']:
+        raise ReleaseRecordError(textwrap.dedent("""\
+            previous release tag: {tag} in repo: {repo}
+            does not match the release record:
+              recorded: {r_sha}
+              current:  {p_sha}
+            Re-run without --since-release.\
+            """).format(
+            tag=prev['tag'],
+            repo=repo.full_name,
+            r_sha=prev['ref_sha'],
+            p_sha=p_sha,
+        ))
+
+    return refs.get(t_tag.name)
+
+
+def tag_product(name, data, dry_run=False, verified=None):
+    """
+    Create or update the git tag for a single product.
+
+    Parameters
+    ----------
+    verified: dict, optional
+        If the tag is created/updated, a release record entry is added.
+
+    Raises
+    ------
+    codekit.pygithub.CaughtRepositoryError
+    """
+    repo = data['repo']
+    t_tag = data['target_tag']
+
+    info(textwrap.dedent("""\
+        tagging repo: {repo} @
+          sha: {sha} as {gt}
+          (eups version: {et})
+          external repo: {v}
+          replace existing tag: {update}\
+        """).format(
+        repo=repo.full_name,
+        sha=t_tag.sha,
+        gt=t_tag.name,
+        et=data['eups_version'],
+        v=data['v'],
+        update=data['update_tag'],
+    ))
+
+    action = dict(
+        action='retag' if data['update_tag'] else 'tag',
+        repo=repo.full_name,
+        product=name,
+        tag=t_tag.name,
+        sha=t_tag.sha,
+    )
+
+    if dry_run:
+        info('  (noop)')
+        events.emit('action', dry_run=True, **action)
+        return
+
+    try:
+        tag_obj = repo.create_git_tag(
+            t_tag.name,
+            t_tag.message,
+            t_tag.sha,
+            'commit',
+            tagger=t_tag.tagger,
+        )
+        debug("  created tag object %s", tag_obj)
+
+        if data['update_tag']:
+            ref = pygithub.find_tag_by_name(
+                repo,
+                t_tag.name,
+                safe=False,
+            )
+            ref.edit(tag_obj.sha, force=True)
+            debug("  updated existing ref: %s", ref)
+        else:
+            ref = repo.create_git_ref(
+                "refs/tags/{t}".format(t=t_tag.name),
+                tag_obj.sha
+            )
+            debug("  created ref: %s", ref)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = "error creating tag: {t}".format(t=t_tag.name)
+        raise pygithub.CaughtRepositoryError(repo, e, msg) from None
+
+    events.emit('action', dry_run=False, **action)
+
+    if verified is not None:
+        verified[name] = release_record_entry(data, t_tag, tag_obj.sha)
+
+
+@profiling.phase('tag')
+def tag_products(
+    products,
+    fail_fast=False,
+    dry_run=False,
+    verified=None,
+):
+    problems = []
+    for name, data in products.items():
+        try:
+            tag_product(name, data, dry_run=dry_run, verified=verified)
+        except pygithub.CaughtRepositoryError as e:
+            if fail_fast:
+                raise
+            problems.append(e)
+            error(e)
+
+    if problems:
+        msg = "{n} tag failures".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
+
+
+@profiling.phase('pipeline')
+def pipeline_products(
+    org,
+    products,
+    allow_teams,
+    ext_teams,
+    deny_teams,
+    git_tag,
+    tag_message_template,
+    tagger,
+    force_tag=False,
+    ignore_git_message=False,
+    ignore_git_tagger=False,
+    tag=False,
+    fail_fast=False,
+    dry_run=False,
+    workers=4,
+    verified=None,
+):
+    """
+    Stream products through repo resolution, tag checking and, optionally,
+    tagging.  Each product moves on to the next stage as soon as it has
+    cleared the previous one, rather than waiting for all products to finish
+    each stage.
+
+    Parameters
+    ----------
+    tag: bool
+        Tag products as they pass the pre-flight checks.  Note that this means
+        that tags may be created even though pre-flight checks of other
+        products fail.
+
+    fail_fast: bool
+        Fail immediately on a tagging (write) error. Pre-flight errors never
+        fail fast.
+
+    Returns
+    -------
+    products: dict
+        Products which need to be tagged (or were tagged when `tag` is
+        `True`).
+
+    problems: list
+        pre-flight errors
+
+    tag_problems: list
+        tagging errors
+    """
+    repo_index = get_repo_index()
+
+    @profiling.phase('resolve repo')
+    def resolve(item):
+        name, data = item
+        return name, get_repo_for_product(
+            org,
+            name,
+            data,
+            repo_index,
+            allow_teams=allow_teams,
+            ext_teams=ext_teams,
+            deny_teams=deny_teams,
+        )
+
+    @profiling.phase('check tag')
+    def check(item):
+        name, data = item
+        checked = check_product_tag(
+            name,
+            data,
+            git_tag,
+            tag_message_template=tag_message_template,
+            tagger=tagger,
+            force_tag=force_tag,
+            ignore_git_message=ignore_git_message,
+            ignore_git_tagger=ignore_git_tagger,
+            verified=verified,
+        )
+        if not checked:
+            return None
+        return name, checked
+
+    tag_problems = []
+
+    @profiling.phase('tag')
+    def create(item):
+        name, data = item
+        try:
+            tag_product(name, data, dry_run=dry_run, verified=verified)
+        except pygithub.CaughtRepositoryError as e:
+            if fail_fast:
+                raise codetools.DogpileError([e], 'tag failure') from None
+            error(e)
+            tag_problems.append(e)
+        return item
+
+    stages = [
+        concurrency.Stage('resolve', resolve, workers=workers),
+        concurrency.Stage('check', check, workers=workers),
+    ]
+    if tag:
+        stages.append(concurrency.Stage('tag', create, workers=workers))
+
+    results, problems = concurrency.run_pipeline(
+        products.items(),
+        stages,
+        catch=PREFLIGHT_ERRORS,
+    )
+
+    if problems:
+        error("{n} product(s) have error(s)".format(n=len(problems)))
+    if tag_problems:
+        error("{n} tag failures".format(n=len(tag_problems)))
+
+    # restore the original product ordering
+    results = dict(results)
+    products_to_tag = {k: results[k] for k in products if k in results}
+
+    return products_to_tag, problems, tag_problems
+
+
+def run(argv=None):
+    """Create the tag"""
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
+
+    global g
+    if args.apply:
+        g = pygithub.login_github(token_path=args.token_path, token=args.token)
+        org = g.get_organization(args.org)
+        info("applying plan to repos in org: {org}".format(org=org.login))
+
+        apply_plan(
+            args.apply,
+            org,
+            fail_fast=args.fail_fast,
+            dry_run=args.dry_run,
+            release_cache=args.release_cache,
+        )
+        return
 
     git_tag = args.tag
 
@@ -795,62 +1695,135 @@ def run():
     )
     debug("using taggger: {tagger}".format(tagger=tagger))
 
-    global g
+    team_cache = pygithub.configure_team_cache(args)
+
     g = pygithub.login_github(token_path=args.token_path, token=args.token)
     org = g.get_organization(args.org)
     info("tagging repos in org: {org}".format(org=org.login))
 
     problems = []
 
-    manifest_products = versiondb.Manifest(
-        manifest,
-        base_url=args.versiondb_base_url).products
+    with profiling.phase('read products'):
+        manifest_products = versiondb.Manifest(
+            manifest,
+            base_url=args.versiondb_base_url).products
+
+        if not args.manifest_only:
+            # cross-reference eups tag version strings with manifest
+            eups_products = eups.EupsTag(
+                eups_tag,
+                base_url=args.eupstag_base_url).products
+
+            # do not fail-fast on non-write operations
+            products, err = cross_reference_products(
+                eups_products,
+                manifest_products,
+                ignore_manifest_versions=args.ignore_manifest_versions,
+                fail_fast=False,
+            )
+            problems += err
+        else:
+            # no eups tag; use manifest products without sanity check against
+            # eups tag version strings
+            products = manifest_products
+
+        if args.limit:
+            products = dict(itertools.islice(products.items(), args.limit))
+
+        if args.since_release:
+            record = read_release_record(release_record_path(
+                args.release_cache,
+                org.login,
+                args.since_release,
+            ))
+            products = get_unchanged_products(
+                products,
+                record,
+                base_url=args.versiondb_base_url,
+            )
 
-    if not args.manifest_only:
-        # cross-reference eups tag version strings with manifest
-        eups_products = eups.EupsTag(
-            eups_tag,
-            base_url=args.eupstag_base_url).products
+    # release record entries of tagged/verified products
+    verified = {}
+
+    if args.pipeline:
+        # writes may only be overlapped with the pre-flight checks when the
+        # complete set of products to tag is not needed up front, and no
+        # product has already failed them.
+        stream_tags = not (
+            args.preflight_barrier or
+            args.verify or
+            args.plan_out or
+            problems
+        )
+
+        products_to_tag, err, tag_err = pipeline_products(
+            org,
+            products,
+            allow_teams=args.allow_team,
+            ext_teams=args.external_team,
+            deny_teams=args.deny_team,
+            git_tag=git_tag,
+            tag_message_template=message_template,
+            tagger=tagger,
+            force_tag=args.force_tag,
+            ignore_git_message=args.ignore_git_message,
+            ignore_git_tagger=args.ignore_git_tagger,
+            tag=stream_tags,
+            fail_fast=args.fail_fast,
+            dry_run=args.dry_run,
+            workers=args.workers,
+            verified=verified,
+        )
+        problems += err
 
+        team_cache.save()
+
+        if stream_tags:
+            problems += tag_err
+            if problems:
+                msg = "{n} error(s)".format(n=len(problems))
+                raise codetools.DogpileError(problems, msg)
+
+            if not args.dry_run:
+                write_release_record(
+                    release_record_path(
+                        args.release_cache,
+                        org.login,
+                        git_tag,
+                    ),
+                    org,
+                    git_tag,
+                    manifest,
+                    verified,
+                )
+            return
+    else:
         # do not fail-fast on non-write operations
-        products, err = cross_reference_products(
-            eups_products,
-            manifest_products,
-            ignore_manifest_versions=args.ignore_manifest_versions,
+        products, err = get_repo_for_products(
+            org=org,
+            products=products,
+            allow_teams=args.allow_team,
+            ext_teams=args.external_team,
+            deny_teams=args.deny_team,
             fail_fast=False,
         )
         problems += err
-    else:
-        # no eups tag; use manifest products without sanity check against eups
-        # tag version strings
-        products = manifest_products
-
-    if args.limit:
-        products = dict(itertools.islice(products.items(), args.limit))
 
-    # do not fail-fast on non-write operations
-    products, err = get_repo_for_products(
-        org=org,
-        products=products,
-        allow_teams=args.allow_team,
-        ext_teams=args.external_team,
-        deny_teams=args.deny_team,
-        fail_fast=False,
-    )
-    problems += err
+        team_cache.save()
 
-    # do not fail-fast on non-write operations
-    products_to_tag, err = check_product_tags(
-        products,
-        git_tag,
-        tag_message_template=message_template,
-        tagger=tagger,
-        force_tag=args.force_tag,
-        fail_fast=False,
-        ignore_git_message=args.ignore_git_message,
-        ignore_git_tagger=args.ignore_git_tagger,
-    )
-    problems += err
+        # do not fail-fast on non-write operations
+        products_to_tag, err = check_product_tags(
+            products,
+            git_tag,
+            tag_message_template=message_template,
+            tagger=tagger,
+            force_tag=args.force_tag,
+            fail_fast=False,
+            ignore_git_message=args.ignore_git_message,
+            ignore_git_tagger=args.ignore_git_tagger,
+            verified=verified,
+        )
+        problems += err
 
     if args.verify:
         # in verify mode, it is an error if there are products that need to be
@@ -862,26 +1835,45 @@ def run():
         msg = "{n} pre-flight error(s)".format(n=len(problems))
         raise codetools.DogpileError(problems, msg)
 
+    if args.plan_out:
+        write_plan(
+            args.plan_out,
+            products_to_tag,
+            org=org,
+            git_tag=git_tag,
+            tagger=tagger,
+            manifest=manifest,
+            eups_tag=None if args.manifest_only else eups_tag,
+        )
+        # the plan is applied later with --apply
+        return
+
     tag_products(
         products_to_tag,
         fail_fast=args.fail_fast,
         dry_run=args.dry_run,
+        verified=verified,
     )
 
+    if not args.dry_run:
+        write_release_record(
+            release_record_path(args.release_cache, org.login, git_tag),
+            org,
+            git_tag,
+            manifest,
+            verified,
+        )
+
 
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run, errors=COMMAND_ERRORS))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -1,20 +1,21 @@
 #!/usr/bin/env python3
 
 from codekit.codetools import debug, error, info, warn
-from codekit import codetools, pygithub
+from codekit import codetools, concurrency, events, profiling, pygithub
 import argparse
 import codekit.progressbar as pbar
-import github
 import re
 import sys
 import textwrap
 
+github = codetools.lazy_import('github')
+
 
 class GitTagExistsError(Exception):
     pass
 
 
-def parse_args():
+def parse_args(argv=None):
     """Parse command-line arguments"""
     prog = 'github-tag-teams'
 
@@ -112,11 +113,26 @@ def parse_args():
         '--token',
         default=None,
         help='Literal github personal access token string')
+    pygithub.add_team_cache_arguments(parser)
+    parser.add_argument(
+        '--workers',
+        default=4,
+        type=int,
+        help='Number of repos to tag (or tags to delete) concurrently.'
+             ' (default: %(default)s)')
+    parser.add_argument(
+        '--pace',
+        default=0.25,
+        type=float,
+        help='Minimum number of seconds between github API write requests.'
+             ' (default: %(default)s)')
     parser.add_argument(
         '-d', '--debug',
         action='count',
         default=codetools.debug_lvl_from_env(),
         help='Debug mode (can specify several times)')
+    profiling.add_arguments(parser)
+    events.add_arguments(parser)
     parser.add_argument('-v', '--version', action=codetools.ScmVersionAction)
 
     delete_group = parser.add_mutually_exclusive_group()
@@ -132,7 +148,7 @@ def parse_args():
              ' -- normally this would be an error.'
              ' (mutually exclusive with --delete)')
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def tag_name_from_ref(ref):
@@ -145,6 +161,7 @@ def tag_name_from_ref(ref):
 # codekit.pygithub.TargetTag object and then compare it to an existing tag (if
 # present) -- it should also return list of tags to be applied instead of only
 # errors.
+@profiling.phase('check tags')
 def check_tags(repos, tags, ignore_existing=False, fail_fast=False):
     """ check if tags already exist in repos"""
 
@@ -223,41 +240,16 @@ def find_tags_in_repo(repo, tags):
     return found_tags
 
 
-cached_teams = {}
-
-
 def find_repo_teams(repo):
-    # Repository objects are unhashable, so we can't use memoization ;(
-    if repo.full_name in cached_teams:
-        return cached_teams[repo.full_name]
-
-    try:
-        # flatten iterator so the results are cached
-        teams = list(repo.get_teams())
-    except github.RateLimitExceededException:
-        raise
-    except github.GithubException as e:
-        msg = 'error getting teams'
-        raise pygithub.CaughtRepositoryError(repo, e, msg) from None
-
-    cached_teams[repo.full_name] = teams
-
-    return teams
+    """Return the names of the teams a repo is a member of (cached)."""
+    return pygithub.get_repo_team_names(repo)
 
 
 def get_candidate_teams(org, target_teams):
     assert isinstance(org, github.Organization.Organization), type(org)
 
-    try:
-        teams = list(org.get_teams())
-    except github.RateLimitExceededException:
-        raise
-    except github.GithubException as e:
-        msg = 'error getting teams'
-        raise pygithub.CaughtOrganizationError(org, e, msg) from None
-
     debug("looking for teams: {teams}".format(teams=target_teams))
-    tag_teams = [t for t in teams if t.name in target_teams]
+    tag_teams = pygithub.get_teams_by_name(org, target_teams)
     debug("found teams: {teams}".format(teams=tag_teams))
 
     if not tag_teams:
@@ -266,6 +258,7 @@ def get_candidate_teams(org, target_teams):
     return tag_teams
 
 
+@profiling.phase('find repos')
 def get_candidate_repos(teams):
     # flatten generator to list so it can be itererated over multiple times
     repos = list(pygithub.get_repos_by_team(teams))
@@ -279,8 +272,7 @@ def get_candidate_repos(teams):
     for r in repos:
         # list only teams which were used to select the repo as a candiate
         # for tagging
-        s_teams = [t.name for t in find_repo_teams(r)
-                   if t.name in team_names]
+        s_teams = [t for t in find_repo_teams(r) if t in team_names]
         info("  {repo: >{w}} {teams}".format(
             w=max_name_len,
             repo=r.full_name,
@@ -290,6 +282,7 @@ def get_candidate_repos(teams):
     return repos
 
 
+@profiling.phase('check repos')
 def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
     problems = []
     for r in repos:
@@ -298,7 +291,7 @@ def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
                 r,
                 allow_teams=allow_teams,
                 deny_teams=deny_teams,
-                team_names=[t.name for t in find_repo_teams(r)],
+                team_names=find_repo_teams(r),
             )
         except pygithub.RepositoryTeamMembershipError as e:
             if fail_fast:
@@ -311,10 +304,24 @@ def check_repos(repos, allow_teams, deny_teams, fail_fast=False):
     return problems
 
 
-def tag_repos(absent_tags, **kwargs):
+@profiling.phase('tag')
+def tag_repos(absent_tags, workers=1, pace=0, **kwargs):
+    """Create tags in repos concurrently.
+
+    Parameters
+    ----------
+    workers: int
+        Number of repos to tag concurrently.
+    pace: float
+        Minimum number of seconds between write requests (across all workers).
+
+    Returns
+    -------
+    problems: list
+    """
     if not absent_tags:
         info('nothing to do')
-        return
+        return []
 
     info("tagging {n} repo(s) [tags]:".format(n=len(absent_tags)))
 
@@ -326,18 +333,87 @@ def tag_repos(absent_tags, **kwargs):
             tags=absent_tags[k]['need_tags']
         ))
 
-    for k in absent_tags:
-        r = absent_tags[k]['repo']
-        tags = absent_tags[k]['need_tags']
-        create_tags(r, tags, **kwargs)
+    # resolve the default branch heads of all repos up front, rather than
+    # with two requests per repo
+    heads = get_default_heads([v['repo'] for v in absent_tags.values()])
+
+    pacer = concurrency.Pacer(pace)
+
+    def tag(k):
+        create_tags(
+            absent_tags[k]['repo'],
+            absent_tags[k]['need_tags'],
+            head=heads.get(k),
+            pacer=pacer,
+            **kwargs
+        )
+
+    with pbar.eta_bar(msg='tagging', max_value=len(absent_tags)) as progress:
+        _, problems = concurrency.map_concurrently(
+            tag,
+            absent_tags,
+            workers=workers,
+            catch=(GitTagExistsError, pygithub.CaughtRepositoryError),
+            progress=progress,
+        )
+
+    if problems:
+        error("{n} repo(s) have error(s)".format(n=len(problems)))
+
+    return problems
+
+
+def get_default_heads(repos):
+    """Resolve the heads of the default branches of repos in bulk.
 
+    Returns
+    -------
+    heads: dict of `codekit.pygithub.BranchHead` keyed by repo full_name
+    """
+    try:
+        heads = pygithub.get_default_heads(repos)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        # create_tags() will fall back to resolving heads one repo at a time
+        warn("unable to resolve default branches in bulk: {e}".format(e=e))
+        heads = {}
+
+    debug("resolved default branch of {n}/{t} repo(s)".format(
+        n=len(heads),
+        t=len(repos),
+    ))
 
-def create_tags(repo, tags, tagger, dry_run=False):
+    return heads
+
+
+def create_tags(repo, tags, tagger, head=None, pacer=None, dry_run=False):
+    """Create annotated tag(s) at the head of the default branch of a repo.
+
+    Parameters
+    ----------
+    head: codekit.pygithub.BranchHead, optional
+        Head of the default branch, if already known.
+    pacer: codekit.concurrency.Pacer, optional
+        Waited upon before each write request.
+
+    Raises
+    ------
+    GitTagExistsError
+        If a tag was created after the tags were checked.
+    codekit.pygithub.CaughtRepositoryError
+    """
     assert isinstance(repo, github.Repository.Repository), type(repo)
 
     # tag the head of the designated "default branch"
     # XXX this probably should be resolved via repos.yaml
-    head = pygithub.get_default_ref(repo)
+    if head is None:
+        ref = pygithub.get_default_ref(repo)
+        head = pygithub.BranchHead(
+            ref=ref.ref,
+            sha=ref.object.sha,
+            type=ref.object.type,
+        )
 
     debug(textwrap.dedent("""\
         tagging repo: {repo} @
@@ -347,33 +423,84 @@ def create_tags(repo, tags, tagger, dry_run=False):
         """).format(
         repo=repo.full_name,
         db=head.ref,
-        obj_type=head.object.type,
-        obj_sha=head.object.sha
+        obj_type=head.type,
+        obj_sha=head.sha
     ))
 
     for t in tags:
         debug("  creating 'annotated tag' {t}".format(t=t))
         if dry_run:
             debug('    (noop)')
+            events.emit(
+                'action',
+                action='tag',
+                repo=repo.full_name,
+                tag=t,
+                sha=head.sha,
+                dry_run=True,
+            )
             continue
 
-        tag_obj = repo.create_git_tag(
-            t,
-            "Version {t}".format(t=t),  # fmt similar to github-tag-release
-            head.object.sha,
-            head.object.type,
-            tagger=tagger
+        try:
+            if pacer:
+                pacer.wait()
+            tag_obj = repo.create_git_tag(
+                t,
+                "Version {t}".format(t=t),  # fmt similar to github-tag-release
+                head.sha,
+                head.type,
+                tagger=tagger
+            )
+            debug("  created tag object {tag_obj}".format(tag_obj=tag_obj))
+
+            if pacer:
+                pacer.wait()
+            ref = repo.create_git_ref(
+                "refs/tags/{t}".format(t=t),
+                tag_obj.sha
+            )
+            debug("  created ref: {ref}".format(ref=ref.ref))
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            if e.status == 422 and 'Reference already exists' in str(e.data):
+                raise GitTagExistsError(
+                    "tag {tag} already exists in repo {r}".format(
+                        tag=t,
+                        r=repo.full_name,
+                    )) from None
+
+            msg = "error creating tag: {t}".format(t=t)
+            raise pygithub.CaughtRepositoryError(repo, e, msg) from None
+
+        events.emit(
+            'action',
+            action='tag',
+            repo=repo.full_name,
+            tag=t,
+            sha=head.sha,
+            dry_run=False,
         )
-        debug("  created tag object {tag_obj}".format(tag_obj=tag_obj))
 
-        ref = repo.create_git_ref("refs/tags/{t}".format(t=t), tag_obj.sha)
-        debug("  created ref: {ref}".format(ref=ref.ref))
 
+@profiling.phase('untag')
+def untag_repos(present_tags, workers=1, pace=0, **kwargs):
+    """Delete tags from repos concurrently.
+
+    Parameters
+    ----------
+    workers: int
+        Number of tags to delete concurrently.
+    pace: float
+        Minimum number of seconds between write requests (across all workers).
 
-def untag_repos(present_tags, **kwargs):
+    Returns
+    -------
+    problems: list
+    """
     if not present_tags:
         info('nothing to do')
-        return
+        return []
 
     warn('Deleting tag(s)')
     pbar.wait_for_user_panic_once()
@@ -388,36 +515,76 @@ def untag_repos(present_tags, **kwargs):
             tags=[tag_name_from_ref(ref) for ref in present_tags[k]['tags']]
         ))
 
-    for k in present_tags:
-        r = present_tags[k]['repo']
-        tags = present_tags[k]['tags']
-        delete_refs(r, tags, **kwargs)
+    # the github api can only delete one ref per request, so each ref is a
+    # separate unit of work
+    refs = [(v['repo'], ref) for v in present_tags.values()
+            for ref in v['tags']]
+
+    pacer = concurrency.Pacer(pace)
+
+    def delete(item):
+        repo, ref = item
+        delete_ref(repo, ref, pacer=pacer, **kwargs)
+
+    with pbar.eta_bar(msg='untagging', max_value=len(refs)) as progress:
+        _, problems = concurrency.map_concurrently(
+            delete,
+            refs,
+            workers=workers,
+            catch=(pygithub.CaughtRepositoryError,),
+            progress=progress,
+        )
+
+    if problems:
+        error("{n} ref(s) have error(s)".format(n=len(problems)))
+
+    return problems
 
 
-def delete_refs(repo, refs, dry_run=False):
+def delete_ref(repo, ref, pacer=None, dry_run=False):
     """Note that only the ref to a tag can be explicitly removed.  The tag
-    object will leave on until it's gargabe collected."""
+    object will leave on until it's gargabe collected.
+
+    Raises
+    ------
+    codekit.pygithub.CaughtRepositoryError
+    """
 
     assert isinstance(repo, github.Repository.Repository), type(repo)
 
-    debug("removing {n} refs from {repo}".format(
-        n=len(refs),
+    debug("deleting {ref} from {repo}".format(
+        ref=ref.ref,
         repo=repo.full_name)
     )
 
-    for r in refs:
-        debug("  deleting {ref}".format(ref=r.ref))
-        if dry_run:
-            debug('    (noop)')
-            continue
+    if not dry_run:
+        try:
+            if pacer:
+                pacer.wait()
+            ref.delete()
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            msg = "error deleting ref: {ref}".format(ref=ref.ref)
+            raise pygithub.CaughtRepositoryError(repo, e, msg) from None
+    else:
+        debug('    (noop)')
 
-        r.delete()
+    events.emit(
+        'action',
+        action='untag',
+        repo=repo.full_name,
+        ref=ref.ref,
+        dry_run=dry_run,
+    )
 
 
-def run():
-    args = parse_args()
+def run(argv=None):
+    args = parse_args(argv)
 
     codetools.setup_logging(args.debug)
+    profiling.configure(args)
+    events.configure(args)
 
     gh_org_name = args.org
     tags = args.tag
@@ -432,6 +599,8 @@ def run():
     )
     debug(tagger)
 
+    team_cache = pygithub.configure_team_cache(args)
+
     global g
     g = pygithub.login_github(token_path=args.token_path, token=args.token)
     org = g.get_organization(gh_org_name)
@@ -461,29 +630,42 @@ def run():
     )
     problems += err
 
+    team_cache.save()
+
     if problems:
         msg = "{n} repo(s) have errors".format(n=len(problems))
         raise codetools.DogpileError(problems, msg)
 
     if args.delete:
-        untag_repos(present_tags, dry_run=args.dry_run)
+        problems += untag_repos(
+            present_tags,
+            workers=args.workers,
+            pace=args.pace,
+            dry_run=args.dry_run,
+        )
     else:
-        tag_repos(absent_tags, tagger=tagger, dry_run=args.dry_run)
+        problems += tag_repos(
+            absent_tags,
+            workers=args.workers,
+            pace=args.pace,
+            tagger=tagger,
+            dry_run=args.dry_run,
+        )
+
+    if problems:
+        msg = "{n} tag failures".format(n=len(problems))
+        raise codetools.DogpileError(problems, msg)
 
 
 def main():
     try:
         try:
-            run()
-        except codetools.DogpileError as e:
-            error(e)
-            n = len(e.errors)
-            sys.exit(n if n < 256 else 255)
-        else:
-            sys.exit(0)
+            sys.exit(codetools.run_command(run))
         finally:
             if 'g' in globals():
                 pygithub.debug_ratelimit(g)
+            profiling.report()
+            events.close(sys.exc_info()[1])
     except SystemExit as e:
         debug("exit {status}".format(status=str(e)))
         raise e
@@ -5,20 +5,105 @@
 
 
 from datetime import datetime
-from pkg_resources import get_distribution
-from public import public
 import argparse
-import gitconfig
+import contextlib
+import importlib
+import importlib.util
+import logging
+import logging.handlers
 import os
+import queue
 import shutil
 import sys
 import tempfile
 import textwrap
+import threading
+import types
+
+
+def public(obj):
+    """Decorator which adds a function or class to `__all__` of the module in
+    which it is defined.
+
+    This replaces the `public` package, which walks (and reads the source of)
+    the call stack each time it is used, at a considerable cost to the import
+    time of every codekit module.
+    """
+    mod_all = sys.modules[obj.__module__].__dict__.setdefault('__all__', [])
+    if obj.__name__ not in mod_all:
+        mod_all.append(obj.__name__)
+
+    return obj
+
 
 # configured by setup_logging() -- this is declared only as a friendly reminder
 # that something unusual is going on this with this var.
 logger = None
 
+# (clear, per_run) tuples registered by register_cache()
+_caches = []
+
+# state of queued_logging()
+_log_queue_lock = threading.Lock()
+_log_queue_depth = 0
+_log_listener = None
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in for a module, which is imported upon first attribute access.
+
+    The stand-in is never placed in `sys.modules` so that other importers of
+    the module, and of its submodules, are not affected.
+    """
+
+    def __getattr__(self, attr):
+        module = self.__dict__.get('_LazyModule__module')
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__module = module
+
+        return getattr(module, attr)
+
+
+@public
+def lazy_import(name):
+    """Import a module, deferring its execution until an attribute of it is
+    first accessed.
+
+    This keeps heavy dependencies, which are not needed to (for example)
+    parse command-line arguments, out of the startup time of the cli
+    commands.
+
+    Parameters
+    ----------
+    name: str
+        absolute name of the module
+
+    Returns
+    -------
+    module: types.ModuleType
+        The module, if it has already been imported, otherwise a stand-in for
+        it.
+
+    Raises
+    ------
+    ImportError
+        If the module can not be found
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+
+    if importlib.util.find_spec(name) is None:
+        raise ImportError("No module named {name!r}".format(name=name),
+                          name=name)
+
+    return _LazyModule(name)
+
+
+gitconfig = lazy_import('gitconfig')
+
 
 @public
 def setup_logging(verbosity=0):
@@ -41,30 +126,16 @@ def setup_logging(verbosity=0):
         Logging / output verbosity level. 1 is useful for more purposes while
         2+ is generaly TMI.
     """
-    import pkgutil
-    import logging
-    import codekit
-
-    # https://packaging.python.org/guides/creating-and-discovering-plugins/#using-namespace-packages
-    def iter_namespace(ns_pkg):
-        # Specifying the second argument (prefix) to iter_modules makes the
-        # returned name an absolute name instead of a relative one. This allows
-        # import_module to work without having to do additional modification to
-        # the name.
-        return pkgutil.iter_modules(ns_pkg.__path__, ns_pkg.__name__ + ".")
-
-    # find codekit modules that are not a package
-    codekit_mods = [name for finder, name, ispkg in iter_namespace(codekit)
-                    if ispkg is False]
-
-    # filter out the current module
-    # XXX `is not` doesn't work here but `!=` does... why???
-    codekit_mods = [m for m in codekit_mods
-                    if m != __name__]
-
-    # filter out modules that have not been imported
-    codekit_mods = [m for m in codekit_mods
-                    if m in sys.modules]
+    # find codekit modules, which are not a package, that have already been
+    # imported -- only those can need their logging configured, so there is no
+    # need to search the filesystem for other modules.
+    codekit_mods = sorted(
+        m for m in list(sys.modules)
+        if m.startswith('codekit.') and
+        m.count('.') == 1 and
+        m != __name__ and
+        not hasattr(sys.modules[m], '__path__')
+    )
 
     # record funcs successfully called
     logging_funcs = []
@@ -111,7 +182,16 @@ class ScmVersionAction(argparse.Action):
         self.version = version
 
     def __call__(self, parser, namespace, values, option_string=None):
-        version = get_distribution('sqre-codekit').version
+        try:
+            from importlib.metadata import version as dist_version
+        except ImportError:
+            # python < 3.8
+            from pkg_resources import get_distribution
+
+            def dist_version(name):
+                return get_distribution(name).version
+
+        version = dist_version('sqre-codekit')
         formatter = parser._get_formatter()
         formatter.add_text("%(prog)s {v}".format(v=version))
         parser._print_message(formatter.format_help(), sys.stdout)
@@ -128,6 +208,84 @@ class DogpileError(Exception):
         return self.msg + "\n" + "\n".join([str(e) for e in self.errors])
 
 
+@public
+def run_command(run, argv=None, errors=()):
+    """Run a command, reporting the errors it is expected to fail with rather
+    than raising them.
+
+    This is shared by the `main()` of each command and by chained `codekit`
+    subcommands.
+
+    Parameters
+    ----------
+    run: callable
+        The `run(argv)` function of a command.
+
+    argv: list(str), optional
+        Command-line arguments. The default is `sys.argv`.
+
+    errors: tuple(type)
+        Errors, other than `DogpileError`, which are reported with an exit
+        status of 1.
+
+    Returns
+    -------
+    status: int
+        exit status of the command
+    """
+    from codekit import events
+
+    try:
+        run(argv)
+    except DogpileError as e:
+        error(e)
+        events.error(e)
+        n = len(e.errors)
+        return n if n < 256 else 255
+    except errors as e:
+        error(e)
+        events.error(e)
+        return 1
+
+    return 0
+
+
+@public
+def register_cache(clear, per_run=False):
+    """Register a function which empties a module level cache.
+
+    Module level caches normally live as long as a single command. When
+    commands are run by `codekit.daemon`, they are shared by all commands run
+    by the process until `clear_caches()` is called.
+
+    Parameters
+    ----------
+    clear: callable
+        Called without arguments to empty the cache.
+
+    per_run: bool
+        The cache holds state which must not be shared between commands, such
+        as a prompt which is only shown once.
+    """
+    _caches.append((clear, per_run))
+
+    return clear
+
+
+@public
+def clear_caches(per_run_only=False):
+    """Empty registered module level caches.
+
+    Parameters
+    ----------
+    per_run_only: bool
+        Only empty the caches registered with `per_run=True`.
+    """
+    for clear, per_run in _caches:
+        if per_run or not per_run_only:
+            clear()
+
+
 @public
 def lookup_email(args):
     """Return the email address to use when creating git objects or exit
@@ -261,28 +419,96 @@ def github_2fa_callback():
     return code
 
 
+def _log(level, msg, args):
+    # nothing is formatted unless the record is going to be emitted
+    if not logger or not logger.isEnabledFor(level):
+        return
+
+    if callable(msg):
+        msg = msg()
+    # report the caller of info(), debug(), etc. as the origin of the record
+    # (`logger.log()` only accepts a `stacklevel` on python 3.8+)
+    caller = sys._getframe(2)
+    logger.handle(logger.makeRecord(
+        logger.name,
+        level,
+        caller.f_code.co_filename,
+        caller.f_lineno,
+        msg,
+        args,
+        None,
+        caller.f_code.co_name,
+    ))
+
+
+@public
+def info(msg, *args):
+    """Log a message at level INFO.
+
+    As with `logging`, `msg` is %-formatted with `args`, if any. `msg` may be
+    a callable which returns the message, in which case it is only called if
+    the message is going to be logged. E.g.::
+
+        debug("found: %s", repo.full_name)
+        debug(lambda: expensive_summary(products))
+    """
+    _log(logging.INFO, msg, args)
+
+
 @public
-def info(*args):
-    if logger:
-        logger.info(*args)
+def debug(msg, *args):
+    """Log a message at level DEBUG. See `info()`."""
+    _log(logging.DEBUG, msg, args)
 
 
 @public
-def debug(*args):
-    if logger:
-        logger.debug(*args)
+def warn(msg, *args):
+    """Log a message at level WARNING. See `info()`."""
+    _log(logging.WARNING, msg, args)
 
 
 @public
-def warn(*args):
-    if logger:
-        logger.warn(*args)
+def error(msg, *args):
+    """Log a message at level ERROR. See `info()`."""
+    _log(logging.ERROR, msg, args)
 
 
 @public
-def error(*args):
-    if logger:
-        logger.error(*args)
+@contextlib.contextmanager
+def queued_logging():
+    """Pass log records to the handlers of the root logger through a queue,
+    from a background thread, for the duration of the context.
+
+    Threads which log only contend for a queue, instead of for the lock of
+    each handler while it writes to the terminal.  All queued records are
+    handled before the context exits.  The context may be nested, and entered
+    by several threads.
+    """
+    global _log_queue_depth, _log_listener
+
+    root = logging.getLogger()
+    with _log_queue_lock:
+        _log_queue_depth += 1
+        if _log_queue_depth == 1 and root.handlers:
+            handlers = root.handlers[:]
+            q = queue.Queue()
+            _log_listener = logging.handlers.QueueListener(
+                q,
+                *handlers,
+                respect_handler_level=True,
+            )
+            root.handlers = [logging.handlers.QueueHandler(q)]
+            _log_listener.start()
+
+    try:
+        yield
+    finally:
+        with _log_queue_lock:
+            _log_queue_depth -= 1
+            if _log_queue_depth == 0 and _log_listener:
+                _log_listener.stop()
+                root.handlers = list(_log_listener.handlers)
+                _log_listener = None
 
 
 @public
@@ -309,6 +535,29 @@ class TempDir(object):
         self._temp_dir = None
 
 
+@public
+def cache_dir(*subdirs):
+    """Return the path to a codekit cache directory, creating it if needed.
+
+    The cache is located under `$XDG_CACHE_HOME/codekit`, if `XDG_CACHE_HOME`
+    is set, otherwise `~/.cache/codekit`.
+
+    Parameters
+    ----------
+    subdirs: str
+        path components under the codekit cache directory
+
+    Returns
+    -------
+    path: str
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or '~/.cache'
+    path = os.path.join(os.path.expanduser(base), 'codekit', *subdirs)
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+
 @public
 def current_timestamp():
     """Returns current time as ISO8601 formatted string in the Zulu TZ"""
@@ -0,0 +1,548 @@
+"""Helpers for running github api operations concurrently."""
+
+from codekit.codetools import debug, error, public
+from codekit import events
+import codekit.codetools as codetools
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+
+# marks the end of the items flowing through a pipeline queue
+_DONE = object()
+
+
+@public
+class Stage(object):
+    """A step of a pipeline.
+
+    Parameters
+    ----------
+    name: str
+        Name of the stage (used for logging).
+
+    func: callable
+        Called with a single item and returns the item to be passed to the
+        next stage.  If `None` is returned, the item is dropped from the
+        pipeline.
+
+    workers: int
+        Number of threads concurrently running `func`.
+    """
+
+    def __init__(self, name, func, workers=1):
+        assert workers > 0, workers
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+@public
+def run_pipeline(items, stages, maxsize=16, catch=(), fail_fast=False):
+    """Stream items through a series of stages.
+
+    Each stage has its own pool of worker threads and stages are connected by
+    bounded queues. An item is passed to the next stage as soon as the
+    current stage has finished with it, so there is no barrier between stages.
+
+    Parameters
+    ----------
+    items: iterable
+        Items to feed into the first stage.
+
+    stages: list(Stage)
+        Stages to be run, in order.
+
+    maxsize: int
+        Maximum number of items waiting between any two stages.
+
+    catch: tuple(Exception)
+        Exception types which are considered a problem with a single item.
+        These are logged and collected but do not stop the pipeline.  Any
+        other exception stops the pipeline and is re-raised.
+
+    fail_fast: bool
+        Stop the pipeline and re-raise the first `catch` exception.
+
+    Returns
+    -------
+    results: list
+        Items that made it out of the last stage (in completion order).
+
+    problems: list
+        `catch` exceptions raised by any stage.
+    """
+    assert stages, stages
+
+    queues = [queue.Queue(maxsize=maxsize) for _ in range(len(stages) + 1)]
+    abort = threading.Event()
+    lock = threading.Lock()
+    problems = []
+    fatal = []
+
+    def feed():
+        for item in items:
+            if abort.is_set():
+                break
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+    def work(stage, q_in, q_out, running):
+        while True:
+            item = q_in.get()
+            if item is _DONE:
+                with lock:
+                    running[0] -= 1
+                    last = running[0] == 0
+                # the last worker of a stage to exit signals the next stage,
+                # otherwise the marker is passed on to the remaining workers.
+                if last:
+                    q_out.put(_DONE)
+                else:
+                    q_in.put(_DONE)
+                return
+
+            # keep draining the queue so that upstream stages do not block
+            if abort.is_set():
+                continue
+
+            try:
+                result = stage.func(item)
+            except catch as e:
+                error(e)
+                events.error(e)
+                with lock:
+                    problems.append(e)
+                    if fail_fast:
+                        fatal.append(e)
+                        abort.set()
+                continue
+            except BaseException as e:
+                with lock:
+                    fatal.append(e)
+                abort.set()
+                continue
+
+            if result is not None:
+                q_out.put(result)
+
+    threads = [threading.Thread(target=feed, name='pipeline-feed')]
+    for i, stage in enumerate(stages):
+        debug("pipeline stage {s} with {n} worker(s)".format(
+            s=stage.name,
+            n=stage.workers,
+        ))
+        running = [stage.workers]
+        for n in range(stage.workers):
+            threads.append(threading.Thread(
+                target=work,
+                args=(stage, queues[i], queues[i + 1], running),
+                name="pipeline-{s}-{n}".format(s=stage.name, n=n),
+            ))
+
+    results = []
+    with codetools.queued_logging():
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            results.append(item)
+
+        for t in threads:
+            t.join()
+
+    if fatal:
+        raise fatal[0]
+
+    return results, problems
+
+
+@public
+class Pacer(object):
+    """Enforce a minimum interval between operations, across all threads.
+
+    Parameters
+    ----------
+    interval: float
+        Minimum number of seconds between the start of operations.
+    """
+
+    def __init__(self, interval=0):
+        self.interval = interval
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next operation may start."""
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+@public
+def map_concurrently(
+    func,
+    items,
+    workers=4,
+    catch=(),
+    fail_fast=False,
+    progress=None,
+):
+    """Call `func` on each item using a pool of worker threads.
+
+    Parameters
+    ----------
+    func: callable
+        Called with a single item.
+
+    items: iterable
+        Items to process.
+
+    workers: int
+        Maximum number of concurrent calls to `func`.
+
+    catch: tuple(Exception)
+        Exception types which are considered a problem with a single item.
+        These are logged and collected.  Any other exception cancels any
+        remaining items and is re-raised.
+
+    fail_fast: bool
+        Cancel any remaining items and re-raise the first `catch` exception.
+
+    progress: progressbar.ProgressBar, optional
+        Updated with the number of completed items.
+
+    Returns
+    -------
+    results: list
+        Return values of `func`, in the same order as `items`. The value for
+        items which raised an exception is `None`.
+
+    problems: list
+        `catch` exceptions raised by `func`.
+    """
+    assert workers > 0, workers
+
+    items = list(items)
+    results = [None] * len(items)
+    problems = []
+
+    with codetools.queued_logging(), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, item): i for i, item in enumerate(items)}
+
+        try:
+            for done, f in enumerate(
+                concurrent.futures.as_completed(futures),
+                start=1
+            ):
+                if progress:
+                    progress.update(done)
+
+                try:
+                    results[futures[f]] = f.result()
+                except catch as e:
+                    if fail_fast:
+                        raise
+                    problems.append(e)
+                    error(e)
+                    events.error(e)
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    return results, problems
+
+
+@public
+def imap_ordered(func, items, workers=4, window=16):
+    """Lazily call `func` on each item using a pool of worker threads.
+
+    Up to `window` items ahead of the result being consumed are in flight, so
+    `items` may be an (expensive) lazy iterable, such as a paginated API
+    listing, and results are available as soon as the items preceding them
+    have been processed.
+
+    Parameters
+    ----------
+    func: callable
+        Called with a single item.
+
+    items: iterable
+        Items to process. Consumed incrementally.
+
+    workers: int
+        Maximum number of concurrent calls to `func`.
+
+    window: int
+        Maximum number of items to read ahead.
+
+    Yields
+    ------
+    Return values of `func`, in the same order as `items`. An exception
+    raised by `func` is re-raised when its result is reached.
+    """
+    assert workers > 0, workers
+    assert window >= workers, (window, workers)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for f in pending:
+                f.cancel()
+
+
+@public
+class AdaptiveLimiter(object):
+    """Additive increase / multiplicative decrease (AIMD) concurrency limit.
+
+    The limit grows by about `increase` for each "window" of `limit`
+    successful operations and is multiplied by `decrease` when the server
+    signals that it is being overloaded.  New operations are also held back
+    for the delay requested by the server.
+
+    Parameters
+    ----------
+    initial: int
+        Starting concurrency limit.
+
+    maximum: int
+        Maximum concurrency limit.
+
+    minimum: int
+        Minimum concurrency limit.
+
+    increase: float
+        Additive increase per window of successful operations.
+
+    decrease: float
+        Multiplicative decrease upon being throttled.
+    """
+
+    def __init__(
+        self,
+        initial=2,
+        maximum=16,
+        minimum=1,
+        increase=1,
+        decrease=0.5,
+    ):
+        assert 0 < minimum <= initial <= maximum, (minimum, initial, maximum)
+        assert 0 < decrease < 1, decrease
+
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.increase = increase
+        self.decrease = decrease
+        self.peak = initial
+        self.throttled = 0
+        self._active = 0
+        self._paused_until = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until another operation may start."""
+        with self._cond:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                    continue
+                if self._active < int(self.limit):
+                    break
+                self._cond.wait()
+
+            self._active += 1
+            self.peak = max(self.peak, self._active)
+
+    def release(self):
+        """Mark an operation as finished."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def success(self):
+        """Record a healthy response."""
+        with self._cond:
+            self.limit = min(
+                self.maximum,
+                self.limit + self.increase / self.limit,
+            )
+            self._cond.notify_all()
+
+    def throttle(self, delay=0):
+        """Record that the server has asked the client to back off for
+        `delay` seconds."""
+        with self._cond:
+            self.throttled += 1
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self._paused_until = max(
+                self._paused_until,
+                time.monotonic() + delay,
+            )
+            debug("throttled; concurrency limit now {n}".format(
+                n=int(self.limit)
+            ))
+            self._cond.notify_all()
+
+
+@public
+def map_adaptive(
+    func,
+    items,
+    limiter,
+    throttled,
+    retries=5,
+    catch=(),
+    fail_fast=False,
+    progress=None,
+):
+    """Call `func` on each item with a concurrency controlled by an
+    `AdaptiveLimiter`.
+
+    Parameters
+    ----------
+    func: callable
+        Called with a single item.
+
+    items: iterable
+        Items to process.
+
+    limiter: AdaptiveLimiter
+        Limits the number of concurrent calls to `func`.
+
+    throttled: callable
+        Called with an exception raised by `func`.  Returns the number of
+        seconds to back off for, if the exception signals that the server is
+        throttling requests, otherwise `None`.  Throttled items are retried.
+
+    retries: int
+        Maximum number of times an item is retried after being throttled.
+
+    catch: tuple(Exception)
+        Exception types which are considered a problem with a single item.
+        These are logged and collected.  Any other exception stops any
+        remaining items from being processed and is re-raised.
+
+    fail_fast: bool
+        Stop and re-raise the first `catch` exception.
+
+    progress: progressbar.ProgressBar, optional
+        Updated with the number of completed items.
+
+    Returns
+    -------
+    results: list
+        Return values of `func`, in the same order as `items`. The value for
+        items which raised an exception is `None`.
+
+    problems: list
+        `catch` exceptions raised by `func`.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    problems = []
+    fatal = []
+
+    if not items:
+        return results, problems
+
+    todo = queue.Queue()
+    for i in range(len(items)):
+        todo.put((i, 0))
+
+    abort = threading.Event()
+    lock = threading.Lock()
+    remaining = [len(items)]
+
+    def finish():
+        with lock:
+            remaining[0] -= 1
+            left = remaining[0]
+        if progress:
+            progress.update(len(items) - left)
+        if not left:
+            # wake up all workers so that they exit
+            for _ in range(limiter.maximum):
+                todo.put(_DONE)
+
+    def work():
+        while True:
+            job = todo.get()
+            if job is _DONE:
+                return
+
+            i, attempt = job
+            if abort.is_set():
+                finish()
+                continue
+
+            limiter.acquire()
+            try:
+                results[i] = func(items[i])
+            except Exception as e:
+                delay = throttled(e)
+                if delay is not None:
+                    limiter.throttle(delay)
+                    if attempt < retries:
+                        todo.put((i, attempt + 1))
+                        continue
+
+                with lock:
+                    if isinstance(e, catch):
+                        error(e)
+                        events.error(e)
+                        problems.append(e)
+                        if fail_fast:
+                            fatal.append(e)
+                            abort.set()
+                    else:
+                        fatal.append(e)
+                        abort.set()
+            except BaseException as e:
+                with lock:
+                    fatal.append(e)
+                abort.set()
+            else:
+                limiter.success()
+            finally:
+                limiter.release()
+
+            finish()
+
+    threads = [threading.Thread(target=work, name="adaptive-{n}".format(n=n))
+               for n in range(limiter.maximum)]
+    with codetools.queued_logging():
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+
+    if fatal:
+        raise fatal[0]
+
+    return results, problems
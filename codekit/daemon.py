@@ -0,0 +1,333 @@
+"""A long lived process which runs codekit commands on behalf of thin clients.
+
+github logins (and their http keep-alive connection pools), imported modules
+and module level api caches survive between the commands run by the daemon, so
+that the latency of a command is mostly that of the api requests which it
+actually needs to make.
+
+Clients and the daemon talk over a unix socket, with one JSON object per line.
+A client sends a single job::
+
+    {"argv": ["list-repos", "--org", "lsst"], "cwd": "/home/user"}
+
+and the daemon replies with any number of output chunks, followed by the exit
+status of the command::
+
+    {"stdout": "..."}
+    {"stderr": "..."}
+    {"exit": 0}
+"""
+
+from codekit.codetools import debug, error, info, public
+from codekit import events, profiling
+import codekit.codetools as codetools
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+# the exit status of a command which did not run to completion
+EXIT_FAILURE = 1
+
+
+@public
+def default_socket_path():
+    """Return the path of the daemon socket.
+
+    This is `$CODEKIT_DAEMON_SOCKET`, if set, otherwise `daemon.sock` under the
+    codekit cache directory.
+    """
+    return (os.environ.get('CODEKIT_DAEMON_SOCKET') or
+            os.path.join(codetools.cache_dir(), 'daemon.sock'))
+
+
+def _exit_status(code):
+    """Convert the `code` of a `SystemExit` into an exit status."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    # sys.exit(msg) prints msg to stderr
+    print(code, file=sys.stderr)
+    return EXIT_FAILURE
+
+
+class _SocketStream(io.TextIOBase):
+    """Text stream which sends each write to a client as an output chunk."""
+
+    def __init__(self, send, name):
+        self._send = send
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if s:
+            self._send({self.name: s})
+        return len(s)
+
+
+@contextlib.contextmanager
+def _redirect_output(stdout, stderr):
+    """Send `sys.stdout`, `sys.stderr` and `logging` output to other streams.
+
+    The handlers configured by `logging.basicConfig()` keep a reference to the
+    `sys.stderr` of the time at which they were created, so they must be
+    redirected separately.
+    """
+    handlers = [h for h in logging.root.handlers
+                if type(h) is logging.StreamHandler]
+    streams = [h.stream for h in handlers]
+    for h in handlers:
+        h.setStream(stderr)
+    try:
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            yield
+    finally:
+        for h, s in zip(handlers, streams):
+            h.setStream(s)
+
+
+@contextlib.contextmanager
+def _chdir(path):
+    old = os.getcwd()
+    if path:
+        os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+        lost = []
+
+        def send(msg):
+            if lost:
+                return
+            data = (json.dumps(msg) + '\n').encode('utf-8')
+            with lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except OSError as e:
+                    # the job keeps running but its output is discarded
+                    lost.append(e)
+
+        try:
+            job = json.loads(self.rfile.readline().decode('utf-8'))
+            argv = [str(a) for a in job['argv']]
+            cwd = job.get('cwd')
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            send({'stderr': "invalid job request: {e}\n".format(e=e)})
+            send({'exit': 2})
+            return
+
+        status = self.server.run_job(
+            argv,
+            cwd=cwd,
+            stdout=_SocketStream(send, 'stdout'),
+            stderr=_SocketStream(send, 'stderr'),
+        )
+        send({'exit': status})
+
+        if lost:
+            debug("client went away: {e}".format(e=lost[0]))
+
+
+@public
+class Daemon(socketserver.UnixStreamServer):
+    """Run codekit commands received over a unix socket, one at a time.
+
+    Parameters
+    ----------
+    path: str
+        Path of the socket to listen on. A stale socket, left behind by a
+        daemon which is no longer running, is replaced.
+
+    run: callable
+        Called with the argv of each job. Typically `codekit.cli.codekit.run`.
+
+    cache_ttl: float, optional
+        Number of seconds for which module level caches are kept. They are
+        emptied before the first job run after they expire. Caches never
+        expire if `None`.
+
+    idle_timeout: float, optional
+        Number of seconds without a job after which `serve()` returns.
+
+    Raises
+    ------
+    RuntimeError
+        If another daemon is already listening on `path`.
+    """
+
+    def __init__(self, path, run, cache_ttl=600, idle_timeout=None):
+        self.run = run
+        self.cache_ttl = cache_ttl
+        self.timeout = idle_timeout
+        self.jobs = 0
+        self._cleared = time.monotonic()
+        self._idle = False
+
+        _remove_stale_socket(path)
+
+        # the daemon acts with the github credentials of its users -- no one
+        # else may connect to it.
+        umask = os.umask(0o077)
+        try:
+            super(Daemon, self).__init__(path, _JobHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super(Daemon, self).server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
+
+    def handle_timeout(self):
+        self._idle = True
+
+    def serve(self):
+        """Handle jobs until interrupted or idle for `idle_timeout`
+        seconds."""
+        info("listening on {path}".format(path=self.server_address))
+        while not self._idle:
+            self.handle_request()
+        info("idle for {t}s, exiting".format(t=self.timeout))
+
+    def expire_caches(self):
+        """Empty module level caches which are older than `cache_ttl` and
+        any per command state."""
+        now = time.monotonic()
+        expired = (self.cache_ttl is not None and
+                   now - self._cleared > self.cache_ttl)
+        if expired:
+            debug("caches are older than {t}s, clearing".format(
+                t=self.cache_ttl,
+            ))
+            self._cleared = now
+
+        codetools.clear_caches(per_run_only=not expired)
+
+    def run_job(self, argv, cwd=None, stdout=None, stderr=None):
+        """Run a single command, with its output sent to the given streams.
+
+        Returns
+        -------
+        status: int
+            exit status of the command
+        """
+        self.jobs += 1
+        debug("job {n}: {argv}".format(n=self.jobs, argv=argv))
+        start = time.monotonic()
+
+        self.expire_caches()
+
+        with _redirect_output(stdout or sys.stdout, stderr or sys.stderr):
+            try:
+                with _chdir(cwd):
+                    self.run(argv)
+                status = 0
+            except SystemExit as e:
+                status = _exit_status(e.code)
+            except codetools.DogpileError as e:
+                error(e)
+                events.error(e)
+                n = len(e.errors)
+                status = n if n < 256 else 255
+            except Exception as e:
+                traceback.print_exc()
+                events.error(e)
+                status = EXIT_FAILURE
+
+            profiling.report()
+            events.close(SystemExit(status))
+
+        debug("job {n}: exit {s} after {t:.2f}s".format(
+            n=self.jobs,
+            s=status,
+            t=time.monotonic() - start,
+        ))
+        return status
+
+
+def _remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except ConnectionRefusedError:
+            debug("removing stale socket {path}".format(path=path))
+            os.unlink(path)
+            return
+
+    raise RuntimeError("a daemon is already listening on {path}".format(
+        path=path,
+    ))
+
+
+@public
+def submit(argv, path=None, stdout=None, stderr=None):
+    """Run a command in a daemon and copy its output to local streams.
+
+    Parameters
+    ----------
+    argv: list(str)
+        Arguments of the command.
+
+    path: str, optional
+        Path of the daemon socket. See `default_socket_path()`.
+
+    stdout, stderr: file, optional
+        Streams to copy the output of the command to. Default to `sys.stdout`
+        and `sys.stderr`.
+
+    Returns
+    -------
+    status: int
+        exit status of the command
+
+    Raises
+    ------
+    OSError
+        If no daemon is listening on the socket.
+    """
+    path = path or default_socket_path()
+    streams = {
+        'stdout': stdout or sys.stdout,
+        'stderr': stderr or sys.stderr,
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        debug("submitting job to {path}".format(path=path))
+
+        job = {'argv': list(argv), 'cwd': os.getcwd()}
+        s.sendall((json.dumps(job) + '\n').encode('utf-8'))
+
+        with s.makefile('r', encoding='utf-8') as replies:
+            for line in replies:
+                msg = json.loads(line)
+                if 'exit' in msg:
+                    return msg['exit']
+
+                for name, data in msg.items():
+                    streams[name].write(data)
+                    streams[name].flush()
+
+    error("lost connection to daemon at {path}".format(path=path))
+    return EXIT_FAILURE
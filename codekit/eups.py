@@ -1,14 +1,20 @@
 """EUPS distrib tag related utility functions."""
 
-from codekit.codetools import debug
-from public import public
+from codekit.codetools import debug, public
+from codekit import profiling
+import codekit.codetools as codetools
 import logging
 import re
-import requests
 import textwrap
 
+requests = codetools.lazy_import('requests')
+
 default_pkgroot = 'https://eups.lsst.codes/stack/src'
 
+# tag file text keyed by url
+_tag_text = {}
+codetools.register_cache(_tag_text.clear)
+
 
 @public
 def setup_logging(verbosity=0):
@@ -48,12 +54,18 @@ class EupsTag(object):
     def __fetch_tag_file(self):
         # construct url
         tag_url = '/'.join((self.base_url, self.name + '.list'))
+        try:
+            self.__text = _tag_text[tag_url]
+            return
+        except KeyError:
+            pass
+
         debug("fetching: {url}".format(url=tag_url))
 
         r = requests.get(tag_url)
         r.raise_for_status()
 
-        self.__text = r.text
+        self.__text = _tag_text[tag_url] = r.text
 
     def __parse_tag_text(self):
         products = {}
@@ -126,8 +138,10 @@ class EupsTag(object):
         self.__products = products
 
     def __process(self):
-        self.__fetch_tag_file()
-        self.__parse_tag_text()
+        with profiling.phase('eups tag fetch'):
+            self.__fetch_tag_file()
+        with profiling.phase('eups tag parse'):
+            self.__parse_tag_text()
 
     @property
     def products(self):
@@ -0,0 +1,236 @@
+"""Machine readable NDJSON stream of the progress of a command.
+
+When enabled with `configure()` (the `--events` option of the cli commands),
+one JSON object is written per line for each event.  Every event has `ts`
+(seconds since the epoch) and `event` keys:
+
+- `start`: the command has started (`command`, `argv`, `pid`)
+- `phase_start`, `phase_end`: a phase marked by `codekit.profiling.phase()`
+  (`phase`, `wall`, `ok`)
+- `action`: a change made, or which would have been made with `--dry-run`, to
+  a github object (`action`, `repo`, `team`, `dry_run`, ...)
+- `retry`: a failed api request is about to be retried (`verb`, `url`,
+  `reason`, `attempt`, `wait`)
+- `error`: a problem with a single github object (`type`, `message`, `repo`,
+  `org`, `team`, `status`, `data`)
+- `stats`: running totals, such as `api_calls`, written every `interval`
+  seconds so that a stuck command can be told apart from a quiet one
+- `end`: the command has exited (`status`, `wall`, and the running totals)
+
+Events are written by a background thread, so `emit()` does not wait for any
+i/o.
+"""
+
+from codekit.codetools import debug, public
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# the active _Writer, if events are enabled
+_writer = None
+
+# (name, func) of running totals added to stats and end events
+_stats = []
+
+# marks the end of the queue of events
+_STOP = object()
+
+
+@public
+def add_arguments(parser):
+    """Add the event stream options to an `argparse.ArgumentParser`."""
+    parser.add_argument(
+        '--events',
+        metavar='PATH',
+        help='Write a NDJSON stream of progress events to PATH, or to file'
+             ' descriptor N if PATH is fd:N.')
+    parser.add_argument(
+        '--events-interval',
+        default=10,
+        type=float,
+        metavar='SECONDS',
+        help='Seconds between stats events. (default: %(default)s)')
+
+
+@public
+def register_stats(name, func):
+    """Add the value returned by `func` as `name` to `stats` and `end`
+    events."""
+    _stats.append((name, func))
+
+
+def _open(target):
+    if target.startswith('fd:'):
+        return os.fdopen(int(target[3:]), 'w', closefd=False)
+    return open(target, 'w')
+
+
+class _Writer(object):
+    def __init__(self, stream, interval):
+        self.stream = stream
+        self.interval = interval
+        self.errors = set()
+        self.start = time.monotonic()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='events',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def put(self, record):
+        self._queue.put(record)
+
+    def stats(self):
+        return {name: func() for name, func in _stats}
+
+    def _write(self, record):
+        self.stream.write(json.dumps(record, default=str) + '\n')
+
+    def _run(self):
+        next_stats = time.monotonic() + self.interval
+        while True:
+            try:
+                record = self._queue.get(
+                    timeout=max(next_stats - time.monotonic(), 0),
+                )
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                break
+
+            records = [] if record is None else [record]
+            # stats are written every interval, however busy the stream is
+            now = time.monotonic()
+            if now >= next_stats:
+                records.append(dict(ts=time.time(), event='stats',
+                                    **self.stats()))
+                next_stats = now + self.interval
+
+            try:
+                for r in records:
+                    self._write(r)
+                # flush once the backlog has been written
+                if self._queue.empty():
+                    self.stream.flush()
+            except (OSError, ValueError) as e:
+                debug("unable to write event: %s", e)
+
+        self.stream.flush()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.stream.close()
+
+
+@public
+def configure(args, argv=None):
+    """Start writing events if `--events` is set in `args`.
+
+    An event stream which has already been started is kept, so that all of
+    the steps of a chained `codekit` command write to the same stream.
+    """
+    global _writer
+
+    target = getattr(args, 'events', None)
+    if not target or _writer:
+        return
+
+    _writer = _Writer(_open(target), args.events_interval)
+    emit(
+        'start',
+        command=os.path.basename(sys.argv[0]),
+        argv=sys.argv[1:] if argv is None else argv,
+        pid=os.getpid(),
+    )
+
+
+@public
+def enabled():
+    return _writer is not None
+
+
+@public
+def emit(event, **fields):
+    """Queue an event, if events are enabled."""
+    writer = _writer
+    if writer is None:
+        return
+
+    record = {'ts': time.time(), 'event': event}
+    record.update(fields)
+    writer.put(record)
+
+
+def error_fields(e):
+    """Describe an exception, with the github object and api error bundled
+    into a `codekit.pygithub.Caught*Error`, if any."""
+    fields = {'type': type(e).__name__, 'message': str(e)}
+
+    for attr, key in (('repo', 'full_name'), ('org', 'login'),
+                      ('team', 'slug')):
+        obj = getattr(e, attr, None)
+        if obj is not None:
+            fields[attr] = getattr(obj, key, str(obj))
+
+    caught = getattr(e, 'caught', None)
+    if caught is not None:
+        fields['status'] = getattr(caught, 'status', None)
+        fields['data'] = getattr(caught, 'data', None)
+
+    return fields
+
+
+@public
+def error(e):
+    """Emit an `error` event for an exception, or for each of the errors of a
+    `codekit.codetools.DogpileError`.  An exception is only reported once."""
+    writer = _writer
+    if writer is None:
+        return
+
+    for err in getattr(e, 'errors', [e]):
+        if id(err) in writer.errors:
+            continue
+        writer.errors.add(id(err))
+        emit('error', **error_fields(err))
+
+
+@public
+def close(exc=None):
+    """Emit the `end` event and wait for all events to be written.
+
+    Parameters
+    ----------
+    exc: BaseException, optional
+        The exception, if any, with which the command is exiting.
+    """
+    global _writer
+
+    writer = _writer
+    if writer is None:
+        return
+
+    if exc is None:
+        status = 0
+    elif isinstance(exc, SystemExit):
+        status = exc.code if isinstance(exc.code, int) else int(bool(exc.code))
+    else:
+        error(exc)
+        status = 1
+
+    emit(
+        'end',
+        status=status,
+        wall=time.monotonic() - writer.start,
+        errors=len(writer.errors),
+        **writer.stats()
+    )
+    _writer = None
+    writer.close()
@@ -0,0 +1,217 @@
+"""Per-phase timing and optional cProfile / tracemalloc profiling of codekit
+commands.
+
+Code marks the phases of a command with `phase()`, which costs next to
+nothing unless profiling has been enabled by `configure()` (the `--profile`
+options of the cli commands).  A breakdown is printed by `report()`.
+"""
+
+from codekit.codetools import debug, public
+from codekit import events
+import collections
+import contextlib
+import sys
+import threading
+import time
+
+# the active Profile, if profiling is enabled
+_profile = None
+
+# per thread stack of the names of the phases being timed
+_local = threading.local()
+
+# cpu time of the current thread, or of the process on python < 3.7
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+@public
+def add_arguments(parser):
+    """Add the profiling options to an `argparse.ArgumentParser`."""
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print the wall and cpu time spent in each phase at exit.')
+    parser.add_argument(
+        '--profile-pstats',
+        metavar='FILE',
+        help='Write cProfile statistics of the main thread to FILE, for use'
+             ' with pstats or snakeviz. Implies --profile.')
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='Trace memory allocations and report the peak and the largest'
+             ' allocation sites. Slow. Implies --profile.')
+
+
+@public
+class Profile(object):
+    """Accumulated timing of phases, from when the object is created.
+
+    Parameters
+    ----------
+    pstats_path: str, optional
+        Run `cProfile` on the current thread and write its statistics to this
+        file when stopped.
+
+    memory: bool
+        Trace memory allocations with `tracemalloc`.
+    """
+
+    def __init__(self, pstats_path=None, memory=False):
+        self.pstats_path = pstats_path
+        self.phases = collections.OrderedDict()
+        self.memory = None
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._tracemalloc = memory
+
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+
+        if pstats_path:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self.wall = None
+        self.cpu = None
+
+    def record(self, name, wall, cpu):
+        """Add a timing of phase `name`."""
+        with self._lock:
+            p = self.phases.setdefault(name, [0, 0.0, 0.0])
+            p[0] += 1
+            p[1] += wall
+            p[2] += cpu
+
+    def stop(self):
+        """Stop profiling and write out any cProfile statistics."""
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+
+        if self._profiler:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.pstats_path)
+            debug("wrote cProfile statistics to: %s", self.pstats_path)
+
+        if self._tracemalloc:
+            import tracemalloc
+            _, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:5]
+            tracemalloc.stop()
+            self.memory = (peak, top)
+
+    def report(self, stream):
+        """Write a breakdown of the time spent in each phase to `stream`."""
+        def row(name, count, wall, cpu):
+            return "  {n:<32} {c:>6} {w:>9.3f}s {u:>9.3f}s {p:>5.1f}%".format(
+                n=name,
+                c=count,
+                w=wall,
+                u=cpu,
+                p=100 * wall / self.wall if self.wall else 0,
+            )
+
+        lines = [
+            "profile:",
+            "  {n:<32} {c:>6} {w:>10} {u:>10} {p:>6}".format(
+                n='phase',
+                c='count',
+                w='wall',
+                u='cpu',
+                p='%wall',
+            ),
+        ]
+        for name, (count, wall, cpu) in self.phases.items():
+            lines.append(row(name, count, wall, cpu))
+        lines.append(row('total', 1, self.wall, self.cpu))
+        lines.append("  (phases run by concurrent threads may add up to"
+                     " more than the total)")
+
+        if self.memory:
+            peak, top = self.memory
+            lines.append("  peak traced memory: {m:.1f} MiB".format(
+                m=peak / 2**20,
+            ))
+            for s in top:
+                lines.append("    {s}".format(s=s))
+
+        print("\n".join(lines), file=stream)
+
+
+@public
+def configure(args):
+    """Start profiling if any of the options added by `add_arguments()` are
+    set in `args`.
+
+    Profiling which has already been started is left running, so that the
+    steps of a chained `codekit` command are profiled together.
+    """
+    global _profile
+
+    pstats_path = getattr(args, 'profile_pstats', None)
+    memory = getattr(args, 'profile_memory', False)
+    if not (getattr(args, 'profile', False) or pstats_path or memory):
+        return
+    if _profile:
+        return
+
+    _profile = Profile(pstats_path=pstats_path, memory=memory)
+
+
+@public
+def enabled():
+    return _profile is not None
+
+
+@public
+@contextlib.contextmanager
+def phase(name):
+    """Time a named phase of a command, when profiling is enabled, and emit
+    `phase_start` and `phase_end` events, when `codekit.events` are enabled.
+
+    Phases may be nested, in which case the name of the inner phase is
+    prefixed with the names of the enclosing phases (in the same thread).
+    May also be used as a function decorator.
+    """
+    profile = _profile
+    if profile is None and not events.enabled():
+        yield
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    full_name = '/'.join(stack)
+
+    events.emit('phase_start', phase=full_name)
+    ok = False
+    wall = time.perf_counter()
+    cpu = _thread_time()
+    try:
+        yield
+        ok = True
+    finally:
+        wall = time.perf_counter() - wall
+        if profile:
+            profile.record(full_name, wall, _thread_time() - cpu)
+        events.emit('phase_end', phase=full_name, wall=wall, ok=ok)
+        stack.pop()
+
+
+@public
+def report(stream=None):
+    """Stop profiling, if enabled, and print a breakdown of the time spent in
+    each phase."""
+    global _profile
+
+    if _profile is None:
+        return
+
+    profile, _profile = _profile, None
+    profile.stop()
+    profile.report(stream or sys.stderr)
@@ -1,11 +1,12 @@
 """ progressbar2 related utils"""
 
-from codekit.codetools import warn
-from public import public
+from codekit.codetools import warn, public
+import codekit.codetools as codetools
 from time import sleep
-import progressbar
 import functools
 
+progressbar = codetools.lazy_import('progressbar')
+
 
 @public
 def setup_logging(verbosity=0):
@@ -69,6 +70,10 @@ def wait_for_user_panic_once(**kwargs):
     wait_for_user_panic(**kwargs)
 
 
+# every command run by a long lived process should get its own countdown
+codetools.register_cache(wait_for_user_panic_once.cache_clear, per_run=True)
+
+
 @public
 def eta_bar(msg, max_value):
     """Display an adaptive ETA / countdown bar with a message.
@@ -2,16 +2,36 @@
 pygithub based help functions for interacting with the github api.
 """
 
-from codekit.codetools import debug
-from github import Github
-from public import public
+from codekit.codetools import debug, public
+from codekit import events, profiling
 import codekit.codetools as codetools
 import collections
-import github
+import contextlib
+import copy
+import functools
+import hashlib
 import itertools
+import json
+import os
+import queue
+import random
+import re
 import textwrap
+import threading
+import time
 
-github.MainClass.DEFAULT_TIMEOUT = 15  # timeouts creating teams w/ many repos
+github = codetools.lazy_import('github')
+requests = codetools.lazy_import('requests')
+
+# http timeout of logins, which is the budget of writes (the pygithub default
+# of 10s results in timeouts creating teams w/ many repos).  Reads are given
+# up on sooner.
+SLOW_TIMEOUT = 60
+
+# timeout of reads, until enough have been made to an endpoint to derive its
+# timeout from their latency, and the longest timeout of reads.  See
+# `LatencyTracker`.
+DEFAULT_TIMEOUT = 15
 
 
 @public
@@ -120,6 +140,29 @@ class RepositoryTeamMembershipError(Exception):
         ))
 
 
+# the head of a branch, as resolved by get_default_heads()
+BranchHead = collections.namedtuple('BranchHead', ['ref', 'sha', 'type'])
+
+# the teams of an org keyed by name and by slug, as built by get_team_index()
+TeamIndex = collections.namedtuple('TeamIndex', ['by_name', 'by_slug'])
+
+# github.MainClass.Github objects keyed by token
+_logins = {}
+
+# api requests made by logins, keyed by http verb
+_api_calls = collections.Counter()
+_api_calls_lock = threading.Lock()
+
+# api requests retried by logins, keyed by the reason for the retry
+_retries = collections.Counter()
+_retries_lock = threading.Lock()
+
+# BranchHead(s) keyed by repo full_name -- default branch heads are not
+# expected to change during a single run, but may between daemon jobs.
+_default_heads = {}
+codetools.register_cache(_default_heads.clear, per_run=True)
+
+
 class TargetTag(collections.UserDict):
     """Represents an abstract git tag that is independent of a git repository.
     This is an a rough analog of `pygithub`s `github.GitTag.GitTag` class but
@@ -171,15 +214,155 @@ def login_github(token_path=None, token=None):
     Returns
     -------
     gh : :class:`github.GitHub` instance
-        A GitHub login instance.
+        A GitHub login instance. The same instance is returned for each login
+        with the same token in a process, so that commands run in the same
+        process share a single http session.
     """
 
     token = codetools.github_token(token_path=token_path, token=token)
-    g = Github(token)
+
+    g = _logins.get(token)
+    if g is None:
+        g = github.Github(token, timeout=SLOW_TIMEOUT)
+        # each attempt of a retried or hedged request is counted
+        _count_requests(_get_requester(g))
+        _time_requests(_get_requester(g))
+        _retry_requests(_get_requester(g))
+        _memoize_requests(_get_requester(g))
+        _logins[token] = g
+
     debug_ratelimit(g)
     return g
 
 
+def _count_requests(requester):
+    """Count the api requests made with a `github.Requester.Requester`.
+
+    The request methods of the instance are wrapped, rather than those of the
+    class, so that only requests made by codekit logins are counted.  All
+    pygithub objects created from a login share its requester.
+    """
+    def counted(method):
+        @functools.wraps(method)
+        def wrapper(verb, *args, **kwargs):
+            with _api_calls_lock:
+                _api_calls[verb] += 1
+            return method(verb, *args, **kwargs)
+        return wrapper
+
+    for name in (
+        'requestJsonAndCheck',
+        'requestBlobAndCheck',
+        'requestMultipartAndCheck',
+    ):
+        setattr(requester, name, counted(getattr(requester, name)))
+
+
+@public
+def get_api_calls():
+    """Return the number of api requests made by `login_github()` logins.
+
+    Returns
+    -------
+    api_calls: dict(str, int)
+        number of requests keyed by http verb
+    """
+    with _api_calls_lock:
+        return dict(_api_calls)
+
+
+events.register_stats('api_calls', get_api_calls)
+
+
+@public
+def get_logins():
+    """Return the GitHub login instances created by `login_github()`.
+
+    Returns
+    -------
+    logins: list(github.MainClass.Github)
+    """
+    return list(_logins.values())
+
+
+def _get_requester(obj):
+    """Return the `github.Requester.Requester` of a github object.
+
+    pygithub does not provide a public interface to its requester, which is
+    needed to make api requests for which there are no pygithub methods.
+    """
+    if isinstance(obj, github.MainClass.Github):
+        return obj._Github__requester
+    return obj._requester
+
+
+@public
+def get_repo_lazy(g, full_name):
+    """Return a `github.Repository.Repository` object without making any api
+    requests.  Any attributes other than `full_name`, `name` and `url` will be
+    fetched upon first use.
+
+    Parameters
+    ----------
+    g: github.MainClass.Github
+        github object
+
+    full_name: str
+        `<owner>/<name>` of the repo
+
+    Returns
+    -------
+    repo: :class:`github.Repository` instance
+    """
+    assert isinstance(g, github.MainClass.Github), type(g)
+
+    return github.Repository.Repository(
+        _get_requester(g),
+        {},
+        {
+            'url': "/repos/{r}".format(r=full_name),
+            'full_name': full_name,
+            'name': full_name.split('/')[-1],
+        },
+        completed=False,
+    )
+
+
+@public
+def get_matching_tag_refs(repo, prefix=''):
+    """Find all tags in a github Repository whose name starts with `prefix`
+    with a single (paginated) request.
+
+    Parameters
+    ----------
+    repo: :class:`github.Repository` instance
+
+    prefix: str, optional
+        Start of the tag name(s) (not a fully qualified ref).
+
+    Returns
+    -------
+    refs : dict of :class:`github.GitRef` instances keyed by tag name
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api
+    """
+    url = "{repo}/git/matching-refs/tags/{prefix}".format(
+        repo=repo.url,
+        prefix=prefix,
+    )
+    refs = github.PaginatedList.PaginatedList(
+        github.GitRef.GitRef,
+        repo._requester,
+        url,
+        None,
+    )
+
+    return {re.sub(r'^refs/tags/', '', r.ref): r for r in refs}
+
+
 @public
 def find_tag_by_name(repo, tag_name, safe=True):
     """Find tag by name in a github Repository
@@ -263,22 +446,13 @@ def get_teams_by_name(org, team_names):
     """
     assert isinstance(org, github.Organization.Organization), type(org)
 
-    try:
-        org_teams = list(org.get_teams())
-    except github.RateLimitExceededException:
-        raise
-    except github.GithubException as e:
-        msg = 'error getting teams'
-        raise CaughtOrganizationError(org, e, msg) from None
+    index = get_team_index(org)
 
     found_teams = []
     for name in team_names:
-        debug("looking for team: {o}/'{t}'".format(
-            o=org.login,
-            t=name
-        ))
+        debug("looking for team: %s/'%s'", org.login, name)
 
-        t = next((t for t in org_teams if t.name == name), None)
+        t = index.by_name.get(name)
         if t:
             debug('  found')
             found_teams.append(t)
@@ -288,6 +462,60 @@ def get_teams_by_name(org, team_names):
     return found_teams
 
 
+@public
+@profiling.phase('team repos index')
+def get_team_repos_index(org, team_names=None):
+    """Index the teams of an org and the repos which belong to each team.
+
+    This requires one paginated request for the list of teams plus one per
+    team, instead of one request per repo to find its teams.
+
+    Parameters
+    ----------
+    org: github.Organization.Organization
+        org to index
+
+    team_names: list(str), optional
+        only index these teams (all teams are indexed by default)
+
+    Returns
+    -------
+    teams: dict(str, github.Team.Team)
+        teams keyed by name
+
+    team_repos: dict(str, dict(str, github.Repository.Repository))
+        member repos of each team, keyed by team name and then repo name
+
+    Raises
+    ------
+    CaughtOrganizationError
+    CaughtTeamError
+    """
+    assert isinstance(org, github.Organization.Organization), type(org)
+
+    teams = get_team_index(org).by_name
+
+    if team_names is not None:
+        teams = {n: t for n, t in teams.items() if n in team_names}
+
+    team_repos = {}
+    for name, t in teams.items():
+        try:
+            team_repos[name] = {r.name: r for r in t.get_repos()}
+        except github.RateLimitExceededException:
+            raise
+        except github.GithubException as e:
+            raise CaughtTeamError(t, e) from None
+
+        debug("  {o}/'{t}' has {n} repo(s)".format(
+            o=org.login,
+            t=name,
+            n=len(team_repos[name]),
+        ))
+
+    return teams, team_repos
+
+
 @public
 def debug_ratelimit(g):
     """Log debug of github ratelimit information from last API call
@@ -299,87 +527,1604 @@ def debug_ratelimit(g):
     """
     assert isinstance(g, github.MainClass.Github), type(g)
 
-    debug("github ratelimit: {rl}".format(rl=g.rate_limiting))
+    # .rate_limiting makes an api request if no request has been made yet
+    debug(lambda: "github ratelimit: {rl}".format(rl=g.rate_limiting))
 
 
 @public
-def check_repo_teams(repo, allow_teams, deny_teams, team_names=None):
-    """Check if repo teams match allow/deny lists
+class KeyedCache(object):
+    """A thread-safe, size-bounded LRU cache with optional expiry and an
+    optional on-disk tier.
+
+    pygithub objects are unhashable, so entries are keyed by a string, such as
+    a repo's `full_name`.
 
     Parameters
     ----------
-    repo: github.Repository.Repository
-        repo to check for membership
+    maxsize: int
+        Maximum number of entries held in memory. The least recently used
+        entry is evicted when the limit is reached.
 
-    allow_teams: list(str)
-        list of team names that repo MUST belong to at least one of.
+    ttl: float, optional
+        Number of seconds after which an entry is considered stale.  Entries
+        never expire if `None`.
+
+    path: str, optional
+        JSON file backing the cache.  Entries are loaded from it on first use
+        and written back by `save()`.  Values must be JSON serializable.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, path=None):
+        assert maxsize > 0, maxsize
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = path is None
+
+    def _expired(self, stamp):
+        return self.ttl is not None and time.time() - stamp > self.ttl
+
+    def _load(self):
+        self._loaded = True
+
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            debug("ignoring unreadable cache {path}: {e}".format(
+                path=self.path,
+                e=e,
+            ))
+            return
+
+        debug("loaded {n} cache entries from {path}".format(
+            n=len(entries),
+            path=self.path,
+        ))
+        for key, (stamp, value) in entries.items():
+            if not self._expired(stamp):
+                self._set(key, value, stamp)
+
+    def _set(self, key, value, stamp):
+        self._entries[key] = (stamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        """Return the cached value for `key` or `default` if it is absent or
+        has expired."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            try:
+                stamp, value = self._entries[key]
+            except KeyError:
+                return default
+
+            if self._expired(stamp):
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Cache `value` under `key`."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            self._set(key, value, time.time())
+
+    def invalidate(self, key=None):
+        """Drop the entry for `key`, or all entries if `key` is `None`."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def save(self):
+        """Write the unexpired entries to the on-disk tier, if any."""
+        if self.path is None:
+            return
+
+        with self._lock:
+            entries = {k: v for k, v in self._entries.items()
+                       if not self._expired(v[0])}
+
+        # write + rename so a partial write never clobbers a good cache
+        tmp = "{path}.{pid}".format(path=self.path, pid=os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+        debug("saved {n} cache entries to {path}".format(
+            n=len(entries),
+            path=self.path,
+        ))
+
+    def __len__(self):
+        return len(self._entries)
 
-    deny_teams: list(str)
-        list of team that repo MUST NOT be a member of.
 
+# team names keyed by repo full_name
+_repo_team_names = KeyedCache(maxsize=4096)
+codetools.register_cache(lambda: _repo_team_names.invalidate())
+
+
+@public
+def configure_repo_teams_cache(maxsize=4096, ttl=None, path=None):
+    """Replace the cache used by `get_repo_team_names()`.
+
+    The current cache, and its contents, is kept if it is already configured
+    with the same parameters.
+
+    Parameters
+    ----------
+    See `KeyedCache`.
+
+    Returns
+    -------
+    cache: KeyedCache
+    """
+    global _repo_team_names
+    c = _repo_team_names
+    if (c.maxsize, c.ttl, c.path) != (maxsize, ttl, path):
+        _repo_team_names = KeyedCache(maxsize=maxsize, ttl=ttl, path=path)
+
+    return _repo_team_names
+
+
+@public
+def add_team_cache_arguments(parser):
+    """Add the options of the repo teams cache to an
+    `argparse.ArgumentParser`."""
+    parser.add_argument(
+        '--team-cache-ttl',
+        type=float,
+        metavar='SECONDS',
+        help='Persist repo team memberships under the codekit cache dir and'
+             ' reuse them in later runs for up to SECONDS.')
+
+
+@public
+def configure_team_cache(args):
+    """Configure the repo teams cache from the options added by
+    `add_team_cache_arguments()`.
+
+    Returns
+    -------
+    cache: KeyedCache
+    """
+    ttl = args.team_cache_ttl
+    return configure_repo_teams_cache(
+        ttl=ttl,
+        path=os.path.join(codetools.cache_dir(), 'repo-teams.json')
+        if ttl else None,
+    )
+
+
+@public
+def get_repo_team_names(repo):
+    """Return the names of the teams which a repo is a member of.
+
+    Results are cached; see `configure_repo_teams_cache()`.  The cached teams
+    of a repo are forgotten when a `login_github()` login changes them.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+
+    Returns
+    -------
     team_names: list(str)
-        list of the team name which the repo is a member of (optional).
-        Providing this list saves retrieving the list of teams from the github
-        API.
 
     Raises
     ------
-    RepositoryTeamMembershipError
-        Upon permission error
+    CaughtRepositoryError
     """
     assert isinstance(repo, github.Repository.Repository), type(repo)
 
-    # fetch team names if a list was not passed
-    if not team_names:
-        try:
-            team_names = [t.name for t in repo.get_teams()]
-        except github.RateLimitExceededException:
-            raise
-        except github.GithubException as e:
-            msg = 'error getting teams'
-            raise CaughtRepositoryError(repo, e, msg) from None
+    cache = _repo_team_names
+    team_names = cache.get(repo.full_name)
+    if team_names is not None:
+        return team_names
 
-    if not any(x in team_names for x in allow_teams)\
-       or any(x in team_names for x in deny_teams):
-        raise RepositoryTeamMembershipError(
-            repo,
-            team_names,
-            allow_teams=allow_teams,
-            deny_teams=deny_teams
-        )
+    try:
+        team_names = [t.name for t in repo.get_teams()]
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = 'error getting teams'
+        raise CaughtRepositoryError(repo, e, msg) from None
+
+    cache.put(repo.full_name, team_names)
+
+    return team_names
+
+
+# TeamIndex(es) keyed by org login
+_team_indexes = KeyedCache(maxsize=64, ttl=300)
+codetools.register_cache(lambda: _team_indexes.invalidate())
 
 
 @public
-def get_default_ref(repo):
-    """Return a `github.GitRef` object for the HEAD of the default branch.
+def configure_team_index_cache(maxsize=64, ttl=300):
+    """Replace the cache used by `get_team_index()`.
+
+    The current cache, and its contents, is kept if it is already configured
+    with the same parameters.
 
     Parameters
     ----------
-    repo: github.Repository.Repository
-        repo to get default branch head ref from
+    See `KeyedCache`.
 
     Returns
     -------
-    head : :class:`github.GitRef` instance
+    cache: KeyedCache
+    """
+    global _team_indexes
+    c = _team_indexes
+    if (c.maxsize, c.ttl) != (maxsize, ttl):
+        _team_indexes = KeyedCache(maxsize=maxsize, ttl=ttl)
+
+    return _team_indexes
+
+
+@public
+def get_team_index(org, refresh=False):
+    """Index the teams of an org by name and by slug.
+
+    The team list is only paged through once per org, until the index
+    expires (see `configure_team_index_cache()`) or teams are created, changed
+    or deleted by a `login_github()` login.
+
+    Parameters
+    ----------
+    org: github.Organization.Organization
+        org to index
+
+    refresh: bool
+        Rebuild the index even if it is cached.
+
+    Returns
+    -------
+    index: TeamIndex
+        `by_name` and `by_slug` dicts of github.Team.Team objects
 
     Raises
     ------
-    github.RateLimitExceededException
-    codekit.pygithub.CaughtRepositoryError
+    CaughtOrganizationError
     """
-    assert isinstance(repo, github.Repository.Repository), type(repo)
+    assert isinstance(org, github.Organization.Organization), type(org)
 
-    # XXX this probably should be resolved via repos.yaml
-    default_branch = repo.default_branch
-    default_branch_ref = "heads/{ref}".format(ref=default_branch)
+    cache = _team_indexes
+    index = None if refresh else cache.get(org.login)
+    if index is not None:
+        return index
 
-    # if accessing the default branch fails something is seriously wrong...
     try:
-        head = repo.get_git_ref(default_branch_ref)
+        teams = list(org.get_teams())
     except github.RateLimitExceededException:
         raise
     except github.GithubException as e:
-        msg = "error getting ref: {ref}".format(ref=default_branch_ref)
-        raise CaughtRepositoryError(repo, e, msg) from None
+        msg = 'error getting teams'
+        raise CaughtOrganizationError(org, e, msg) from None
 
-    return head
+    index = TeamIndex(
+        by_name={t.name: t for t in teams},
+        by_slug={t.slug: t for t in teams},
+    )
+    debug("indexed %d team(s) of %s", len(teams), org.login)
+    cache.put(org.login, index)
+
+    return index
+
+
+@public
+def get_team_by_slug(org, slug):
+    """Find a team in org by its slug.
+
+    The team is looked up in the org's team index, if one is cached, otherwise
+    by a single api request rather than by listing all teams.
+
+    Parameters
+    ----------
+    org: github.Organization.Organization
+        org to search for the team
+
+    slug: str
+        slug of the team, eg. `data-management` for team "Data Management"
+
+    Returns
+    -------
+    team: github.Team.Team or `None` if not found
+
+    Raises
+    ------
+    CaughtOrganizationError
+    """
+    assert isinstance(org, github.Organization.Organization), type(org)
+
+    index = _team_indexes.get(org.login)
+    if index is not None:
+        return index.by_slug.get(slug)
+
+    # Organization.get_team_by_slug() is not available in all pygithub
+    # versions
+    requester = _get_requester(org)
+    try:
+        headers, data = requester.requestJsonAndCheck(
+            'GET',
+            "/orgs/{o}/teams/{s}".format(o=org.login, s=slug),
+        )
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        if e.status == 404:
+            return None
+        msg = "error getting team: {s}".format(s=slug)
+        raise CaughtOrganizationError(org, e, msg) from None
+
+    return github.Team.Team(requester, headers, data, completed=True)
+
+
+@public
+def get_rate_limits(g):
+    """Return the current rate limit of every github API resource bucket.
+
+    Requests to `/rate_limit` do not count against any rate limit.
+
+    Parameters
+    ----------
+    g: github.MainClass.Github
+
+    Returns
+    -------
+    limits: dict(str, dict)
+        `limit`, `remaining` and `reset` (epoch seconds) keyed by resource
+        name (`core`, `graphql`, `search`, ...)
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api
+    """
+    assert isinstance(g, github.MainClass.Github), type(g)
+
+    _, data = _get_requester(g).requestJsonAndCheck('GET', '/rate_limit')
+
+    return {
+        name: {
+            'limit': r['limit'],
+            'remaining': r['remaining'],
+            'reset': r['reset'],
+        } for name, r in data['resources'].items()
+    }
+
+
+@public
+def check_repo_teams(repo, allow_teams, deny_teams, team_names=None):
+    """Check if repo teams match allow/deny lists
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+        repo to check for membership
+
+    allow_teams: list(str)
+        list of team names that repo MUST belong to at least one of.
+
+    deny_teams: list(str)
+        list of team that repo MUST NOT be a member of.
+
+    team_names: list(str)
+        list of the team name which the repo is a member of (optional).
+        Providing this list saves retrieving the list of teams from the github
+        API.
+
+    Raises
+    ------
+    RepositoryTeamMembershipError
+        Upon permission error
+    """
+    assert isinstance(repo, github.Repository.Repository), type(repo)
+
+    # fetch team names if a list was not passed
+    if not team_names:
+        team_names = get_repo_team_names(repo)
+
+    if not any(x in team_names for x in allow_teams)\
+       or any(x in team_names for x in deny_teams):
+        raise RepositoryTeamMembershipError(
+            repo,
+            team_names,
+            allow_teams=allow_teams,
+            deny_teams=deny_teams
+        )
+
+
+@public
+def get_default_ref(repo):
+    """Return a `github.GitRef` object for the HEAD of the default branch.
+
+    Parameters
+    ----------
+    repo: github.Repository.Repository
+        repo to get default branch head ref from
+
+    Returns
+    -------
+    head : :class:`github.GitRef` instance
+
+    Raises
+    ------
+    github.RateLimitExceededException
+    codekit.pygithub.CaughtRepositoryError
+    """
+    assert isinstance(repo, github.Repository.Repository), type(repo)
+
+    # XXX this probably should be resolved via repos.yaml
+    default_branch = repo.default_branch
+    default_branch_ref = "heads/{ref}".format(ref=default_branch)
+
+    # if accessing the default branch fails something is seriously wrong...
+    try:
+        head = repo.get_git_ref(default_branch_ref)
+    except github.RateLimitExceededException:
+        raise
+    except github.GithubException as e:
+        msg = "error getting ref: {ref}".format(ref=default_branch_ref)
+        raise CaughtRepositoryError(repo, e, msg) from None
+
+    return head
+
+
+@public
+def is_transient_error(e):
+    """Return True if a github API error is expected to go away on retry.
+
+    Server side (5xx) errors and the "secondary" (abuse) rate limit, which
+    github imposes on bursts of concurrent or content creating requests, are
+    considered transient. Exhaustion of the hourly (primary) rate limit is
+    not.
+    """
+    assert isinstance(e, github.GithubException), type(e)
+
+    if e.status is not None and e.status >= 500:
+        return True
+
+    return is_secondary_rate_limit(e)
+
+
+@public
+def is_secondary_rate_limit(e):
+    """Return True if a github API error is the "secondary" (abuse) rate
+    limit."""
+    assert isinstance(e, github.GithubException), type(e)
+
+    if e.status not in (403, 429):
+        return False
+
+    msg = str(e.data).lower()
+    return 'secondary rate limit' in msg or 'abuse' in msg
+
+
+@public
+def throttle_delay(e, default=1):
+    """Return the number of seconds github has asked the client to back off
+    for, if `e` is a secondary rate limit error, otherwise `None`.
+
+    Parameters
+    ----------
+    e: Exception
+        A `github.GithubException`, or a `Caught*Error` wrapping one.
+
+    default: float
+        Delay to use when github has not sent a Retry-After header.
+    """
+    if isinstance(e, (
+        CaughtRepositoryError,
+        CaughtTeamError,
+        CaughtOrganizationError,
+    )):
+        e = e.caught
+
+    if not isinstance(e, github.GithubException):
+        return None
+
+    if not is_secondary_rate_limit(e):
+        return None
+
+    return _retry_after(e) or default
+
+
+def _retry_after(e):
+    """Return the delay requested by a Retry-After header, if any"""
+    headers = getattr(e, 'headers', None) or {}
+    value = headers.get('retry-after', headers.get('Retry-After'))
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@public
+class RetryPolicy(object):
+    """How many times, and how long after, failed github api requests are
+    retried.
+
+    The delay between attempts is doubled after each failure, starting at
+    `backoff` seconds, unless github has requested a specific delay via a
+    Retry-After header.  With `jitter`, a random delay of between half and all
+    of that is used, so that concurrent workers which failed together do not
+    all retry together.
+
+    Parameters
+    ----------
+    retries: int
+        Maximum number of retries.
+
+    backoff: float
+        Initial number of seconds to wait between attempts.
+
+    max_backoff: float
+        Maximum number of seconds to wait between attempts.
+
+    jitter: bool
+        Randomize the delay between attempts.
+    """
+
+    def __init__(self, retries=5, backoff=1, max_backoff=60, jitter=True):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, attempt, e=None):
+        """Return the number of seconds to wait after failed attempt number
+        `attempt` (counting from 1) with error `e`."""
+        requested = _retry_after(e)
+        if requested is not None:
+            return requested
+
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        return delay
+
+
+# the RetryPolicy of requests made by login_github() logins
+_retry_policy = RetryPolicy()
+
+
+@public
+def configure_retries(**kwargs):
+    """Replace the `RetryPolicy` of the api requests made by all logins.
+
+    Parameters
+    ----------
+    **kwargs
+        Parameters of `RetryPolicy`.
+    """
+    global _retry_policy
+    _retry_policy = RetryPolicy(**kwargs)
+
+
+# per thread state of _retry_requests()
+_retry_local = threading.local()
+
+
+@public
+@contextlib.contextmanager
+def caller_handles_throttling():
+    """Do not retry requests, made by the current thread, which are rejected
+    by the secondary rate limit.  The error is raised instead, so that the
+    caller may back off as a whole, for example by lowering the concurrency
+    of `codekit.concurrency.map_adaptive()`.
+
+    Other failed requests are still retried.
+    """
+    prev = getattr(_retry_local, 'caller_throttles', False)
+    _retry_local.caller_throttles = True
+    try:
+        yield
+    finally:
+        _retry_local.caller_throttles = prev
+
+
+def _retry_reason(e):
+    """Return why a failed api request may be retried, or `None` if it may
+    not."""
+    if isinstance(e, github.GithubException):
+        if is_secondary_rate_limit(e):
+            return 'secondary rate limit'
+        if e.status is not None and e.status >= 500:
+            return str(e.status)
+        return None
+
+    if isinstance(e, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )):
+        return type(e).__name__
+
+    return None
+
+
+def _replay_safe(verb, url, body):
+    """Return True if a request, which may or may not have been applied by
+    github, can be sent again.
+
+    Reads, and writes which leave the same state however many times they are
+    applied, are safe.  Creating a ref is safe because a replay which finds
+    the ref already exists is checked by `_replayed()`.  Creating a tag object
+    more than once leaves only an unreferenced object behind.
+    """
+    if verb in ('GET', 'HEAD', 'PUT', 'DELETE'):
+        return True
+
+    if verb == 'PATCH':
+        return '/git/refs/' in url
+
+    if verb == 'POST':
+        if url.endswith('/graphql'):
+            query = (body or {}).get('query', '')
+            return not query.lstrip().startswith('mutation')
+        return url.endswith('/git/refs') or url.endswith('/git/tags')
+
+    return False
+
+
+def _replayed(requester, verb, url, body, e):
+    """Return the result of a request which failed, when replayed, because
+    the previous attempt had been applied after all, otherwise `None`."""
+    if not isinstance(e, github.GithubException):
+        return None
+
+    if verb == 'DELETE' and e.status in (404, 422):
+        return {}, None
+
+    if (
+        verb == 'POST' and url.endswith('/git/refs') and e.status == 422 and
+        'already exists' in str(e.data)
+    ):
+        headers, data = requester.requestJsonAndCheck(
+            'GET',
+            "{url}/{ref}".format(url=url, ref=body['ref'][len('refs/'):]),
+        )
+        if data.get('object', {}).get('sha') == body['sha']:
+            return headers, data
+
+    return None
+
+
+def _retry_requests(requester):
+    """Retry the failed api requests of a `github.Requester.Requester`,
+    according to the current `RetryPolicy`.
+
+    Requests are retried if github rejected them without acting upon them
+    (the secondary rate limit) or, if it is safe to send them again, if they
+    failed in a way which leaves it unknown whether they were acted upon (5xx
+    errors, timeouts and dropped connections).  An error which has been
+    retried is marked so that `with_retries()` does not retry it again.
+    Secondary rate limits are left to the caller within
+    `caller_handles_throttling()`.
+    """
+    request = requester.requestJsonAndCheck
+
+    @functools.wraps(request)
+    def wrapper(verb, url, *args, **kwargs):
+        body = kwargs.get('input', args[2] if len(args) > 2 else None)
+        policy = _retry_policy
+        ambiguous = False
+
+        for attempt in itertools.count(1):
+            try:
+                return request(verb, url, *args, **kwargs)
+            except (github.GithubException, requests.RequestException) as e:
+                if ambiguous:
+                    result = _replayed(requester, verb, url, body, e)
+                    if result is not None:
+                        debug("%s %s was applied by an earlier attempt",
+                              verb, url)
+                        return result
+
+                reason = _retry_reason(e)
+                if reason is None:
+                    raise
+                if reason == 'secondary rate limit':
+                    if getattr(_retry_local, 'caller_throttles', False):
+                        raise
+                else:
+                    if not _replay_safe(verb, url, body):
+                        raise
+                    ambiguous = True
+
+                e._codekit_retried = True
+                if attempt > policy.retries:
+                    raise
+
+                wait = policy.delay(attempt, e)
+                with _retries_lock:
+                    _retries[reason] += 1
+                debug("%s %s failed (%s, attempt %d of %d), retrying in"
+                      " %.1fs", verb, url, reason, attempt,
+                      policy.retries + 1, wait)
+                events.emit(
+                    'retry',
+                    verb=verb,
+                    url=url,
+                    reason=reason,
+                    attempt=attempt,
+                    wait=wait,
+                )
+                time.sleep(wait)
+
+    requester.requestJsonAndCheck = wrapper
+
+
+@public
+def get_retries():
+    """Return the number of api requests retried by `login_github()` logins.
+
+    Returns
+    -------
+    retries: dict(str, int)
+        number of retries keyed by reason, which is the http status, "secondary
+        rate limit" or the name of the network error
+    """
+    with _retries_lock:
+        return dict(_retries)
+
+
+events.register_stats('retries', get_retries)
+
+
+def _path(url):
+    """Return the path of an api url, without the host or query string."""
+    path = url.split('://', 1)[-1]
+    if not path.startswith('/'):
+        path = '/' + path.partition('/')[2]
+    return path.partition('?')[0]
+
+
+def _endpoint(url):
+    """Return the api endpoint of a url, with the names of github objects
+    replaced by placeholders, eg. `/repos/:owner/:repo/git/refs/:ref`."""
+    path = _path(url)
+    path = re.sub(r'/repos/[^/]+/[^/]+', '/repos/:owner/:repo', path)
+    path = re.sub(r'/(orgs|users|teams)/[^/]+', r'/\1/:name', path)
+    path = re.sub(r'/git/(refs|ref|matching-refs)/.*', r'/git/\1/:ref', path)
+    path = re.sub(r'/[0-9a-f]{40}(?=/|$)', '/:sha', path)
+    return re.sub(r'/[0-9]+(?=/|$)', '/:id', path)
+
+
+def _graphql_operation(body):
+    """Return the name of the operation of a GraphQL request, eg.
+    `DefaultHeads`, or a digest of its query, without literal values, if the
+    operation is anonymous."""
+    query = body.get('query', '') if isinstance(body, dict) else ''
+
+    m = re.match(r'\s*(?:query|mutation)\s+(\w+)', query)
+    if m:
+        return m.group(1)
+
+    shape = re.sub(r'"(?:[^"\\]|\\.)*"', '""', query)
+    shape = ' '.join(shape.split())
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+
+@public
+class LatencyTracker(object):
+    """Latency of recent api requests, per endpoint, from which the timeout
+    and hedging delay of requests are derived.
+
+    Until `min_samples` requests have been made to an endpoint, the timeout of
+    its requests is `max_timeout`.
+
+    Parameters
+    ----------
+    window: int
+        Number of recent latencies kept per endpoint.
+
+    min_samples: int
+        Number of latencies needed to derive a timeout.
+
+    factor: float
+        The timeout is this multiple of the 99th percentile latency.
+
+    min_timeout: float
+        Minimum timeout, in seconds.
+
+    max_timeout: float
+        Maximum timeout, in seconds.
+    """
+
+    def __init__(
+        self,
+        window=200,
+        min_samples=20,
+        factor=3,
+        min_timeout=2,
+        max_timeout=DEFAULT_TIMEOUT,
+    ):
+        assert 0 < min_samples <= window, (min_samples, window)
+
+        self.min_samples = min_samples
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=window)
+        )
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency):
+        """Add the latency, in seconds, of a request to `endpoint`."""
+        with self._lock:
+            self._latencies[endpoint].append(latency)
+
+    def percentile(self, endpoint, q):
+        """Return the `q`th percentile of the recent latencies of `endpoint`,
+        or `None` if there are not yet enough of them."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+
+        if len(latencies) < self.min_samples:
+            return None
+        i = min(int(len(latencies) * q / 100), len(latencies) - 1)
+        return latencies[i]
+
+    def timeout(self, endpoint):
+        """Return the number of seconds to wait for a request to `endpoint`."""
+        p99 = self.percentile(endpoint, 99)
+        if p99 is None:
+            return self.max_timeout
+        return min(max(p99 * self.factor, self.min_timeout), self.max_timeout)
+
+    def hedge_delay(self, endpoint):
+        """Return the number of seconds after which a duplicate of a slow
+        request to `endpoint` may be sent, or `None` if not yet known."""
+        return self.percentile(endpoint, 95)
+
+
+# latency of the requests made by login_github() logins
+_latency = LatencyTracker()
+
+# send duplicates of slow GET requests
+_hedge = bool(os.environ.get('CODEKIT_HEDGE_READS'))
+
+# maximum fraction of GET requests which may be duplicated
+HEDGE_BUDGET = 0.1
+
+# GET requests which could be hedged, duplicates sent, and duplicates which
+# answered first
+_hedges = collections.Counter()
+_hedges_lock = threading.Lock()
+
+
+@public
+def configure_timeouts(hedge=None, **kwargs):
+    """Replace the `LatencyTracker` of the api requests made by all logins.
+
+    Parameters
+    ----------
+    hedge: bool, optional
+        Send a duplicate of GET requests which have not been answered after
+        the 95th percentile latency of their endpoint, and use whichever
+        answer arrives first. The default is to hedge if
+        `$CODEKIT_HEDGE_READS` is set.
+
+    **kwargs
+        Parameters of `LatencyTracker`.
+    """
+    global _latency, _hedge
+    _latency = LatencyTracker(**kwargs)
+    if hedge is not None:
+        _hedge = hedge
+
+
+# http timeout of the reads made by the current thread, see
+# `_timed_connection()`
+_http_local = threading.local()
+
+
+def _timed_connection(cls):
+    """Return a subclass of a pygithub http connection class whose timeout
+    may be overridden for the requests made by a thread."""
+    class TimedConnection(cls):
+        @property
+        def timeout(self):
+            timeout = getattr(_http_local, 'timeout', None)
+            return self._timeout if timeout is None else timeout
+
+        @timeout.setter
+        def timeout(self, value):
+            self._timeout = value
+
+    return TimedConnection
+
+
+def _timed(call, endpoint, timeout):
+    """Return the result of `call()`, with the http timeout of the requests it
+    makes from the calling thread set to `timeout` seconds.
+
+    Raises
+    ------
+    requests.exceptions.Timeout
+        If github does not answer within `timeout` seconds.
+    """
+    tracker = _latency
+    start = time.monotonic()
+    outer = getattr(_http_local, 'timeout', None)
+    _http_local.timeout = timeout
+    try:
+        result = call()
+    except requests.exceptions.Timeout:
+        tracker.record(endpoint, timeout)
+        raise
+    finally:
+        _http_local.timeout = outer
+
+    tracker.record(endpoint, time.monotonic() - start)
+    return result
+
+
+def _race(call, endpoint, timeout, hedge_delay=None):
+    """Return the result of `call()`, calling it again if it has not returned
+    after `hedge_delay` seconds and returning the first result.
+
+    Raises
+    ------
+    requests.exceptions.ReadTimeout
+        If no result is returned within `timeout` seconds.  The calls are
+        left to run to completion (or their http timeout) in the background.
+    """
+    tracker = _latency
+    results = queue.Queue()
+    start = time.monotonic()
+
+    def attempt(n):
+        try:
+            results.put((n, True, call()))
+        except Exception as e:
+            results.put((n, False, e))
+
+    def launch(n):
+        threading.Thread(target=attempt, args=(n,), daemon=True).start()
+
+    launch(0)
+    pending = 1
+    hedge_at = start + hedge_delay if hedge_delay is not None else None
+    deadline = start + timeout
+    error = None
+
+    while pending:
+        until = deadline if hedge_at is None else min(hedge_at, deadline)
+        try:
+            n, ok, value = results.get(
+                timeout=max(until - time.monotonic(), 0),
+            )
+        except queue.Empty:
+            if time.monotonic() >= deadline:
+                break
+            hedge_at = None
+            with _hedges_lock:
+                _hedges['sent'] += 1
+            debug("no answer from %s after %.2fs, sending a duplicate",
+                  endpoint, hedge_delay)
+            launch(1)
+            pending += 1
+            continue
+
+        pending -= 1
+        if ok:
+            tracker.record(endpoint, time.monotonic() - start)
+            if n:
+                with _hedges_lock:
+                    _hedges['won'] += 1
+            return value
+        error = value
+
+    if error is not None and not pending:
+        raise error
+
+    # the latency is at least the timeout, which lengthens future timeouts if
+    # the endpoint has slowed down
+    tracker.record(endpoint, timeout)
+    raise requests.exceptions.ReadTimeout(
+        "no answer from {e} within {t:.1f}s".format(e=endpoint, t=timeout)
+    )
+
+
+def _time_requests(requester):
+    """Give up on the reads of a `github.Requester.Requester` which take
+    much longer than usual for their endpoint, and optionally hedge slow GET
+    requests.
+
+    Only reads (GET requests and GraphQL queries) are timed in this way.  A
+    read which is given up on raises `requests.exceptions.ReadTimeout`, so
+    that it is retried by `_retry_requests()`.  Writes are subject only to the
+    http timeout of the login, as a write which is given up on would still be
+    running when it is retried.  GraphQL queries are timed per operation.
+
+    The timeout of reads which are not hedged is the http timeout of their
+    connection; hedged reads are raced in background threads.
+    """
+    request = requester.requestJsonAndCheck
+
+    cls = getattr(requester, '_Requester__connectionClass', None)
+    if cls is not None:
+        requester._Requester__connectionClass = _timed_connection(cls)
+
+    @functools.wraps(request)
+    def wrapper(verb, url, *args, **kwargs):
+        body = kwargs.get('input', args[2] if len(args) > 2 else None)
+        endpoint = _endpoint(url)
+        if verb != 'GET' and _is_write(verb, endpoint, body):
+            return request(verb, url, *args, **kwargs)
+
+        key = "{v} {e}".format(v=verb, e=endpoint)
+        if endpoint == '/graphql':
+            key += ' ' + _graphql_operation(body)
+
+        hedge_delay = None
+        if _hedge and verb == 'GET':
+            with _hedges_lock:
+                _hedges['reads'] += 1
+                budget = _hedges['reads'] * HEDGE_BUDGET - _hedges['sent']
+            if budget >= 1:
+                hedge_delay = _latency.hedge_delay(key)
+
+        call = functools.partial(request, verb, url, *args, **kwargs)
+        if hedge_delay is None:
+            return _timed(call, key, _latency.timeout(key))
+        return _race(call, key, _latency.timeout(key), hedge_delay=hedge_delay)
+
+    requester.requestJsonAndCheck = wrapper
+
+
+@public
+def get_hedges():
+    """Return the number of hedged GET requests made by `login_github()`
+    logins.
+
+    Returns
+    -------
+    hedges: dict(str, int)
+        the number of GET requests which could have been hedged (`reads`), of
+        duplicates sent (`sent`) and of duplicates which answered first (`won`)
+    """
+    with _hedges_lock:
+        return dict(_hedges)
+
+
+events.register_stats('hedges', get_hedges)
+
+
+class _Flight(object):
+    """A GET request, which may still be in flight, shared by all callers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# _Flight(s) of GET requests made during this run, keyed by url and arguments
+_flights = {}
+_flights_lock = threading.Lock()
+
+# GET requests answered by an earlier (`hits`) or in flight (`joined`)
+# request, and those sent to github (`misses`)
+_memo_stats = collections.Counter()
+
+# paths of reads which are expected to change without any writes by codekit
+UNMEMOIZED_PATHS = {'/rate_limit'}
+
+
+def _is_write(verb, path, body):
+    if verb in ('GET', 'HEAD'):
+        return False
+    if verb == 'POST' and path == '/graphql':
+        query = (body or {}).get('query', '')
+        return query.lstrip().startswith('mutation')
+    return True
+
+
+def _write_prefixes(path, body):
+    """Return the paths of the github objects which may be changed by a
+    write to `path`.  A repo is considered part of its owner."""
+    prefixes = set()
+    for owner, repo in re.findall(r'/repos/([^/]+)/([^/]+)', path):
+        prefixes.add("/repos/{o}/{r}".format(o=owner, r=repo))
+        prefixes.add("/orgs/{o}".format(o=owner))
+        prefixes.add("/users/{o}".format(o=owner))
+    for kind, name in re.findall(r'/(orgs|users|teams)/([^/]+)', path):
+        prefixes.add("/{k}/{n}".format(k=kind, n=name))
+    for org_id, team_id in re.findall(r'/organizations/(\d+)/team/(\d+)',
+                                      path):
+        prefixes.add("/organizations/{o}/team/{t}".format(o=org_id,
+                                                          t=team_id))
+        prefixes.add("/teams/{t}".format(t=team_id))
+
+    # forks are created in the org named in the request
+    if isinstance(body, dict) and body.get('organization'):
+        prefixes.add("/orgs/{o}".format(o=body['organization']))
+
+    return prefixes
+
+
+def _invalidate_repo_teams(verb, path, body):
+    """Forget the cached team names of the repos whose teams may be changed
+    by a write to the team api `path`."""
+    names = ["{o}/{r}".format(o=o, r=r)
+             for o, r in re.findall(r'/repos/([^/]+)/([^/]+)', path)]
+    # new teams may be given repos
+    if isinstance(body, dict):
+        names.extend(body.get('repo_names') or [])
+
+    if names:
+        for name in names:
+            _repo_team_names.invalidate(name)
+    elif verb in ('PATCH', 'DELETE'):
+        # a team was renamed or deleted
+        _repo_team_names.invalidate()
+
+
+@public
+def invalidate_requests(prefix=None):
+    """Forget the results of GET requests, so that they are sent to github
+    again.
+
+    Writes made by `login_github()` logins invalidate the requests about the
+    objects they change automatically.  This is needed for changes which
+    github makes asynchronously, or which are made by others.
+
+    Parameters
+    ----------
+    prefix: str, optional
+        Forget requests whose url path includes this api url or path, eg.
+        `/orgs/lsst`, rather than all requests.
+    """
+    with _flights_lock:
+        if prefix is None:
+            _flights.clear()
+            return
+
+        prefix = _path(prefix)
+        for key in [k for k, f in _flights.items()
+                    if prefix + '/' in f.path + '/']:
+            del _flights[key]
+
+
+def _memoize_requests(requester):
+    """Share the results of identical GET requests of a
+    `github.Requester.Requester`.
+
+    Requests which are identical to a request which is in flight wait for its
+    result, and those which are identical to a completed request are answered
+    with a copy of its result, for the rest of the run.  Failed requests are
+    not remembered.  Writes forget the requests about the github objects they
+    may change (see `_write_prefixes()`), whether or not they succeed.
+    """
+    request = requester.requestJsonAndCheck
+
+    @functools.wraps(request)
+    def wrapper(verb, url, *args, **kwargs):
+        path = _path(url)
+        if verb != 'GET' or path in UNMEMOIZED_PATHS:
+            body = kwargs.get('input', args[2] if len(args) > 2 else None)
+            if not _is_write(verb, path, body):
+                return request(verb, url, *args, **kwargs)
+            try:
+                return request(verb, url, *args, **kwargs)
+            finally:
+                for prefix in _write_prefixes(path, body):
+                    invalidate_requests(prefix)
+                # the org of a team is not always named in its url
+                if '/team' in path:
+                    _team_indexes.invalidate()
+                    _invalidate_repo_teams(verb, path, body)
+
+        key = json.dumps([url, args, kwargs], sort_keys=True, default=str)
+        with _flights_lock:
+            flight = _flights.get(key)
+            if flight is None:
+                flight = _flights[key] = _Flight(path)
+                _memo_stats['misses'] += 1
+                leader = True
+            else:
+                _memo_stats['joined' if not flight.done.is_set() else
+                            'hits'] += 1
+                leader = False
+
+        if leader:
+            try:
+                flight.result = request(verb, url, *args, **kwargs)
+            except Exception as e:
+                flight.error = e
+                with _flights_lock:
+                    if _flights.get(key) is flight:
+                        del _flights[key]
+            finally:
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        # callers may modify the data used to construct pygithub objects
+        return copy.deepcopy(flight.result)
+
+    requester.requestJsonAndCheck = wrapper
+
+
+codetools.register_cache(invalidate_requests, per_run=True)
+
+
+@public
+def get_memo_stats():
+    """Return the number of GET requests made by `login_github()` logins which
+    were answered without an api request.
+
+    Returns
+    -------
+    memo: dict(str, int)
+        the number of requests answered by an earlier request (`hits`), by a
+        request which was in flight (`joined`) and by github (`misses`)
+    """
+    with _flights_lock:
+        return dict(_memo_stats)
+
+
+events.register_stats('memo', get_memo_stats)
+
+
+@public
+def with_retries(func, *args, retries=5, backoff=1, max_backoff=60, **kwargs):
+    """Call `func(*args, **kwargs)`, retrying transient github API errors.
+
+    This is for requests which are retried as a whole, such as those which
+    `login_github()` logins do not retry because they are not known to be safe
+    to send again.  Errors which have already been retried are not retried
+    again, but secondary rate limits are left to this function (see
+    `caller_handles_throttling()`).  See `RetryPolicy` for the delay between
+    attempts.
+
+    Parameters
+    ----------
+    func: callable
+        Function making github API request(s).  It should be safe to call more
+        than once.
+
+    retries: int
+        Maximum number of retries.
+
+    backoff: float
+        Initial number of seconds to wait between attempts.
+
+    max_backoff: float
+        Maximum number of seconds to wait between attempts.
+
+    Raises
+    ------
+    github.GithubException
+        The last error, if all attempts fail or the error is not transient.
+    """
+    policy = RetryPolicy(
+        retries=retries,
+        backoff=backoff,
+        max_backoff=max_backoff,
+    )
+    for attempt in itertools.count(1):
+        try:
+            with caller_handles_throttling():
+                return func(*args, **kwargs)
+        except github.GithubException as e:
+            if (
+                attempt > retries or not is_transient_error(e) or
+                getattr(e, '_codekit_retried', False)
+            ):
+                raise
+
+            wait = policy.delay(attempt, e)
+            debug("transient github error (attempt {n} of {m}),"
+                  " retrying in {s:.1f}s: {e}".format(
+                      n=attempt,
+                      m=retries + 1,
+                      s=wait,
+                      e=e,
+                  ))
+            time.sleep(wait)
+
+
+@public
+def graphql_query(obj, query, variables=None):
+    """Make a GitHub GraphQL (v4) api request.
+
+    Parameters
+    ----------
+    obj: github.MainClass.Github or github.GithubObject.GithubObject
+        The api request is made using the same credentials as this object.
+
+    query: str
+        GraphQL query document
+
+    variables: dict, optional
+        Values of the variables declared by the query
+
+    Returns
+    -------
+    data: dict
+        The `data` member of the response. Note that this may be partial if
+        there were errors resolving some fields.
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api or if no data was returned
+    """
+    body = {'query': query}
+    if variables:
+        body['variables'] = variables
+
+    _, data = _get_requester(obj).requestJsonAndCheck(
+        'POST',
+        '/graphql',
+        input=body,
+    )
+
+    for e in data.get('errors', []):
+        debug("graphql error: {e}".format(e=e.get('message')))
+
+    if not data.get('data'):
+        raise github.GithubException(200, data)
+
+    return data['data']
+
+
+@public
+def graphql_paginate(obj, query, path, variables=None):
+    """Iterate over the nodes of a paginated GraphQL connection.
+
+    Parameters
+    ----------
+    obj: github.MainClass.Github or github.GithubObject.GithubObject
+        The api requests are made using the same credentials as this object.
+
+    query: str
+        GraphQL query document. It must declare a `$cursor: String` variable,
+        which is passed as the `after` argument of the connection, and select
+        `pageInfo { hasNextPage endCursor }` and `nodes` of the connection.
+
+    path: list(str)
+        Keys leading from the `data` member of the response to the
+        connection.
+
+    variables: dict, optional
+        Values of the other variables declared by the query. If `cursor` is
+        given, the first page requested is the one after that cursor.
+
+    Yields
+    ------
+    dict
+        connection nodes
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api or if the connection could not be resolved
+    """
+    variables = dict(variables or {})
+    variables.setdefault('cursor', None)
+
+    while True:
+        conn = graphql_query(obj, query, variables=variables)
+        for key in path:
+            conn = conn.get(key) if conn else None
+        if conn is None:
+            raise github.GithubException(404, {
+                'message': "unable to resolve {path}".format(
+                    path='.'.join(path)
+                ),
+            })
+
+        yield from conn['nodes']
+
+        if not conn['pageInfo']['hasNextPage']:
+            return
+        variables['cursor'] = conn['pageInfo']['endCursor']
+
+
+@public
+@profiling.phase('org repo teams')
+def get_org_repo_teams(g, org_name, page_size=100):
+    """Find the teams of every repo in an org using the GraphQL api.
+
+    The repos are listed `page_size` at a time, as are the teams along with
+    (up to) their first `page_size` member repos. The remaining member repos
+    of larger teams are then listed team by team, for a total of about
+    repos / `page_size` + teams / `page_size` + large teams requests.
+
+    Parameters
+    ----------
+    g: github.MainClass.Github
+
+    org_name: str
+        login of the org
+
+    page_size: int
+        number of nodes requested per page (max 100)
+
+    Returns
+    -------
+    repo_teams: collections.OrderedDict(str, list(str))
+        team names keyed by repo full name, ordered by repo name
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api
+    """
+    assert 0 < page_size <= 100, page_size
+
+    repos_query = """\
+        query OrgRepos($org: String!, $cursor: String) {
+          organization(login: $org) {
+            repositories(first: %(n)d, after: $cursor,
+                         orderBy: {field: NAME, direction: ASC}) {
+              pageInfo { hasNextPage endCursor }
+              nodes { nameWithOwner }
+            }
+          }
+        }""" % {'n': page_size}
+    teams_query = """\
+        query OrgTeams($org: String!, $cursor: String) {
+          organization(login: $org) {
+            teams(first: %(n)d, after: $cursor) {
+              pageInfo { hasNextPage endCursor }
+              nodes {
+                name
+                slug
+                repositories(first: %(n)d) {
+                  pageInfo { hasNextPage endCursor }
+                  nodes { nameWithOwner }
+                }
+              }
+            }
+          }
+        }""" % {'n': page_size}
+    team_repos_query = """\
+        query TeamRepos($org: String!, $slug: String!, $cursor: String) {
+          organization(login: $org) {
+            team(slug: $slug) {
+              repositories(first: %(n)d, after: $cursor) {
+                pageInfo { hasNextPage endCursor }
+                nodes { nameWithOwner }
+              }
+            }
+          }
+        }""" % {'n': page_size}
+
+    repo_teams = collections.OrderedDict(
+        (r['nameWithOwner'], []) for r in graphql_paginate(
+            g,
+            repos_query,
+            ['organization', 'repositories'],
+            variables={'org': org_name},
+        )
+    )
+    debug("found {n} repos in {org}".format(n=len(repo_teams), org=org_name))
+
+    def add_members(team, nodes):
+        for r in nodes:
+            # the team may have been granted access to a repo outside of the
+            # org
+            if r['nameWithOwner'] in repo_teams:
+                repo_teams[r['nameWithOwner']].append(team)
+
+    for t in graphql_paginate(
+        g,
+        teams_query,
+        ['organization', 'teams'],
+        variables={'org': org_name},
+    ):
+        conn = t['repositories']
+        add_members(t['name'], conn['nodes'])
+        if not conn['pageInfo']['hasNextPage']:
+            continue
+
+        debug("  listing remaining repos of team '{t}'".format(t=t['name']))
+        add_members(t['name'], graphql_paginate(
+            g,
+            team_repos_query,
+            ['organization', 'team', 'repositories'],
+            variables={
+                'org': org_name,
+                'slug': t['slug'],
+                'cursor': conn['pageInfo']['endCursor'],
+            },
+        ))
+
+    return repo_teams
+
+
+@public
+@profiling.phase('default heads')
+def get_default_heads(repos, batch_size=50):
+    """Find the heads of the default branches of many repos using batched
+    GraphQL requests.  Results are cached for the life of the process.
+
+    Parameters
+    ----------
+    repos: list(github.Repository.Repository)
+        repos to get default branch heads for
+
+    batch_size: int
+        number of repos to resolve per GraphQL request
+
+    Returns
+    -------
+    heads: dict of `BranchHead`, keyed by repo full_name. Repos which could not
+    be resolved are omitted.
+
+    Raises
+    ------
+    github.GithubException
+        Upon error from github api
+    """
+    missing = [r for r in repos if r.full_name not in _default_heads]
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i:i + batch_size]
+
+        fields = []
+        for n, r in enumerate(batch):
+            owner, name = r.full_name.split('/', 1)
+            fields.append(textwrap.dedent("""\
+                r{n}: repository(owner: {owner}, name: {name}) {{
+                  nameWithOwner
+                  defaultBranchRef {{
+                    name
+                    target {{ oid __typename }}
+                  }}
+                }}\
+                """).format(
+                n=n,
+                owner=json.dumps(owner),
+                name=json.dumps(name),
+            ))
+        query = "query DefaultHeads {{\n{fields}\n}}".format(
+            fields='\n'.join(fields),
+        )
+
+        debug("resolving default branch of {n} repo(s)".format(n=len(batch)))
+        data = graphql_query(batch[0], query)
+
+        for n, r in enumerate(batch):
+            node = data.get("r{n}".format(n=n))
+            if not (node and node['defaultBranchRef']):
+                debug("  unresolved: %s", r.full_name)
+                continue
+
+            branch = node['defaultBranchRef']
+            _default_heads[r.full_name] = BranchHead(
+                ref="refs/heads/{b}".format(b=branch['name']),
+                sha=branch['target']['oid'],
+                type=branch['target']['__typename'].lower(),
+            )
+
+    return {r.full_name: _default_heads[r.full_name]
+            for r in repos if r.full_name in _default_heads}
@@ -1,15 +1,21 @@
 """versionDB related utility functions."""
 
-from codekit.codetools import debug
-from public import public
+from codekit.codetools import debug, public
+from codekit import profiling
+import codekit.codetools as codetools
 import logging
 import re
-import requests
 import textwrap
 
+requests = codetools.lazy_import('requests')
+
 default_base_url =\
     'https://raw.githubusercontent.com/lsst/versiondb/main/manifests'
 
+# manifest file text keyed by url -- published manifests are not modified
+_manifest_text = {}
+codetools.register_cache(_manifest_text.clear)
+
 
 @public
 def setup_logging(verbosity=0):
@@ -51,12 +57,18 @@ class Manifest(object):
     def __fetch_manifest_file(self):
         # construct url
         tag_url = '/'.join((self.base_url, self.name + '.txt'))
+        try:
+            self.__text = _manifest_text[tag_url]
+            return
+        except KeyError:
+            pass
+
         debug("fetching: {url}".format(url=tag_url))
 
         r = requests.get(tag_url)
         r.raise_for_status()
 
-        self.__text = r.text
+        self.__text = _manifest_text[tag_url] = r.text
 
     def __parse_manifest_text(self):
         products = {}
@@ -118,8 +130,10 @@ class Manifest(object):
         self.__products = products
 
     def __process(self):
-        self.__fetch_manifest_file()
-        self.__parse_manifest_text()
+        with profiling.phase('versiondb fetch'):
+            self.__fetch_manifest_file()
+        with profiling.phase('versiondb parse'):
+            self.__parse_manifest_text()
 
     @property
     def products(self):
@@ -42,7 +42,6 @@ setup(
     install_requires=[
         'MapGitConfig==1.1',
         'progressbar2==3.37.1',
-        'public==1.0',
         'pygithub==1.40a3',
         'pyyaml>=5.1',
         'requests>=2.8.1,<3.0.0',
@@ -60,12 +59,15 @@ setup(
     # package_data={},
     entry_points={
         'console_scripts': [
+            'codekit = codekit.cli.codekit:main',
+            'codekit-daemon = codekit.cli.codekit_daemon:main',
             'github-auth = codekit.cli.github_auth:main',
             'github-decimate-org = codekit.cli.github_decimate_org:main',
             'github-fork-org = codekit.cli.github_fork_org:main',
             'github-get-ratelimit= codekit.cli.github_get_ratelimit:main',
             'github-list-repos = codekit.cli.github_list_repos:main',
             'github-mv-repos-to-team = codekit.cli.github_mv_repos_to_team:main',  # NOQA
+            'github-sync-teams = codekit.cli.github_sync_teams:main',
             'github-tag-release = codekit.cli.github_tag_release:main',
             'github-tag-teams = codekit.cli.github_tag_teams:main',
         ]
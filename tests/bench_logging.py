@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Microbenchmark of codekit logging on a large product set.
+
+Not collected by pytest. Run as::
+
+    python tests/bench_logging.py [N_PRODUCTS]
+"""
+
+from codekit import codetools
+from codekit.codetools import debug, info
+import concurrent.futures
+import io
+import logging
+import sys
+import textwrap
+import time
+
+WORKERS = 8
+
+
+class SlowStream(io.StringIO):
+    """Stream with the write latency of a busy terminal or pipe"""
+
+    def write(self, s):
+        time.sleep(0.00005)
+        return len(s)
+
+
+def products(n):
+    return {
+        "product_{i}".format(i=i): {
+            'eups_version': "{i}.0-1-g{i:07x}+3".format(i=i),
+            'sha': "{i:040x}".format(i=i),
+            'dependencies': ['base', 'utils', 'afw'],
+        } for i in range(n)
+    }
+
+
+def eager(name, data):
+    debug(textwrap.dedent("""\
+        looking for git repo for: {name} [{ver}]
+          sha: {sha}
+          dependencies: {deps}\
+        """).format(
+        name=name,
+        ver=data['eups_version'],
+        sha=data['sha'],
+        deps=data['dependencies'],
+    ))
+
+
+def lazy(name, data):
+    debug(lambda: textwrap.dedent("""\
+        looking for git repo for: {name} [{ver}]
+          sha: {sha}
+          dependencies: {deps}\
+        """).format(
+        name=name,
+        ver=data['eups_version'],
+        sha=data['sha'],
+        deps=data['dependencies'],
+    ))
+
+
+def percent(name, data):
+    debug("looking for git repo for: %s [%s]\n  sha: %s\n  dependencies: %s",
+          name, data['eups_version'], data['sha'], data['dependencies'])
+
+
+def timed(func, items):
+    start = time.perf_counter()
+    for name, data in items:
+        func(name, data)
+    return time.perf_counter() - start
+
+
+def emit_concurrently(items, queued):
+    def work(item):
+        info("tagging %s [%s]", *item)
+
+    start = time.perf_counter()
+    if queued:
+        with codetools.queued_logging(), \
+                concurrent.futures.ThreadPoolExecutor(WORKERS) as pool:
+            list(pool.map(work, items))
+            workers_done = time.perf_counter()
+    else:
+        with concurrent.futures.ThreadPoolExecutor(WORKERS) as pool:
+            list(pool.map(work, items))
+        workers_done = time.perf_counter()
+
+    return workers_done - start, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    items = [(k, v['eups_version']) for k, v in products(n).items()]
+    data = list(products(n).items())
+
+    codetools.setup_logging(verbosity=0)
+    print("{n} products, DEBUG disabled:".format(n=n))
+    for func in (eager, lazy, percent):
+        print("  {f:8} {t:8.4f}s".format(f=func.__name__, t=timed(func, data)))
+
+    # "workers" is the time for which the workers are held up by logging
+    logging.root.handlers[0].setStream(SlowStream())
+    print("{n} INFO records from {w} threads:".format(n=n, w=WORKERS))
+    for queued in (False, True):
+        workers, total = emit_concurrently(items, queued)
+        print("  {q:8} workers {w:8.4f}s total {t:8.4f}s".format(
+            q='queued' if queued else 'direct',
+            w=workers,
+            t=total,
+        ))
+
+
+if __name__ == '__main__':
+    main()
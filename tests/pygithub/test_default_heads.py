@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import codekit.codetools
+import codekit.pygithub
+import github
+import json
+import re
+import responses
+
+
+def graphql_callback(request):
+    """Resolve every aliased repository in the query, except `missing`"""
+    query = json.loads(request.body)['query']
+
+    data = {}
+    pat = r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\)'
+    for alias, owner, name in re.findall(pat, query):
+        if name == 'missing':
+            data[alias] = None
+            continue
+        data[alias] = {
+            'nameWithOwner': "{o}/{n}".format(o=owner, n=name),
+            'defaultBranchRef': {
+                'name': 'main',
+                'target': {'oid': name * 4, '__typename': 'Commit'},
+            },
+        }
+
+    return (200, {}, json.dumps({'data': data}))
+
+
+@responses.activate
+def test_get_default_heads():
+    """Default branch heads are resolved in batches"""
+    responses.add_callback(
+        responses.POST,
+        re.compile(r'.*/graphql$'),
+        callback=graphql_callback,
+        content_type='application/json',
+    )
+    g = github.Github('bogus')
+    names = ['foo/a', 'foo/b', 'foo/c', 'foo/missing']
+    repos = [codekit.pygithub.get_repo_lazy(g, n) for n in names]
+
+    heads = codekit.pygithub.get_default_heads(repos, batch_size=3)
+
+    assert len(responses.calls) == 2
+    assert sorted(heads.keys()) == ['foo/a', 'foo/b', 'foo/c']
+    assert heads['foo/a'] == codekit.pygithub.BranchHead(
+        ref='refs/heads/main',
+        sha='aaaa',
+        type='commit',
+    )
+
+    # resolved heads are cached
+    heads = codekit.pygithub.get_default_heads(repos[0:3])
+    assert len(responses.calls) == 2
+    assert len(heads) == 3
+
+    # but not between daemon jobs
+    codekit.codetools.clear_caches(per_run_only=True)
+    heads = codekit.pygithub.get_default_heads(repos[0:3])
+    assert len(responses.calls) == 3
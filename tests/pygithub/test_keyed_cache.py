@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import os
+from unittest import mock
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted"""
+    cache = codekit.pygithub.KeyedCache(maxsize=2)
+
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_ttl():
+    """Entries expire after ttl seconds"""
+    cache = codekit.pygithub.KeyedCache(ttl=10)
+
+    with mock.patch('time.time', return_value=100):
+        cache.put('a', 1)
+    with mock.patch('time.time', return_value=105):
+        assert cache.get('a') == 1
+    with mock.patch('time.time', return_value=111):
+        assert cache.get('a', 'stale') == 'stale'
+
+
+def test_disk_tier(tmpdir):
+    """Entries are persisted across cache instances"""
+    path = os.path.join(str(tmpdir), 'cache.json')
+
+    cache = codekit.pygithub.KeyedCache(path=path)
+    cache.put('foo/bar', ['Data Management'])
+    cache.save()
+
+    cache = codekit.pygithub.KeyedCache(path=path)
+    assert cache.get('foo/bar') == ['Data Management']
+
+    # expired entries are not loaded
+    cache = codekit.pygithub.KeyedCache(ttl=-1, path=path)
+    assert cache.get('foo/bar') is None
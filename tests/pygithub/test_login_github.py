@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+from unittest import mock
+
+
+@mock.patch.dict('codekit.pygithub._logins', clear=True)
+@mock.patch('codekit.pygithub.debug_ratelimit')
+def test_login_github_memoized(debug_ratelimit):
+    """A single github instance is shared by all logins with the same token"""
+    g1 = codekit.pygithub.login_github(token='abc')
+    g2 = codekit.pygithub.login_github(token='abc')
+    g3 = codekit.pygithub.login_github(token='xyz')
+
+    assert g1 is g2
+    assert g1 is not g3
+    assert codekit.pygithub.get_logins() == [g1, g3]
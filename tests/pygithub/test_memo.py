@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import pytest
+import threading
+from unittest import mock
+
+
+class FakeRequester(object):
+    """Requester which answers GETs with the number of requests made"""
+
+    def __init__(self, gate=None):
+        self.requests = []
+        self.gate = gate
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None,
+                            input=None):
+        if self.gate:
+            self.gate.wait()
+        self.requests.append((verb, url))
+        if url.endswith('/missing'):
+            raise github.GithubException(404, {'message': 'Not Found'})
+        return {}, {'n': len(self.requests)}
+
+
+def memoized(**kwargs):
+    requester = FakeRequester(**kwargs)
+    codekit.pygithub._memoize_requests(requester)
+    return requester
+
+
+@pytest.fixture(autouse=True)
+def flights():
+    with mock.patch.dict('codekit.pygithub._flights', clear=True):
+        yield
+
+
+def test_memo():
+    """Identical GETs are answered by a single request"""
+    requester = memoized()
+    get = requester.requestJsonAndCheck
+
+    assert get('GET', '/orgs/lsst/teams') == ({}, {'n': 1})
+    assert get('GET', '/orgs/lsst/teams') == ({}, {'n': 1})
+    assert get('GET', '/orgs/lsst/teams', {'page': 2}) == ({}, {'n': 2})
+    assert get('GET', '/rate_limit') == ({}, {'n': 3})
+    assert get('GET', '/rate_limit') == ({}, {'n': 4})
+
+    # results are copies
+    get('GET', '/orgs/lsst/teams')[1]['n'] = 42
+    assert get('GET', '/orgs/lsst/teams') == ({}, {'n': 1})
+
+
+def test_memo_errors():
+    """Failed requests are not remembered"""
+    requester = memoized()
+
+    for _ in range(2):
+        with pytest.raises(github.GithubException):
+            requester.requestJsonAndCheck('GET', '/repos/a/b/missing')
+    assert len(requester.requests) == 2
+
+
+def test_memo_invalidation():
+    """Writes forget the requests about the objects they change"""
+    requester = memoized()
+    get = requester.requestJsonAndCheck
+
+    get('GET', 'https://api.github.com/repos/lsst/afw/git/refs/tags/v1')
+    get('GET', '/orgs/lsst/repos')
+    get('GET', '/repos/lsst/base')
+
+    get('POST', '/repos/lsst/afw/git/refs', input={'ref': 'refs/tags/v2'})
+    get('POST', '/graphql', input={'query': 'query { viewer { login } }'})
+
+    assert get('GET', '/repos/lsst/afw/git/refs/tags/v1')[1]['n'] == 6
+    assert get('GET', '/orgs/lsst/repos')[1]['n'] == 7
+    assert get('GET', '/repos/lsst/base')[1]['n'] == 3
+
+    # prefixes match whole path segments
+    codekit.pygithub.invalidate_requests('/repos/lsst/bas')
+    assert get('GET', '/repos/lsst/base')[1]['n'] == 3
+    codekit.pygithub.invalidate_requests('https://api.github.com/repos/lsst')
+    assert get('GET', '/repos/lsst/base')[1]['n'] == 8
+
+
+def test_single_flight():
+    """Concurrent identical GETs wait for the request in flight"""
+    gate = threading.Event()
+    requester = memoized(gate=gate)
+    results = []
+
+    def get():
+        results.append(requester.requestJsonAndCheck('GET', '/orgs/lsst'))
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert results == [({}, {'n': 1})] * 4
+    assert len(requester.requests) == 1
+
+
+@mock.patch(
+    'codekit.pygithub._repo_team_names',
+    codekit.pygithub.KeyedCache(maxsize=64),
+)
+def test_memo_repo_teams():
+    """Team writes forget the cached teams of the repos they change"""
+    requester = memoized()
+    cache = codekit.pygithub._repo_team_names
+    for name in ('lsst/afw', 'lsst/base', 'lsst/utils'):
+        cache.put(name, ['Data Management'])
+
+    requester.requestJsonAndCheck('PUT', '/teams/1/repos/lsst/afw')
+    assert cache.get('lsst/afw') is None
+    requester.requestJsonAndCheck(
+        'POST',
+        '/orgs/lsst/teams',
+        input={'name': 'New', 'repo_names': ['lsst/base']},
+    )
+    assert cache.get('lsst/base') is None
+    assert cache.get('lsst/utils') == ['Data Management']
+
+    requester.requestJsonAndCheck('DELETE', '/teams/1')
+    assert cache.get('lsst/utils') is None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import json
+import re
+import responses
+
+
+def page(nodes, cursor=None):
+    return {
+        'pageInfo': {'hasNextPage': cursor is not None, 'endCursor': cursor},
+        'nodes': [{'nameWithOwner': n} for n in nodes],
+    }
+
+
+def graphql_callback(request):
+    """Serve 3 repos over 2 pages and 2 teams, one of which has a second page
+    of repos"""
+    body = json.loads(request.body)
+    query = body['query']
+    cursor = body['variables']['cursor']
+
+    if 'team(slug: $slug)' in query:
+        assert body['variables']['slug'] == 'alpha'
+        assert cursor == 'a1'
+        org = {'team': {'repositories': page(['foo/c', 'bar/x'])}}
+    elif 'teams(' in query:
+        org = {'teams': {
+            'pageInfo': {'hasNextPage': False, 'endCursor': None},
+            'nodes': [
+                {
+                    'name': 'Alpha',
+                    'slug': 'alpha',
+                    'repositories': page(['foo/a', 'foo/b'], cursor='a1'),
+                },
+                {
+                    'name': 'Beta',
+                    'slug': 'beta',
+                    'repositories': page(['foo/b']),
+                },
+            ],
+        }}
+    elif cursor is None:
+        org = {'repositories': page(['foo/a', 'foo/b'], cursor='r1')}
+    else:
+        org = {'repositories': page(['foo/c'])}
+
+    return (200, {}, json.dumps({'data': {'organization': org}}))
+
+
+@responses.activate
+def test_get_org_repo_teams():
+    """Repo teams are assembled from paged graphql queries"""
+    responses.add_callback(
+        responses.POST,
+        re.compile(r'.*/graphql$'),
+        callback=graphql_callback,
+        content_type='application/json',
+    )
+    g = github.Github('bogus')
+
+    repo_teams = codekit.pygithub.get_org_repo_teams(g, 'foo', page_size=2)
+
+    assert len(responses.calls) == 4
+    assert list(repo_teams.items()) == [
+        ('foo/a', ['Alpha']),
+        ('foo/b', ['Alpha', 'Beta']),
+        ('foo/c', ['Alpha']),
+    ]
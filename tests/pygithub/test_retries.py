@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import codekit.concurrency
+import codekit.pygithub
+import functools
+import github
+import pytest
+import requests
+from unittest import mock
+
+
+def flaky(errors):
+    """Return a function which raises `errors`, in order, and then succeeds"""
+    errors = list(errors)
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    return func
+
+
+@mock.patch('random.uniform', lambda a, b: b)
+@mock.patch('time.sleep')
+def test_with_retries(sleep):
+    """Transient errors are retried with exponential backoff"""
+    func = flaky([
+        github.GithubException(502, {'message': 'Bad Gateway'}),
+        github.GithubException(
+            403,
+            {'message': 'You have exceeded a secondary rate limit.'},
+        ),
+    ])
+
+    assert codekit.pygithub.with_retries(func, backoff=1) == 'ok'
+    assert [c[0][0] for c in sleep.call_args_list] == [1, 2]
+
+
+@mock.patch('time.sleep')
+def test_with_retries_not_transient(sleep):
+    """Non-transient errors are not retried"""
+    func = flaky([github.GithubException(404, {'message': 'Not Found'})])
+
+    with pytest.raises(github.GithubException):
+        codekit.pygithub.with_retries(func)
+    sleep.assert_not_called()
+
+
+@mock.patch('time.sleep')
+def test_with_retries_exhausted(sleep):
+    """The last error is raised once retries are exhausted"""
+    func = flaky([github.GithubException(500, {})] * 3)
+
+    with pytest.raises(github.GithubException):
+        codekit.pygithub.with_retries(func, retries=2)
+    assert sleep.call_count == 2
+
+
+@mock.patch('time.sleep')
+def test_with_retries_already_retried(sleep):
+    """Errors already retried by a login are not retried again"""
+    e = github.GithubException(502, {})
+    e._codekit_retried = True
+
+    with pytest.raises(github.GithubException):
+        codekit.pygithub.with_retries(flaky([e]))
+    sleep.assert_not_called()
+
+
+def test_retry_policy_delay():
+    """Delays grow exponentially, with jitter, unless github asks for one"""
+    policy = codekit.pygithub.RetryPolicy(backoff=2, max_backoff=5)
+    assert 1 <= policy.delay(1) <= 2
+    assert 2 <= policy.delay(2) <= 4
+    assert 2.5 <= policy.delay(5) <= 5
+
+    policy = codekit.pygithub.RetryPolicy(jitter=False)
+    e = mock.Mock(headers={'Retry-After': '7'})
+    assert policy.delay(1, e) == 7
+
+
+class FakeRequester(object):
+    """Requester which answers requests from a script of responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None,
+                            input=None):
+        self.requests.append((verb, url))
+        r = self.responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return {}, r
+
+
+def retrying(responses):
+    requester = FakeRequester(responses)
+    codekit.pygithub._retry_requests(requester)
+    return requester
+
+
+@mock.patch('time.sleep')
+def test_retry_requests_reads(sleep):
+    """Reads are retried after server errors and timeouts"""
+    requester = retrying([
+        github.GithubException(502, {}),
+        requests.exceptions.ReadTimeout(),
+        {'ok': True},
+    ])
+
+    assert requester.requestJsonAndCheck('GET', '/repos/a/b') == \
+        ({}, {'ok': True})
+    assert sleep.call_count == 2
+    assert codekit.pygithub.get_retries()['ReadTimeout'] >= 1
+
+
+@mock.patch('time.sleep')
+def test_retry_requests_unsafe_write(sleep):
+    """Writes which may not be replayed are only retried if github rejected
+    them"""
+    requester = retrying([
+        github.GithubException(
+            403,
+            {'message': 'You have exceeded a secondary rate limit.'},
+        ),
+        github.GithubException(502, {}),
+    ])
+
+    with pytest.raises(github.GithubException) as excinfo:
+        requester.requestJsonAndCheck('POST', '/orgs/a/teams', input={})
+    assert excinfo.value.status == 502
+    assert len(requester.requests) == 2
+
+
+@mock.patch('time.sleep')
+def test_retry_requests_replayed_ref(sleep):
+    """A ref created by an attempt which timed out is not an error"""
+    ref = {'ref': 'refs/tags/v1', 'object': {'sha': 'abc'}}
+    requester = retrying([
+        requests.exceptions.ConnectionError(),
+        github.GithubException(422, {'message': 'Reference already exists'}),
+        ref,
+    ])
+
+    result = requester.requestJsonAndCheck(
+        'POST',
+        '/repos/a/b/git/refs',
+        input={'ref': 'refs/tags/v1', 'sha': 'abc'},
+    )
+    assert result == ({}, ref)
+    assert requester.requests[-1] == ('GET', '/repos/a/b/git/refs/tags/v1')
+
+
+def test_caller_handles_throttling():
+    """Secondary rate limits reach an adaptive caller, which lowers its
+    concurrency"""
+    requester = retrying([
+        github.GithubException(
+            403,
+            {'message': 'You have exceeded a secondary rate limit.'},
+        ),
+        {'ok': True},
+    ])
+
+    def func(item):
+        with codekit.pygithub.caller_handles_throttling():
+            return requester.requestJsonAndCheck('GET', '/repos/a/b')
+
+    limiter = codekit.concurrency.AdaptiveLimiter(initial=4, maximum=4)
+    results, problems = codekit.concurrency.map_adaptive(
+        func,
+        ['a'],
+        limiter,
+        throttled=functools.partial(
+            codekit.pygithub.throttle_delay,
+            default=0,
+        ),
+    )
+
+    assert results == [({}, {'ok': True})]
+    assert problems == []
+    assert limiter.throttled == 1
+    assert limiter.limit < 4
+    assert len(requester.requests) == 2
+
+
+@mock.patch('time.sleep')
+def test_with_retries_throttled(sleep):
+    """Secondary rate limits are retried by with_retries(), not the login"""
+    requester = retrying([
+        github.GithubException(
+            403,
+            {'message': 'You have exceeded a secondary rate limit.'},
+        ),
+        {'ok': True},
+    ])
+
+    assert codekit.pygithub.with_retries(
+        requester.requestJsonAndCheck,
+        'PUT',
+        '/teams/1/repos/a/b',
+    ) == ({}, {'ok': True})
+    assert sleep.call_count == 1
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import re
+import responses
+
+
+def test_get_repo_lazy():
+    """get_repo_lazy() should not make any http requests"""
+    g = github.Github('bogus')
+
+    with responses.RequestsMock():
+        repo = codekit.pygithub.get_repo_lazy(g, 'foo/bar')
+
+        assert isinstance(repo, github.Repository.Repository), type(repo)
+        assert repo.full_name == 'foo/bar'
+        assert repo.name == 'bar'
+
+
+@responses.activate
+def test_get_matching_tag_refs():
+    """Tag refs are returned keyed by tag name"""
+    responses.add(
+        responses.Response(
+            method='GET',
+            url=re.compile(r'.*/repos/foo/bar/git/matching-refs/tags/w\.1$'),
+            json=[
+                {
+                    'ref': 'refs/tags/w.1',
+                    'url': 'https://example.org/1',
+                    'object': {'sha': 'a' * 40, 'type': 'tag'},
+                },
+                {
+                    'ref': 'refs/tags/w.10',
+                    'url': 'https://example.org/10',
+                    'object': {'sha': 'b' * 40, 'type': 'tag'},
+                },
+            ],
+        ),
+    )
+    g = github.Github('bogus')
+    repo = codekit.pygithub.get_repo_lazy(g, 'foo/bar')
+
+    refs = codekit.pygithub.get_matching_tag_refs(repo, 'w.1')
+
+    assert sorted(refs.keys()) == ['w.1', 'w.10']
+    assert refs['w.10'].object.sha == 'b' * 40
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import re
+import responses
+from unittest import mock
+
+
+def team(id, name):
+    return {
+        'id': id,
+        'name': name,
+        'slug': name.lower().replace(' ', '-'),
+        'url': "https://api.github.com/teams/{id}".format(id=id),
+    }
+
+
+def get_org():
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo$'),
+        json={'login': 'foo', 'url': 'https://api.github.com/orgs/foo'},
+    )
+    return github.Github('bogus').get_organization('foo')
+
+
+@responses.activate
+@mock.patch(
+    'codekit.pygithub._team_indexes',
+    codekit.pygithub.KeyedCache(maxsize=64),
+)
+def test_get_team_index():
+    """Teams are indexed by name and slug, listing them only once"""
+    org = get_org()
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo/teams(\?.*)?$'),
+        json=[team(1, 'Alpha'), team(2, 'Data Management')],
+    )
+
+    index = codekit.pygithub.get_team_index(org)
+    assert sorted(index.by_name) == ['Alpha', 'Data Management']
+    assert index.by_slug['data-management'].id == 2
+
+    assert codekit.pygithub.get_teams_by_name(org, ['Beta', 'Alpha'])[0].id \
+        == 1
+    assert codekit.pygithub.get_team_by_slug(org, 'alpha').id == 1
+    assert codekit.pygithub.get_team_by_slug(org, 'beta') is None
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+@mock.patch(
+    'codekit.pygithub._team_indexes',
+    codekit.pygithub.KeyedCache(maxsize=64),
+)
+def test_get_team_by_slug():
+    """Without an index, a team is looked up by a single request"""
+    org = get_org()
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo/teams/alpha$'),
+        json=team(1, 'Alpha'),
+    )
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo/teams/beta$'),
+        status=404,
+        json={'message': 'Not Found'},
+    )
+
+    assert codekit.pygithub.get_team_by_slug(org, 'alpha').name == 'Alpha'
+    assert codekit.pygithub.get_team_by_slug(org, 'beta') is None
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import github
+import re
+import responses
+
+
+def team(id, name):
+    return {
+        'id': id,
+        'name': name,
+        'slug': name.lower(),
+        'url': "https://api.github.com/teams/{id}".format(id=id),
+    }
+
+
+def repo(name):
+    return {
+        'name': name,
+        'full_name': "foo/{n}".format(n=name),
+        'url': "https://api.github.com/repos/foo/{n}".format(n=name),
+    }
+
+
+@responses.activate
+def test_get_team_repos_index():
+    """Teams and their member repos are indexed by name"""
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo$'),
+        json={'login': 'foo', 'url': 'https://api.github.com/orgs/foo'},
+    )
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/orgs/foo/teams(\?.*)?$'),
+        json=[team(1, 'Alpha'), team(2, 'Beta')],
+    )
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/teams/1/repos(\?.*)?$'),
+        json=[repo('a'), repo('b')],
+    )
+    responses.add(
+        responses.GET,
+        re.compile(r'.*/teams/2/repos(\?.*)?$'),
+        json=[],
+    )
+    g = github.Github('bogus')
+    org = g.get_organization('foo')
+
+    teams, team_repos = codekit.pygithub.get_team_repos_index(org)
+
+    assert sorted(teams.keys()) == ['Alpha', 'Beta']
+    assert sorted(team_repos['Alpha'].keys()) == ['a', 'b']
+    assert team_repos['Beta'] == {}
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import codekit.pygithub
+import pytest
+import requests
+import threading
+import time
+from unittest import mock
+
+
+def test_endpoint():
+    """Names of github objects are replaced by placeholders"""
+    endpoint = codekit.pygithub._endpoint
+
+    assert endpoint('https://api.github.com/repos/lsst/afw/git/refs/tags/v1') \
+        == '/repos/:owner/:repo/git/refs/:ref'
+    assert endpoint('/orgs/lsst/teams?per_page=100') == '/orgs/:name/teams'
+    assert endpoint('/teams/1234/repos/lsst/afw') == \
+        '/teams/:name/repos/:owner/:repo'
+    assert endpoint('/repos/lsst/afw/git/commits/' + 'a' * 40) == \
+        '/repos/:owner/:repo/git/commits/:sha'
+
+
+def test_latency_tracker():
+    """Timeouts follow the observed latency, within bounds"""
+    tracker = codekit.pygithub.LatencyTracker(
+        min_samples=10,
+        factor=2,
+        min_timeout=1,
+        max_timeout=10,
+    )
+    assert tracker.timeout('GET /x') == 10
+    assert tracker.hedge_delay('GET /x') is None
+
+    for i in range(100):
+        tracker.record('GET /x', 0.01 * i)
+    assert tracker.percentile('GET /x', 95) == pytest.approx(0.95)
+    assert tracker.timeout('GET /x') == pytest.approx(1.98)
+    assert tracker.hedge_delay('GET /x') == pytest.approx(0.95)
+
+    for i in range(100):
+        tracker.record('GET /y', 0.001)
+    assert tracker.timeout('GET /y') == 1
+
+
+@mock.patch('codekit.pygithub._latency', codekit.pygithub.LatencyTracker())
+def test_race_timeout():
+    """A request which takes too long is given up on"""
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        codekit.pygithub._race(lambda: time.sleep(1), 'GET /x', 0.05)
+
+
+@mock.patch('codekit.pygithub._latency', codekit.pygithub.LatencyTracker())
+def test_race_hedge():
+    """The first answer of a hedged request is used"""
+    calls = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            calls.append(len(calls))
+            n = calls[-1]
+        # the first call stalls
+        if n == 0:
+            time.sleep(1)
+        return n
+
+    before = codekit.pygithub.get_hedges().get('won', 0)
+    assert codekit.pygithub._race(call, 'GET /x', 5, hedge_delay=0.05) == 1
+    assert codekit.pygithub.get_hedges()['won'] == before + 1
+
+
+@mock.patch('codekit.pygithub._latency', codekit.pygithub.LatencyTracker())
+def test_race_error():
+    """Errors are raised from the calling thread"""
+    def call():
+        raise ValueError('oops')
+
+    with pytest.raises(ValueError):
+        codekit.pygithub._race(call, 'GET /x', 5)
+
+
+@mock.patch(
+    'codekit.pygithub._latency',
+    codekit.pygithub.LatencyTracker(max_timeout=0.01),
+)
+def test_time_requests_writes():
+    """Writes are not given up on, only reads"""
+    class Requester(object):
+        def requestJsonAndCheck(self, verb, url, parameters=None,
+                                headers=None, input=None):
+            timeout = getattr(codekit.pygithub._http_local, 'timeout', None)
+            return threading.get_ident(), timeout
+
+    requester = Requester()
+    codekit.pygithub._time_requests(requester)
+    request = requester.requestJsonAndCheck
+    me = threading.get_ident()
+
+    for verb in ('PUT', 'DELETE', 'PATCH', 'POST'):
+        assert request(verb, '/repos/a/b/git/refs') == (me, None)
+
+    # reads which are not hedged are made by the calling thread
+    assert request('GET', '/repos/a/b') == (me, 0.01)
+    assert request(
+        'POST',
+        '/graphql',
+        input={'query': 'query { viewer { login } }'},
+    ) == (me, 0.01)
+    assert getattr(codekit.pygithub._http_local, 'timeout', None) is None
+
+
+def test_timed_connection():
+    """The http timeout of connections may be overridden per thread"""
+    class Connection(object):
+        def __init__(self, timeout=None):
+            self.timeout = timeout
+
+    conn = codekit.pygithub._timed_connection(Connection)(timeout=60)
+    assert conn.timeout == 60
+
+    with mock.patch.object(codekit.pygithub, '_http_local',
+                           threading.local()) as local:
+        local.timeout = 2
+        assert conn.timeout == 2
+
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(conn.timeout))
+        t.start()
+        t.join()
+        assert seen == [60]
+
+
+def test_graphql_operation():
+    """GraphQL queries are timed by operation"""
+    operation = codekit.pygithub._graphql_operation
+
+    assert operation({'query': 'query DefaultHeads { r0: a }'}) == \
+        'DefaultHeads'
+    assert operation({'query': 'query {\n  a(name: "x") { b }\n}'}) == \
+        operation({'query': 'query { a(name: "y") { b } }'})
+    assert operation({'query': 'query { a { b } }'}) != \
+        operation({'query': 'query { c { d } }'})
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from codekit import codetools
+from codekit.cli import codekit as codekit_cli
+import pytest
+import types
+
+codetools.setup_logging()
+
+
+class StepError(Exception):
+    pass
+
+
+def step(name, calls, exc=None):
+    """A subcommand module which records its calls"""
+    def run(argv=None):
+        calls.append((name, argv))
+        if exc is not None:
+            raise exc
+
+    return types.SimpleNamespace(run=run, COMMAND_ERRORS=(StepError,))
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    calls = []
+    modules = {
+        'list-repos': step('list-repos', calls),
+        'sync-teams': step('sync-teams', calls, StepError('bad state')),
+        'tag-teams': step('tag-teams', calls, codetools.DogpileError(
+            [ValueError('a'), ValueError('b')],
+            'oops',
+        )),
+    }
+    monkeypatch.setattr(
+        codekit_cli.importlib,
+        'import_module',
+        lambda name: modules[name],
+    )
+    monkeypatch.setattr(
+        codekit_cli,
+        'SUBCOMMANDS',
+        {name: name for name in modules},
+    )
+    return calls
+
+
+def test_chain(steps):
+    """Chained subcommands are run in order"""
+    codekit_cli.run(['list-repos', '--org', 'a', '+', 'list-repos'])
+
+    assert steps == [('list-repos', ['--org', 'a']), ('list-repos', [])]
+
+
+@pytest.mark.parametrize('failing, status', [
+    ('sync-teams', 1),
+    ('tag-teams', 2),
+])
+def test_chain_error(steps, caplog, failing, status):
+    """A chain stops at the first subcommand which fails, with the exit
+    status of the subcommand"""
+    with pytest.raises(SystemExit) as excinfo:
+        codekit_cli.run([failing, '+', 'list-repos'])
+
+    assert excinfo.value.code == status
+    assert steps == [(failing, [])]
+    assert 'Traceback' not in caplog.text
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
-import os
 import codekit.codetools as codetools
+import logging
+import os
 import pytest
 
 
@@ -25,3 +26,71 @@ def test_debug_lvl_from_env():
 
     os.environ['DM_SQUARE_DEBUG'] = '42'
     codetools.debug_lvl_from_env() == 42
+
+
+def test_cache_dir(monkeypatch):
+    """cache dir is created under XDG_CACHE_HOME"""
+    with codetools.TempDir() as temp_dir:
+        monkeypatch.setenv('XDG_CACHE_HOME', temp_dir)
+
+        path = codetools.cache_dir('foo', 'bar')
+        assert path == os.path.join(temp_dir, 'codekit', 'foo', 'bar')
+        assert os.path.isdir(path)
+
+
+def test_lazy_logging(caplog):
+    """Messages are only formatted if they are going to be logged"""
+    codetools.setup_logging(verbosity=0)
+    calls = []
+
+    def msg():
+        calls.append(1)
+        return 'expensive'
+
+    codetools.debug(msg)
+    assert calls == []
+
+    codetools.info(msg)
+    codetools.info("%s of %d", 'one', 2)
+    assert calls == [1]
+    assert caplog.messages[-2:] == ['expensive', 'one of 2']
+    # the caller is reported as the origin of the record
+    assert caplog.records[-1].funcName == 'test_lazy_logging'
+    assert caplog.records[-1].pathname == __file__
+
+
+def test_queued_logging(caplog):
+    """Queued records are all handled when the context exits"""
+    codetools.setup_logging(verbosity=0)
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+
+    with codetools.queued_logging():
+        with codetools.queued_logging():
+            for n in range(100):
+                codetools.info("record %d", n)
+        assert root.handlers != handlers
+
+    assert root.handlers == handlers
+    assert caplog.messages[-100:] == ["record %d" % n for n in range(100)]
+
+
+def test_run_command(caplog):
+    """Expected errors are reported as an exit status"""
+    def failing(exc):
+        def run(argv=None):
+            raise exc
+        return run
+
+    assert codetools.run_command(lambda argv: None) == 0
+
+    dogpile = codetools.DogpileError([ValueError()] * 300, 'oops')
+    assert codetools.run_command(failing(dogpile)) == 255
+    assert 'oops' in caplog.text
+
+    with pytest.raises(KeyError):
+        codetools.run_command(failing(KeyError('bad')))
+    assert codetools.run_command(
+        failing(KeyError('bad')),
+        errors=(KeyError,),
+    ) == 1
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, concurrency
+import pytest
+import threading
+import time
+
+codetools.setup_logging()
+
+
+class ItemError(Exception):
+    pass
+
+
+def test_pipeline():
+    """Items flow through all stages"""
+    stages = [
+        concurrency.Stage('double', lambda x: x * 2, workers=3),
+        concurrency.Stage('inc', lambda x: x + 1, workers=2),
+    ]
+
+    results, problems = concurrency.run_pipeline(range(100), stages, maxsize=2)
+
+    assert sorted(results) == [x * 2 + 1 for x in range(100)]
+    assert problems == []
+
+
+def test_pipeline_drop():
+    """Returning None drops an item from the pipeline"""
+    stages = [
+        concurrency.Stage('odd', lambda x: x if x % 2 else None, workers=2),
+        concurrency.Stage('noop', lambda x: x),
+    ]
+
+    results, _ = concurrency.run_pipeline(range(10), stages)
+
+    assert sorted(results) == [1, 3, 5, 7, 9]
+
+
+def test_pipeline_catch():
+    """Caught exceptions are collected and do not stop the pipeline"""
+    def oops(x):
+        if x == 3:
+            raise ItemError(x)
+        return x
+
+    stages = [concurrency.Stage('oops', oops, workers=2)]
+
+    results, problems = concurrency.run_pipeline(
+        range(10),
+        stages,
+        catch=(ItemError,),
+    )
+
+    assert sorted(results) == [x for x in range(10) if x != 3]
+    assert len(problems) == 1
+    assert isinstance(problems[0], ItemError)
+
+
+def test_pipeline_fail_fast():
+    """Caught exceptions are re-raised when fail_fast is set"""
+    def oops(x):
+        raise ItemError(x)
+
+    stages = [concurrency.Stage('oops', oops, workers=2)]
+
+    with pytest.raises(ItemError):
+        concurrency.run_pipeline(
+            range(100),
+            stages,
+            maxsize=1,
+            catch=(ItemError,),
+            fail_fast=True,
+        )
+
+
+def test_pipeline_uncaught():
+    """Uncaught exceptions stop the pipeline and are re-raised"""
+    def oops(x):
+        raise ValueError(x)
+
+    stages = [
+        concurrency.Stage('noop', lambda x: x, workers=2),
+        concurrency.Stage('oops', oops, workers=2),
+    ]
+
+    with pytest.raises(ValueError):
+        concurrency.run_pipeline(range(100), stages, maxsize=1)
+
+
+def test_map_concurrently():
+    """Results are returned in item order and problems are collected"""
+    def oops(x):
+        if x == 3:
+            raise ItemError(x)
+        return x * 2
+
+    results, problems = concurrency.map_concurrently(
+        oops,
+        range(10),
+        workers=4,
+        catch=(ItemError,),
+    )
+
+    assert results == [None if x == 3 else x * 2 for x in range(10)]
+    assert len(problems) == 1
+    assert isinstance(problems[0], ItemError)
+
+
+def test_map_concurrently_fail_fast():
+    """Caught exceptions are re-raised when fail_fast is set"""
+    def oops(x):
+        raise ItemError(x)
+
+    with pytest.raises(ItemError):
+        concurrency.map_concurrently(
+            oops,
+            range(10),
+            catch=(ItemError,),
+            fail_fast=True,
+        )
+
+
+def test_pacer():
+    """Operations are spaced by at least the pacer interval"""
+    pacer = concurrency.Pacer(0.01)
+
+    start = time.monotonic()
+    for _ in range(5):
+        pacer.wait()
+
+    assert time.monotonic() - start >= 0.04
+
+
+class Throttled(Exception):
+    pass
+
+
+def test_adaptive_limiter():
+    """The limit grows on success and shrinks when throttled"""
+    limiter = concurrency.AdaptiveLimiter(initial=2, maximum=4)
+
+    for _ in range(20):
+        limiter.success()
+    assert limiter.limit == 4
+
+    limiter.throttle()
+    assert limiter.limit == 2
+    assert limiter.throttled == 1
+
+    for _ in range(10):
+        limiter.throttle()
+    assert limiter.limit == 1
+
+
+def test_map_adaptive():
+    """Throttled items are retried and concurrency is bounded"""
+    attempts = {}
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def func(x):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            attempts[x] = attempts.get(x, 0) + 1
+            n = attempts[x]
+        try:
+            time.sleep(0.001)
+            if x % 5 == 0 and n == 1:
+                raise Throttled(x)
+            if x == 7:
+                raise ItemError(x)
+            return x * 2
+        finally:
+            with lock:
+                active[0] -= 1
+
+    limiter = concurrency.AdaptiveLimiter(initial=1, maximum=3)
+
+    results, problems = concurrency.map_adaptive(
+        func,
+        range(20),
+        limiter,
+        throttled=lambda e: 0 if isinstance(e, Throttled) else None,
+        catch=(ItemError,),
+    )
+
+    assert results == [None if x == 7 else x * 2 for x in range(20)]
+    assert len(problems) == 1
+    assert limiter.throttled == 4
+    assert peak[0] <= 3
+
+
+def test_imap_ordered():
+    """Results are yielded in order and items are consumed lazily"""
+    consumed = []
+
+    def items():
+        for x in range(100):
+            consumed.append(x)
+            yield x
+
+    results = concurrency.imap_ordered(
+        lambda x: x * 2,
+        items(),
+        workers=2,
+        window=4,
+    )
+
+    assert next(results) == 0
+    assert len(consumed) <= 5
+    assert list(results) == [x * 2 for x in range(1, 100)]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, daemon
+from codekit.codetools import info
+import io
+import logging
+import os
+import pytest
+import sys
+import threading
+
+codetools.setup_logging()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'd.sock')
+
+
+def serve(d, jobs):
+    """Handle `jobs` requests in a background thread"""
+    def loop():
+        for _ in range(jobs):
+            d.handle_request()
+
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    return t
+
+
+def test_submit(socket_path, monkeypatch):
+    """Output, logging and exit status of a job are sent to the client"""
+    # as configured by logging.basicConfig(), outside of pytest
+    monkeypatch.setattr(
+        logging.root,
+        'handlers',
+        [logging.StreamHandler(sys.stderr)],
+    )
+
+    def run(argv):
+        print('out', os.getcwd(), *argv)
+        print('err', file=sys.stderr)
+        info('logged')
+        if argv:
+            sys.exit(int(argv[0]))
+
+    d = daemon.Daemon(socket_path, run)
+    t = serve(d, 2)
+
+    out, err = io.StringIO(), io.StringIO()
+    status = daemon.submit(['3'], path=socket_path, stdout=out, stderr=err)
+    assert status == 3
+    assert out.getvalue() == "out {cwd} 3\n".format(cwd=os.getcwd())
+    assert 'err\n' in err.getvalue()
+    assert 'logged' in err.getvalue()
+
+    assert daemon.submit([], path=socket_path, stdout=out, stderr=err) == 0
+
+    t.join()
+    d.server_close()
+    assert not os.path.exists(socket_path)
+
+
+def test_caches(socket_path, monkeypatch):
+    """Caches survive between jobs until they expire"""
+    monkeypatch.setattr(codetools, '_caches', [])
+    cache = {}
+    once = []
+    codetools.register_cache(cache.clear)
+    codetools.register_cache(once.clear, per_run=True)
+
+    def run(argv):
+        cache[argv[0]] = True
+        once.append(argv[0])
+        print(sorted(cache), len(once))
+
+    d = daemon.Daemon(socket_path, run, cache_ttl=None)
+    t = serve(d, 2)
+
+    out = io.StringIO()
+    daemon.submit(['a'], path=socket_path, stdout=out)
+    daemon.submit(['b'], path=socket_path, stdout=out)
+    assert out.getvalue() == "['a'] 1\n['a', 'b'] 1\n"
+
+    t.join()
+    d.cache_ttl = 0
+    d.expire_caches()
+    assert cache == {}
+    d.server_close()
+
+
+def test_stale_socket(socket_path):
+    """A socket left behind is replaced but a live daemon is not"""
+    d = daemon.Daemon(socket_path, print)
+    with pytest.raises(RuntimeError):
+        daemon.Daemon(socket_path, print)
+
+    # close the listener but leave the socket file in place
+    d.socket.close()
+    assert os.path.exists(socket_path)
+
+    daemon.Daemon(socket_path, print).server_close()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, events, profiling
+import argparse
+import json
+import time
+import types
+
+codetools.setup_logging()
+
+
+def parse(argv):
+    parser = argparse.ArgumentParser()
+    events.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+class RepoError(Exception):
+    """Shaped like codekit.pygithub.CaughtRepositoryError"""
+
+    def __init__(self, name):
+        super().__init__("error on {name}".format(name=name))
+        self.repo = types.SimpleNamespace(full_name=name)
+        self.caught = types.SimpleNamespace(status=422, data={'m': 'bad'})
+
+
+def test_disabled():
+    """Nothing is emitted unless events are enabled"""
+    events.configure(parse([]))
+    assert not events.enabled()
+
+    events.emit('action', action='tag')
+    events.close()
+
+
+def test_stream(tmp_path):
+    """Events are written as one json object per line"""
+    path = tmp_path / 'events.ndjson'
+    events.configure(parse(['--events', str(path)]), argv=['--dry-run'])
+    assert events.enabled()
+
+    with profiling.phase('tag'):
+        events.emit('action', action='tag', repo='org/a', dry_run=True)
+
+    e = RepoError('org/b')
+    events.error(e)
+    # reported once, even if also part of a dogpile
+    try:
+        raise codetools.DogpileError([e, RepoError('org/c')], 'oops')
+    except codetools.DogpileError as dogpile:
+        events.error(dogpile)
+
+    events.close(SystemExit(1))
+    assert not events.enabled()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r['event'] for r in records] == [
+        'start',
+        'phase_start',
+        'action',
+        'phase_end',
+        'error',
+        'error',
+        'end',
+    ]
+    assert records[0]['argv'] == ['--dry-run']
+    assert records[3]['phase'] == 'tag'
+    assert records[3]['ok'] is True
+    assert records[4]['repo'] == 'org/b'
+    assert records[4]['status'] == 422
+    assert records[5]['repo'] == 'org/c'
+    assert records[6]['status'] == 1
+    assert records[6]['errors'] == 2
+    assert isinstance(records[6].get('api_calls', {}), dict)
+
+
+def test_stats_busy(tmp_path):
+    """Stats are written every interval, even if events never stop"""
+    path = tmp_path / 'events.ndjson'
+    events.configure(parse([
+        '--events', str(path),
+        '--events-interval', '0.05',
+    ]))
+
+    deadline = time.monotonic() + 0.3
+    while time.monotonic() < deadline:
+        events.emit('action', action='tag')
+        time.sleep(0.005)
+    events.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len([r for r in records if r['event'] == 'stats']) >= 2
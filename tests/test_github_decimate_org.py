@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, pygithub
+from codekit.cli import github_decimate_org
+import functools
+import github
+from unittest import mock
+
+codetools.setup_logging()
+
+
+def throttled_repo(name):
+    r = mock.Mock(spec=github.Repository.Repository, full_name=name)
+    r.delete.side_effect = github.GithubException(
+        403,
+        {'message': 'You have exceeded a secondary rate limit.'},
+    )
+    return r
+
+
+@mock.patch(
+    'codekit.pygithub.throttle_delay',
+    functools.partial(pygithub.throttle_delay, default=0),
+)
+def test_delete_repos_throttled():
+    """Deletes which are still throttled once retries are exhausted are
+    problems, which do not stop other deletes"""
+    ok = mock.Mock(spec=github.Repository.Repository, full_name='a/ok')
+    bad = throttled_repo('a/bad')
+
+    problems = github_decimate_org.delete_repos([bad, ok], max_workers=2)
+
+    assert len(problems) == 1
+    assert isinstance(problems[0], pygithub.CaughtRepositoryError)
+    assert problems[0].repo is bad
+    assert bad.delete.call_count == 6
+    ok.delete.assert_called_once_with()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, pygithub
+from codekit.cli import github_fork_org
+import github
+import pytest
+import requests
+from unittest import mock
+
+codetools.setup_logging()
+
+TAKEN = github.GithubException(
+    422,
+    {'errors': [{'message': 'Name has already been taken'}]},
+)
+
+
+@pytest.fixture
+def org():
+    org = mock.Mock(spec=github.Organization.Organization, login='shadow')
+    with mock.patch.object(github_fork_org, 'g', None, create=True), \
+            mock.patch('codekit.pygithub.debug_ratelimit'), \
+            mock.patch('time.sleep'):
+        yield org
+
+
+def test_create_teams_replayed(org):
+    """A team created by an attempt which failed with a server error is not
+    an error"""
+    team = mock.Mock(spec=github.Team.Team)
+    org.create_team.side_effect = [github.GithubException(502, {}), TAKEN]
+    index = pygithub.TeamIndex(by_name={'DM': team}, by_slug={'dm': team})
+
+    with mock.patch('codekit.pygithub.get_team_index', return_value=index):
+        dst_teams, problems = github_fork_org.create_teams(org, {'DM': []})
+
+    assert dst_teams == {'DM': team}
+    assert problems == []
+    assert org.create_team.call_count == 2
+
+
+def test_create_teams_taken(org):
+    """A team which already existed is an error, unless ignored"""
+    org.create_team.side_effect = [TAKEN]
+
+    dst_teams, problems = github_fork_org.create_teams(org, {'DM': []})
+
+    assert dst_teams == {}
+    assert len(problems) == 1
+    assert isinstance(problems[0], pygithub.CaughtOrganizationError)
+
+
+def test_wait_for_forks(org):
+    """Forks are ready once their default branch head resolves, whatever
+    their name"""
+    forks = [
+        mock.Mock(spec=github.Repository.Repository, full_name=name)
+        for name in ('shadow/afw', 'shadow/base-1')
+    ]
+    head = pygithub.BranchHead(ref='refs/heads/main', sha='a', type='commit')
+    polls = [{'shadow/afw': head}, {'shadow/base-1': head}]
+
+    with mock.patch('codekit.pygithub.get_default_heads',
+                    side_effect=polls) as get_default_heads:
+        ready, problems = github_fork_org.wait_for_forks(org, forks)
+
+    assert ready == forks
+    assert problems == []
+    # only forks which are not yet ready are polled again
+    assert get_default_heads.call_args[0][0] == forks[1:]
+
+
+def test_wait_for_forks_timeout(org):
+    """Forks which never become ready are problems"""
+    fork = mock.Mock(spec=github.Repository.Repository, full_name='shadow/a')
+
+    with mock.patch('codekit.pygithub.get_default_heads', return_value={}):
+        ready, problems = github_fork_org.wait_for_forks(
+            org,
+            [fork],
+            timeout=0,
+        )
+
+    assert ready == []
+    assert len(problems) == 1
+    assert isinstance(problems[0], github_fork_org.ForkTimeoutError)
+
+
+@pytest.mark.parametrize('found', [True, False])
+def test_create_teams_transport_error(org, found):
+    """A team creation which was not answered is checked for by name"""
+    team = mock.Mock(spec=github.Team.Team)
+    org.create_team.side_effect = [requests.exceptions.ReadTimeout('slow')]
+    teams = {'DM': team} if found else {}
+    index = pygithub.TeamIndex(by_name=teams, by_slug={})
+
+    with mock.patch('codekit.pygithub.get_team_index', return_value=index):
+        dst_teams, problems = github_fork_org.create_teams(org, {'DM': []})
+
+    assert dst_teams == teams
+    if found:
+        assert problems == []
+    else:
+        assert len(problems) == 1
+        assert isinstance(problems[0], github_fork_org.TeamError)
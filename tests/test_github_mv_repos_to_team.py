@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, pygithub
+from codekit.cli import github_mv_repos_to_team as mv
+import github
+from unittest import mock
+
+codetools.setup_logging()
+
+
+def team(name, repos):
+    t = mock.Mock(spec=github.Team.Team)
+    t.name = name
+    t.get_repos.return_value = repos
+    return t
+
+
+def repo(name):
+    r = mock.Mock(spec=github.Repository.Repository)
+    r.name = name
+    r.full_name = "lsst/{n}".format(n=name)
+    return r
+
+
+def test_run_owners():
+    """Repos are moved out of the Owners team, with a warning"""
+    afw = repo('afw')
+    owners = team('Owners', [afw])
+    dm = team('Data Management', [])
+    index = pygithub.TeamIndex(
+        by_name={'Owners': owners, 'Data Management': dm},
+        by_slug={},
+    )
+    argv = [
+        '--org', 'lsst',
+        '--token', 'bogus',
+        '--from', 'Owners',
+        '--to', 'Data Management',
+        '--pace', '0',
+        'afw',
+    ]
+
+    with mock.patch('codekit.pygithub.login_github'), \
+            mock.patch('codekit.pygithub.get_team_index',
+                       return_value=index), \
+            mock.patch.object(mv, 'warn') as warn:
+        mv.run(argv)
+
+    dm.add_to_repos.assert_called_once_with(afw)
+    owners.remove_from_repos.assert_called_once_with(afw)
+    assert 'Owners' in warn.call_args[0][0]
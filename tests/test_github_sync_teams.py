@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+from codekit import codetools
+from codekit.cli import github_sync_teams as sync
+from codekit.cli.github_sync_teams import Change
+import pytest
+import sys
+import textwrap
+import types
+from unittest import mock
+
+codetools.setup_logging()
+
+
+def state_file(tmp_path, text):
+    path = tmp_path / 'teams.yaml'
+    path.write_text(textwrap.dedent(text))
+    return str(path)
+
+
+def test_read_state(tmp_path):
+    """Repo permissions default to the team's, which defaults to pull"""
+    path = state_file(tmp_path, """\
+        teams:
+          Data Management:
+            permission: push
+            repos:
+              - afw
+              - name: pipe_tasks
+                permission: maintain
+          DM Externals:
+            repos:
+              - apr_util
+          Empty:
+        """)
+
+    assert sync.read_state(path) == {
+        'Data Management': {'afw': 'push', 'pipe_tasks': 'maintain'},
+        'DM Externals': {'apr_util': 'pull'},
+        'Empty': {},
+    }
+
+
+@pytest.mark.parametrize('text', [
+    "teams: [unclosed\n",
+    "repos: []\n",
+    "teams:\n  A:\n    permission: write\n",
+    "teams:\n  A:\n    repos:\n      - name: a\n        permission: owner\n",
+    "teams:\n  A:\n    repos:\n      - permission: push\n",
+])
+def test_read_state_invalid(tmp_path, text):
+    """Invalid state files are rejected"""
+    with pytest.raises(sync.StateError):
+        sync.read_state(state_file(tmp_path, text))
+
+
+def test_read_state_missing(tmp_path):
+    with pytest.raises(sync.StateError):
+        sync.read_state(str(tmp_path / 'nope.yaml'))
+
+
+def test_diff_state():
+    """Only the changes needed to reach the desired state are made"""
+    desired = {
+        'A': {'add': 'pull', 'same': 'push', 'upgrade': 'admin'},
+        'B': {'new': 'triage'},
+    }
+    current = {
+        'A': {'same': 'push', 'upgrade': 'push', 'extra': 'pull'},
+        'B': {},
+        'C': {'ignored': 'pull'},
+    }
+
+    assert sync.diff_state(desired, current) == [
+        Change('add', 'A', 'add', 'pull'),
+        Change('update', 'A', 'upgrade', 'admin'),
+        Change('add', 'B', 'new', 'triage'),
+    ]
+    assert sync.diff_state(desired, current, prune=True) == [
+        Change('add', 'A', 'add', 'pull'),
+        Change('update', 'A', 'upgrade', 'admin'),
+        Change('remove', 'A', 'extra', None),
+        Change('add', 'B', 'new', 'triage'),
+    ]
+
+
+def repo(**perms):
+    names = ['pull', 'triage', 'push', 'maintain', 'admin']
+    return types.SimpleNamespace(permissions=types.SimpleNamespace(
+        **{n: perms.get(n, False) for n in names}
+    ))
+
+
+def test_repo_permission():
+    """The most privileged role of a team is its permission"""
+    assert sync.repo_permission(repo(pull=True)) == 'pull'
+    assert sync.repo_permission(repo(pull=True, triage=True)) == 'triage'
+    assert sync.repo_permission(
+        repo(pull=True, triage=True, push=True, maintain=True),
+    ) == 'maintain'
+    assert sync.repo_permission(
+        repo(pull=True, push=True, admin=True),
+    ) == 'admin'
+    assert sync.repo_permission(types.SimpleNamespace(permissions=None)) \
+        is None
+
+
+def test_main_state_error(tmp_path, caplog):
+    """Invalid state is reported as an error, not a traceback"""
+    path = state_file(tmp_path, "repos: []\n")
+    argv = ['github-sync-teams', '--org', 'example', path]
+
+    with mock.patch.object(sys, 'argv', argv), \
+            pytest.raises(SystemExit) as excinfo:
+        sync.main()
+
+    assert excinfo.value.code == 1
+    assert 'does not declare any teams' in caplog.text
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, pygithub
+from codekit.cli import github_tag_release as release
+import github
+import pytest
+from unittest import mock
+
+codetools.setup_logging()
+
+
+@pytest.mark.parametrize('text', ['{"version": ', '[]', '{"version": 0}'])
+def test_read_release_record_invalid(tmp_path, text):
+    """Corrupt and unsupported release records are rejected"""
+    path = tmp_path / 'w.2020.01.json'
+    path.write_text(text)
+
+    with pytest.raises(release.ReleaseRecordError):
+        release.read_release_record(str(path))
+
+
+@pytest.mark.parametrize('e', [
+    release.ReleaseRecordError('no record of release: w.2020.01'),
+    release.PlanError('plan is for org: lsst but --org is: example'),
+])
+def test_main_errors(caplog, e):
+    """Release record and plan errors are reported, not tracebacks"""
+    with mock.patch.object(release, 'run', side_effect=e), \
+            pytest.raises(SystemExit) as excinfo:
+        release.main()
+
+    assert excinfo.value.code == 1
+    assert str(e) in caplog.text
+
+
+@pytest.mark.parametrize('text', ['{"version": ', '[]', '{"version": 0}'])
+def test_read_plan_invalid(tmp_path, text):
+    """Corrupt and unsupported plans are rejected"""
+    path = tmp_path / 'plan.json'
+    path.write_text(text)
+
+    with pytest.raises(release.PlanError):
+        release.read_plan(str(path))
+
+    with pytest.raises(release.PlanError):
+        release.read_plan(str(tmp_path / 'missing.json'))
+
+
+def test_get_products_from_plan():
+    """Repos are not looked up until they are used"""
+    g = github.Github('bogus')
+    plan = {'products': {'afw': {
+        'repo': 'lsst/afw',
+        'eups_version': '1.0',
+        'v': False,
+        'tag': 'w.2020.01',
+        'sha': 'a' * 40,
+        'message': 'Version w.2020.01',
+        'update_tag': False,
+        'ref_sha': None,
+    }}}
+    tagger = github.InputGitAuthor('foo', 'foo@example.org')
+
+    with mock.patch.object(release, 'g', g, create=True), \
+            mock.patch.object(g, 'get_repo') as get_repo:
+        products = release.get_products_from_plan(plan, tagger)
+
+    get_repo.assert_not_called()
+    assert products['afw']['repo'].full_name == 'lsst/afw'
+    assert products['afw']['target_tag'].name == 'w.2020.01'
+
+
+def test_get_repo_for_product_unchanged():
+    """The teams of products unchanged since a previous release are checked"""
+    repo = mock.Mock(spec=github.Repository.Repository, full_name='lsst/afw')
+    data = {
+        'eups_version': '1.0',
+        'prev': {'repo': 'lsst/afw', 'v': False, 'tag': 'w.2020.01'},
+    }
+
+    with mock.patch.object(release, 'g', None, create=True), \
+            mock.patch('codekit.pygithub.get_repo_lazy', return_value=repo), \
+            mock.patch('codekit.pygithub.get_repo_team_names',
+                       return_value=['Data Management']):
+        resolved = release.get_repo_for_product(
+            None,
+            'afw',
+            data,
+            {},
+            allow_teams=['Data Management'],
+            ext_teams=[],
+            deny_teams=[],
+        )
+        assert resolved['repo'] is repo
+        assert resolved['v'] is False
+
+        with pytest.raises(pygithub.RepositoryTeamMembershipError):
+            release.get_repo_for_product(
+                None,
+                'afw',
+                data,
+                {},
+                allow_teams=['DM Externals'],
+                ext_teams=[],
+                deny_teams=[],
+            )
+
+
+def test_run_pipeline_problems():
+    """Tags are not streamed once a product has failed to cross-reference"""
+    org = mock.Mock(spec=github.Organization.Organization, login='lsst')
+    g = mock.Mock(**{'get_organization.return_value': org})
+    problem = RuntimeError('afw version mismatch')
+    argv = [
+        '--org', 'lsst',
+        '--allow-team', 'Data Management',
+        '--manifest', 'b1234',
+        '--user', 'foo',
+        '--email', 'foo@example.org',
+        '--token', 'bogus',
+        '--pipeline',
+        'w.2020.01',
+    ]
+
+    with mock.patch('codekit.pygithub.login_github', return_value=g), \
+            mock.patch('codekit.versiondb.Manifest'), \
+            mock.patch('codekit.eups.EupsTag'), \
+            mock.patch.object(release, 'cross_reference_products',
+                              return_value=({}, [problem])), \
+            mock.patch.object(release, 'pipeline_products',
+                              return_value=({}, [], [])) as pipeline, \
+            mock.patch.object(release, 'tag_products') as tag_products, \
+            pytest.raises(codetools.DogpileError) as excinfo:
+        release.run(argv)
+
+    assert pipeline.call_args[1]['tag'] is False
+    tag_products.assert_not_called()
+    assert excinfo.value.errors == [problem]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import codekit.cli
+import os
+import pkgutil
+import pytest
+import subprocess
+import sys
+
+# dependencies which should not be imported until they are used
+HEAVY_MODULES = [
+    'github',
+    'gitconfig',
+    'pkg_resources',
+    'progressbar',
+    'requests',
+    'yaml',
+]
+
+# cumulative import time budget of a cli module (microseconds)
+BUDGET = int(os.environ.get('CODEKIT_IMPORT_BUDGET_US', 250000))
+
+CLI_MODULES = [name for _, name, ispkg in pkgutil.iter_modules(
+    codekit.cli.__path__,
+    codekit.cli.__name__ + '.',
+) if not ispkg]
+
+
+def importtime(module):
+    """Return the cumulative import time (us) of each module imported by
+    `module`, as reported by `python -X importtime`"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', "import " + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+@pytest.mark.parametrize('module', CLI_MODULES)
+def test_cli_importtime(module):
+    """cli modules do not import heavy dependencies and stay within the
+    import time budget"""
+    times = importtime(module)
+
+    assert not [m for m in HEAVY_MODULES if m in times]
+    assert times[module] < BUDGET, times[module]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+from codekit import codetools, profiling
+import argparse
+import io
+import pstats
+
+codetools.setup_logging()
+
+
+def parse(argv):
+    parser = argparse.ArgumentParser()
+    profiling.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def test_disabled():
+    """Phases are not recorded unless profiling is enabled"""
+    profiling.configure(parse([]))
+    assert not profiling.enabled()
+
+    with profiling.phase('a'):
+        pass
+
+    out = io.StringIO()
+    profiling.report(out)
+    assert out.getvalue() == ''
+
+
+def test_phases(tmp_path):
+    """Nested phases are timed and reported"""
+    stats = str(tmp_path / 'codekit.pstats')
+    profiling.configure(parse(['--profile-pstats', stats]))
+    assert profiling.enabled()
+
+    @profiling.phase('inner')
+    def inner():
+        sum(range(1000))
+
+    with profiling.phase('outer'):
+        inner()
+        inner()
+
+    out = io.StringIO()
+    profiling.report(out)
+    assert not profiling.enabled()
+
+    lines = out.getvalue().splitlines()
+    assert [line.split()[:2] for line in lines[2:5]] == [
+        ['outer/inner', '2'],
+        ['outer', '1'],
+        ['total', '1'],
+    ]
+
+    assert pstats.Stats(stats).total_calls > 0